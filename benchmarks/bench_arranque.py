@@ -0,0 +1,114 @@
+"""Benchmark del arranque en frío: import de ``index`` y primera respuesta.
+
+Cada corrida usa un intérprete nuevo, como un worker recién creado:
+
+- ``import``: segundos de ``import index`` (``python -c``).
+- ``primera_respuesta``: desde lanzar ``uvicorn index:app`` hasta el
+  primer ``200`` de ``GET /`` (incluye el ciclo de vida: pools, migraciones,
+  catálogos). Necesita la base de ``PG_*`` configurada.
+
+Con ``--max-import`` / ``--max-respuesta`` termina con código 1 si la
+mediana supera el límite, para detectar regresiones en CI::
+
+    python benchmarks/bench_arranque.py --n 5
+    python benchmarks/bench_arranque.py --n 5 --max-import 1.5 --max-respuesta 4
+    python benchmarks/bench_arranque.py --detalle   # módulos más lentos (-X importtime)
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def tiempo_import() -> float:
+    codigo = "import time; t = time.perf_counter(); import index; print(time.perf_counter() - t)"
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True)
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def modulos_lentos(n: int) -> list:
+    salida = subprocess.run([sys.executable, "-X", "importtime", "-c", "import index"],
+                            cwd=RAIZ, capture_output=True, text=True, check=True)
+    filas = []
+    for linea in salida.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, modulo = linea[len("import time:"):].split("|")
+        # ``index`` y lo que importa directamente (la sangría marca la profundidad)
+        if len(modulo) - len(modulo.lstrip()) > 3:
+            continue
+        filas.append((int(acumulado) / 1e6, modulo.strip()))
+    return [{"modulo": m, "segundos": round(s, 3)} for s, m in sorted(filas, reverse=True)[:n]]
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def tiempo_primera_respuesta(timeout: float) -> float:
+    puerto = puerto_libre()
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "index:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - inicio < timeout:
+            if proceso.poll() is not None:
+                raise SystemExit(f"uvicorn terminó con código {proceso.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{puerto}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - inicio
+            except httpx.TransportError:
+                pass
+            time.sleep(0.02)
+        raise SystemExit(f"Sin respuesta en {timeout} s")
+    finally:
+        proceso.terminate()
+        proceso.wait(10)
+
+
+def resumen(valores: list) -> dict:
+    return {"mediana": round(statistics.median(valores), 3), "min": round(min(valores), 3),
+            "max": round(max(valores), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=5, help="corridas de cada medición")
+    parser.add_argument("--sin-servidor", action="store_true", help="medir solo el import")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--max-import", type=float, help="límite (s) para la mediana del import")
+    parser.add_argument("--max-respuesta", type=float, help="límite (s) para la mediana de la primera respuesta")
+    parser.add_argument("--detalle", action="store_true", help="listar los imports más lentos")
+    args = parser.parse_args()
+
+    resultado = {"n": args.n, "import": resumen([tiempo_import() for _ in range(args.n)])}
+    if not args.sin_servidor:
+        resultado["primera_respuesta"] = resumen([tiempo_primera_respuesta(args.timeout) for _ in range(args.n)])
+    if args.detalle:
+        resultado["modulos_lentos"] = modulos_lentos(15)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+    excedidos = []
+    if args.max_import and resultado["import"]["mediana"] > args.max_import:
+        excedidos.append(f"import {resultado['import']['mediana']} s > {args.max_import} s")
+    if args.max_respuesta and "primera_respuesta" in resultado \
+            and resultado["primera_respuesta"]["mediana"] > args.max_respuesta:
+        excedidos.append(f"primera respuesta {resultado['primera_respuesta']['mediana']} s > {args.max_respuesta} s")
+    if excedidos:
+        raise SystemExit("Regresión de arranque: " + "; ".join(excedidos))
+
+
+if __name__ == "__main__":
+    main()
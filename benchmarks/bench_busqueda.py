@@ -0,0 +1,140 @@
+"""Benchmark de la búsqueda de CVs (``busqueda_cvs``) a escala.
+
+Siembra ``--n`` CVs sintéticos (usuarios ``busq-*@bench.local`` con texto
+armado de un vocabulario de oficios y herramientas, y un término raro en
+1 de cada 1000) y mide la latencia de la primera y la segunda página para
+consultas raras, comunes, combinadas y frases::
+
+    python benchmarks/bench_busqueda.py --n 200000 --sembrar
+    python benchmarks/bench_busqueda.py --repeticiones 20
+    python benchmarks/bench_busqueda.py --limpiar
+
+El vocabulario es chico a propósito: cada palabra común aparece en la
+mayoría de los CVs, que es el peor caso para rankear.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import busqueda_cvs  # noqa: E402
+from database_postgres import cerrar_pool, conexion, iniciar_pool  # noqa: E402
+
+VOCABULARIO = (
+    "arquitectura diseño urbanismo proyectos residenciales autocad revit sketchup ingeniería civil "
+    "estructuras gestión equipos liderazgo comunicación clientes normativas presupuestos obras supervisión "
+    "excel inglés básico intermedio avanzado contabilidad finanzas ventas marketing python java desarrollo "
+    "software datos análisis enfermería pacientes hospital docente matemática logística almacén transporte "
+    "atención administración recursos humanos selección personal experiencia años empresa universidad "
+    "licenciada bachiller técnico maestría lima arequipa trujillo cusco piura photoshop illustrator "
+    "fotografía electricidad mecánica soldadura mantenimiento seguridad calidad auditoría derecho abogado "
+    "contratos laboral psicología educación nutrición cocina turismo hotelería quechua portugués francés "
+    "química biología laboratorio farmacia minería geología topografía agronomía"
+).split()
+
+CONSULTAS = ["navisworks", "sketchup", "sketchup revit autocad", "navisworks -sketchup",
+             '"diseño arquitectura"', "termino inexistente"]
+
+
+def sembrar(n: int):
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM cv_statuses WHERE name = 'No Apto'")
+        status_id = cur.fetchone()[0]
+        inicio = time.perf_counter()
+        cur.execute("""
+            WITH u AS (
+                INSERT INTO users (auth_provider, email, first_name, last_name, role_id, status)
+                SELECT 'email', 'busq-' || g || '@bench.local', 'Bench' || g, 'Busqueda', 2, TRUE
+                FROM generate_series(1, %(n)s) g
+                RETURNING id
+            ), cv AS (
+                INSERT INTO cvs (user_id, file_path, status_id, ia_result)
+                SELECT id, 'bench/busq-' || id || '.pdf', %(estado)s, 'bench' FROM u
+                RETURNING id
+            )
+            INSERT INTO cv_textos (cv_id, texto)
+            SELECT cv.id,
+                   (SELECT string_agg((%(vocab)s::text[])[1 + floor(random() * %(tam)s)::int], ' ')
+                    FROM generate_series(1, 200 + cv.id %% 3))
+                   || CASE WHEN cv.id %% 1000 = 7 THEN ' bim navisworks' ELSE '' END
+            FROM cv
+        """, {"n": n, "estado": status_id, "vocab": VOCABULARIO, "tam": len(VOCABULARIO)})
+        conn.commit()
+        print(f"Sembrados {n} CVs en {time.perf_counter() - inicio:.0f} s")
+        conn.set_session(autocommit=True)
+        cur.execute("VACUUM ANALYZE cv_textos")
+        conn.set_session(autocommit=False)
+
+
+def limpiar():
+    with conexion() as conn:
+        cur = conn.cursor()
+        # cv_textos se borra en cascada con cvs
+        cur.execute("""DELETE FROM cvs WHERE user_id IN
+                       (SELECT id FROM users WHERE email LIKE 'busq-%%@bench.local')""")
+        conn.commit()
+        # Sin el VACUUM, el chequeo de la FK cvs.user_id recorre las filas
+        # muertas de cvs por cada usuario borrado
+        conn.set_session(autocommit=True)
+        cur.execute("VACUUM cvs")
+        conn.set_session(autocommit=False)
+        cur.execute("DELETE FROM users WHERE email LIKE 'busq-%%@bench.local'")
+        conn.commit()
+        print(f"Borrados {cur.rowcount} usuarios de prueba")
+
+
+def medir(repeticiones: int) -> dict:
+    resultado = {}
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM cv_textos")
+        resultado["cvs"] = cur.fetchone()[0]
+        for q in CONSULTAS:
+            primera, segunda, n = [], [], 0
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                filas, modo, siguiente = busqueda_cvs.buscar(conn, q, None, "auto", 20, None)
+                primera.append((time.perf_counter() - inicio) * 1000)
+                n = len(filas)
+                if siguiente:
+                    inicio = time.perf_counter()
+                    busqueda_cvs.buscar(conn, q, None, "auto", 20, siguiente)
+                    segunda.append((time.perf_counter() - inicio) * 1000)
+                conn.rollback()
+            resultado[q] = {
+                "resultados": n,
+                "modo": modo,
+                "ms_p50": round(statistics.median(primera), 1),
+                "ms_max": round(max(primera), 1),
+                "pagina_2_ms_p50": round(statistics.median(segunda), 1) if segunda else None,
+            }
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200000)
+    parser.add_argument("--sembrar", action="store_true", help="insertar --n CVs sintéticos antes de medir")
+    parser.add_argument("--limpiar", action="store_true", help="borrar los CVs sintéticos y salir")
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    iniciar_pool()
+    try:
+        if args.limpiar:
+            limpiar()
+            return
+        if args.sembrar:
+            sembrar(args.n)
+        print(json.dumps(medir(args.repeticiones), indent=2, ensure_ascii=False))
+    finally:
+        cerrar_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark de carga HTTP: peticiones/segundo y latencias p50/p99.
+
+Lanza ``--requests`` peticiones contra ``--url`` con ``--concurrency``
+peticiones simultáneas y reporta el throughput y los percentiles.
+
+Para comparar antes/después del pool asyncpg, levantar la API con un solo
+worker en cada versión y correr el mismo comando::
+
+    git checkout <commit-anterior>
+    uvicorn index:app --workers 1 --port 8000
+    python benchmarks/bench_carga.py --url http://localhost:8000/services/ -c 64 -n 5000 --label antes
+
+    git checkout <commit-nuevo>
+    uvicorn index:app --workers 1 --port 8000
+    python benchmarks/bench_carga.py --url http://localhost:8000/services/ -c 64 -n 5000 --label despues
+
+Resultados (``/services/``, ``-c 64 -n 3000``, 1 worker, PostgreSQL 16
+local, mediana de 3 corridas; 1 CPU compartida con el cliente)::
+
+                                  antes (psycopg2)      después (asyncpg)
+    PG directo (~0.1 ms)          154 rps  p50 272 ms   168 rps  p50 237 ms  p99 2.3 s ambos
+    PG a ~2 ms (proxy con demora)  70 rps  p50 838 ms   137 rps  p50 310 ms  p99 1.5 s -> 2.6 s
+
+Con la base local el event loop casi no espera, así que la mejora es chica;
+con latencia de red real (App Service -> PostgreSQL) el psycopg2 bloqueante
+serializa las consultas dentro del loop y el throughput se duplica. El p99
+sube con asyncpg porque entran más peticiones a la vez en la misma CPU.
+
+``--slow-url`` mezcla peticiones lentas (p. ej. un endpoint que hace
+``SELECT pg_sleep``) para ver cómo afectan al resto de peticiones.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))
+    return ordenados[k]
+
+
+async def correr(url, concurrencia, total, metodo="GET", slow_url=None, slow_every=0):
+    latencias = []
+    errores = 0
+    cola = asyncio.Queue()
+    for i in range(total):
+        destino = slow_url if slow_url and slow_every and i % slow_every == 0 else url
+        cola.put_nowait(destino)
+
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=60) as client:
+        async def trabajador():
+            nonlocal errores
+            while True:
+                try:
+                    destino = cola.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                inicio = time.perf_counter()
+                try:
+                    r = await client.request(metodo, destino)
+                    if r.status_code >= 500:
+                        errores += 1
+                except httpx.HTTPError:
+                    errores += 1
+                if destino == url:
+                    latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+
+    return {
+        "requests": total,
+        "concurrency": concurrencia,
+        "errors": errores,
+        "seconds": round(duracion, 3),
+        "rps": round(total / duracion, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencias) * 1000, 2) if latencias else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True)
+    parser.add_argument("-c", "--concurrency", type=int, default=32)
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--slow-url", default=None)
+    parser.add_argument("--slow-every", type=int, default=0)
+    parser.add_argument("--label", default="")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(correr(
+        args.url, args.concurrency, args.requests, args.method, args.slow_url, args.slow_every
+    ))
+    resultado["label"] = args.label
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Benchmark de ``GET /especialistas/cercanos`` a escala.
+
+Siembra ``--n`` especialistas activos (usuarios ``cerca-*@bench.local``,
+rol 3) con una dirección al azar dentro del Perú y, para uno de cada
+cinco, una solicitud aceptada de un servicio. Mide la latencia desde
+puntos al azar (con y sin filtro de servicio) y compara cada respuesta
+con el orden exacto por haversine sobre todos los especialistas, sin
+índice, para confirmar que el sobremuestreo (``NEAREST_OVERFETCH``) no
+pierde vecinos. ``--clientes`` agrega usuarios clientes (rol 1,
+``cerca-cliente-*``) con dirección en la misma zona: el índice GiST
+también recorre sus direcciones y el filtro de rol se aplica después::
+
+    python benchmarks/bench_cercanos.py --n 100000 --sembrar
+    python benchmarks/bench_cercanos.py --n 100000 --clientes 400000 --sembrar
+    python benchmarks/bench_cercanos.py --consultas 200 --limite 20
+    python benchmarks/bench_cercanos.py --limpiar
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import index  # noqa: E402
+from database_postgres import cerrar_pool, conexion, iniciar_pool  # noqa: E402
+
+# Latitud y longitud aproximadas del Perú
+LATITUDES, LONGITUDES = (-18.0, 0.0), (-81.0, -69.0)
+
+SQL_EXACTO = """
+    SELECT u.id
+    FROM users u
+    JOIN user_addresses a ON a.user_id = u.id
+    WHERE u.role_id = 3 AND u.status AND a.latitude IS NOT NULL AND a.longitude IS NOT NULL {servicio}
+    GROUP BY u.id
+    ORDER BY min(2 * 6371 * asin(sqrt(
+        power(sin(radians(a.latitude::float8 - %(lat)s) / 2), 2)
+        + cos(radians(%(lat)s)) * cos(radians(a.latitude::float8))
+          * power(sin(radians(a.longitude::float8 - %(lon)s) / 2), 2)))), u.id
+    LIMIT %(limite)s
+"""
+FILTRO_SERVICIO = """AND EXISTS (SELECT 1 FROM service_requests sr WHERE sr.specialist_id = u.id
+                     AND sr.service_id = %(servicio)s AND sr.acceptance_status = %(aceptada)s)"""
+
+
+def sembrar(n: int, clientes: int):
+    with conexion() as conn:
+        cur = conn.cursor()
+        inicio = time.perf_counter()
+        cur.execute("""
+            WITH u AS (
+                INSERT INTO users (auth_provider, email, first_name, last_name, role_id, status)
+                SELECT 'email', 'cerca-cliente-' || g || '@bench.local', 'Cliente' || g, 'Cercano', 1, TRUE
+                FROM generate_series(1, %(n)s) g
+                RETURNING id
+            )
+            INSERT INTO user_addresses (user_id, address_text, latitude, longitude)
+            SELECT id, 'Dirección ' || id,
+                   round((%(lat0)s + random() * (%(lat1)s - %(lat0)s))::numeric, 6),
+                   round((%(lon0)s + random() * (%(lon1)s - %(lon0)s))::numeric, 6)
+            FROM u
+        """, {"n": clientes, "lat0": LATITUDES[0], "lat1": LATITUDES[1], "lon0": LONGITUDES[0], "lon1": LONGITUDES[1]})
+        cur.execute("""
+            WITH u AS (
+                INSERT INTO users (auth_provider, email, first_name, last_name, role_id, status)
+                SELECT 'email', 'cerca-' || g || '@bench.local', 'Especialista' || g, 'Cercano', 3, TRUE
+                FROM generate_series(1, %(n)s) g
+                RETURNING id
+            ), a AS (
+                INSERT INTO user_addresses (user_id, address_text, latitude, longitude)
+                SELECT id, 'Dirección ' || id,
+                       round((%(lat0)s + random() * (%(lat1)s - %(lat0)s))::numeric, 6),
+                       round((%(lon0)s + random() * (%(lon1)s - %(lon0)s))::numeric, 6)
+                FROM u
+            )
+            INSERT INTO service_requests (user_id, service_id, specialist_id, service_details, status, acceptance_status)
+            SELECT NULL, (SELECT min(id) FROM services) + id %% 5, id, 'bench cercanos', 'completado', %(aceptada)s
+            FROM u WHERE id %% 5 = 0
+        """, {"n": n, "aceptada": index.SOLICITUD_ACEPTADA, "lat0": LATITUDES[0], "lat1": LATITUDES[1], "lon0": LONGITUDES[0], "lon1": LONGITUDES[1]})
+        conn.commit()
+        print(f"Sembrados {n} especialistas y {clientes} clientes en {time.perf_counter() - inicio:.0f} s")
+        conn.set_session(autocommit=True)
+        cur.execute("VACUUM ANALYZE user_addresses")
+        cur.execute("VACUUM ANALYZE service_requests")
+        conn.set_session(autocommit=False)
+
+
+def limpiar():
+    with conexion() as conn:
+        cur = conn.cursor()
+        sembrados = "(SELECT id FROM users WHERE email LIKE 'cerca-%%@bench.local')"
+        cur.execute(f"DELETE FROM service_requests WHERE specialist_id IN {sembrados}")
+        cur.execute(f"DELETE FROM user_addresses WHERE user_id IN {sembrados}")
+        conn.commit()
+        # Sin el VACUUM, los chequeos de las FKs hacia users recorren las
+        # filas muertas por cada usuario borrado. user_addresses va con FULL:
+        # si quedan filas vivas al final de la tabla (p. ej. actualizadas por
+        # los triggers de sql/011) un VACUUM simple no la achica
+        conn.set_session(autocommit=True)
+        cur.execute("VACUUM service_requests")
+        cur.execute("VACUUM FULL user_addresses")
+        conn.set_session(autocommit=False)
+        cur.execute("DELETE FROM users WHERE email LIKE 'cerca-%%@bench.local'")
+        conn.commit()
+        print(f"Borrados {cur.rowcount} usuarios de prueba")
+
+
+def medir(consultas: int, limite: int) -> dict:
+    rnd = random.Random(42)
+    resultado = {}
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT count(*) FROM users WHERE role_id = 3 AND status")
+        resultado["especialistas"] = cur.fetchone()[0]
+        cur.execute("SELECT count(*) FROM user_addresses WHERE latitude IS NOT NULL AND longitude IS NOT NULL")
+        resultado["direcciones"] = cur.fetchone()[0]
+        cur.execute("SELECT min(id) FROM services")
+        servicio = cur.fetchone()[0]
+        for nombre, service_id in (("sin_servicio", None), ("con_servicio", servicio)):
+            tiempos, coinciden = [], 0
+            for _ in range(consultas):
+                lat, lon = rnd.uniform(*LATITUDES), rnd.uniform(*LONGITUDES)
+                inicio = time.perf_counter()
+                filas = index.especialistas_cercanos(lat=lat, lon=lon, service_id=service_id, radio_km=None,
+                                                     limit=limite, conn=conn)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                cur.execute(SQL_EXACTO.format(servicio=FILTRO_SERVICIO if service_id is not None else ""),
+                            {"lat": lat, "lon": lon, "servicio": service_id,
+                             "aceptada": index.SOLICITUD_ACEPTADA, "limite": limite})
+                coinciden += [f["id"] for f in filas] == [r[0] for r in cur.fetchall()]
+                conn.rollback()
+            tiempos.sort()
+            resultado[nombre] = {
+                "ms_p50": round(statistics.median(tiempos), 2),
+                "ms_p95": round(tiempos[int(len(tiempos) * 0.95) - 1], 2),
+                "igual_al_exacto": f"{coinciden}/{consultas}",
+            }
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--clientes", type=int, default=0, help="clientes con dirección a sembrar junto a --n")
+    parser.add_argument("--sembrar", action="store_true", help="insertar --n especialistas antes de medir")
+    parser.add_argument("--limpiar", action="store_true", help="borrar los especialistas sintéticos y salir")
+    parser.add_argument("--consultas", type=int, default=100)
+    parser.add_argument("--limite", type=int, default=10, help="especialistas por consulta")
+    args = parser.parse_args()
+
+    iniciar_pool()
+    try:
+        if args.limpiar:
+            limpiar()
+            return
+        if args.sembrar:
+            sembrar(args.n, args.clientes)
+        print(json.dumps(medir(args.consultas, args.limite), indent=2, ensure_ascii=False))
+    finally:
+        cerrar_pool()
+
+
+if __name__ == "__main__":
+    main()
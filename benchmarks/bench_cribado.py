@@ -0,0 +1,124 @@
+"""Cribado local (``cribado.py``) frente a las decisiones del LLM.
+
+La muestra etiquetada sale de la base (texto de ``cv_textos`` y estado
+que dejó el LLM en ``cvs``, sin los rechazos locales ni los errores) o de
+un JSONL con ``{"texto": ..., "estado": "Apto" | "No Apto"}`` (y
+opcionalmente ``"idioma"``, para desglosar los resultados). Para cada
+umbral informa qué parte de las llamadas al LLM se evitaría, la
+concordancia (rechazos locales que el LLM también rechazó) y la cobertura
+(parte de los "No apto" del LLM detectados localmente).
+``muestra_cribado.jsonl`` es una muestra chica con CVs en español y en
+inglés (un perfil apto en inglés no debe rechazarse localmente)::
+
+    python benchmarks/bench_cribado.py --muestra benchmarks/muestra_cribado.jsonl
+    python benchmarks/bench_cribado.py --limite 5000
+    python benchmarks/bench_cribado.py --muestra etiquetados.jsonl --umbrales 0.15,0.25,0.35
+    python benchmarks/bench_cribado.py --criterios criterios.json --min-concordancia 0.99
+
+Con ``--min-concordancia`` termina con código 1 si el umbral configurado
+queda por debajo: conviene exigirlo antes de pasar a ``PRESCREEN_MODE=activo``.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import cribado  # noqa: E402
+
+
+def muestra_db(limite: int) -> list:
+    from database_postgres import cerrar_pool, conexion, iniciar_pool
+
+    iniciar_pool()
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT t.texto, s.name
+                FROM cv_textos t
+                JOIN cvs c ON c.id = t.cv_id
+                JOIN cv_statuses s ON s.id = c.status_id
+                WHERE s.name IN ('Apto', 'No Apto')
+                  AND c.ia_result NOT LIKE %s AND c.ia_result NOT LIKE %s
+                ORDER BY t.cv_id DESC
+                LIMIT %s
+            """, (cribado.MARCA + "%", "❌ Error%", limite))
+            return cur.fetchall()
+    finally:
+        cerrar_pool()
+
+
+def muestra_archivo(ruta: str) -> list:
+    with open(ruta, encoding="utf-8") as f:
+        return [(d["texto"], d["estado"], d.get("idioma")) for d in map(json.loads, f) if d.get("texto")]
+
+
+def medir(evaluaciones: list, etiquetas: list) -> dict:
+    confirmados = contradichos = no_detectados = 0
+    for evaluacion, estado in zip(evaluaciones, etiquetas):
+        if evaluacion.rechazo:
+            if estado == "No Apto":
+                confirmados += 1
+            else:
+                contradichos += 1
+        elif estado == "No Apto":
+            no_detectados += 1
+    return {
+        "llamadas_evitadas": confirmados + contradichos,
+        "tasa_evitadas": round((confirmados + contradichos) / len(etiquetas), 4),
+        "rechazos_contradichos": contradichos,
+        **cribado.concordancia(confirmados, contradichos, no_detectados),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--muestra", help="JSONL etiquetado (por defecto: la base de PG_*)")
+    parser.add_argument("--limite", type=int, default=5000, help="CVs a leer de la base")
+    parser.add_argument("--criterios", help="JSON de criterios (por defecto: PRESCREEN_CRITERIA o los de cribado.py)")
+    parser.add_argument("--umbrales", help="lista de umbrales de rechazo a comparar, separados por coma")
+    parser.add_argument("--min-concordancia", type=float, help="límite inferior para el umbral configurado")
+    args = parser.parse_args()
+
+    espec = cribado.cargar_archivo(args.criterios) if args.criterios else cribado.ESPECIFICACION
+    filas = muestra_archivo(args.muestra) if args.muestra else muestra_db(args.limite)
+    if not filas:
+        raise SystemExit("Sin CVs etiquetados")
+    textos = [f[0] for f in filas]
+    etiquetas = [f[1] for f in filas]
+
+    inicio = time.perf_counter()
+    evaluaciones = cribado.evaluar_lote(textos, espec)
+    segundos = time.perf_counter() - inicio
+
+    resultado = {
+        "cvs": len(filas),
+        "no_aptos_llm": etiquetas.count("No Apto"),
+        "version_criterios": espec.version,
+        "ms_por_cv": round(segundos * 1000 / len(filas), 3),
+        "configurado": {"umbral": espec.umbral_rechazo, **medir(evaluaciones, etiquetas)},
+    }
+    idiomas = sorted({f[2] for f in filas if len(f) > 2 and f[2]})
+    if idiomas:
+        resultado["por_idioma"] = {
+            idioma: medir(*zip(*[(e, f[1]) for e, f in zip(evaluaciones, filas) if f[2] == idioma]))
+            for idioma in idiomas
+        }
+    if args.umbrales:
+        resultado["umbrales"] = [
+            {"umbral": u, **medir(cribado.evaluar_lote(textos, espec, u), etiquetas)}
+            for u in map(float, args.umbrales.split(","))
+        ]
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+    minimo = args.min_concordancia
+    obtenida = resultado["configurado"]["concordancia"]
+    if minimo is not None and obtenida is not None and obtenida < minimo:
+        raise SystemExit(f"Concordancia {obtenida} < {minimo}")
+
+
+if __name__ == "__main__":
+    main()
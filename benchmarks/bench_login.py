@@ -0,0 +1,87 @@
+"""Benchmark del login: verificaciones de contraseña por segundo.
+
+Mide ``credenciales.verificar`` al coste configurado (``LOGIN_SCRYPT_N``,
+``LOGIN_SCRYPT_R``, ``LOGIN_SCRYPT_P``) en un hilo y en el pool de hilos
+del login (``LOGIN_HASH_WORKERS``), que es el techo de logins/segundo de
+un worker. Con ``--url`` mide además el endpoint real::
+
+    python benchmarks/bench_login.py --n 200
+    LOGIN_SCRYPT_N=15 python benchmarks/bench_login.py --n 200
+    python benchmarks/bench_login.py --url http://localhost:8000/auth/cliente \\
+        --email cliente@ejemplo.com --password secreta -c 32 --n 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import credenciales  # noqa: E402
+
+from bench_carga import percentil  # noqa: E402
+
+
+async def verificar_en_pool(n: int, almacenado: str) -> float:
+    inicio = time.perf_counter()
+    await asyncio.gather(*(credenciales.verificar_async("clave-de-prueba", almacenado) for _ in range(n)))
+    return time.perf_counter() - inicio
+
+
+async def http(url: str, email: str, password: str, n: int, concurrencia: int) -> dict:
+    latencias, codigos = [], {}
+    sem = asyncio.Semaphore(concurrencia)
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=60) as client:
+        async def uno():
+            async with sem:
+                inicio = time.perf_counter()
+                r = await client.post(url, data={"email": email, "password": password})
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                codigos[r.status_code] = codigos.get(r.status_code, 0) + 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(uno() for _ in range(n)))
+        total = time.perf_counter() - inicio
+    return {
+        "logins_per_sec": round(n / total, 1),
+        "ms_p50": round(percentil(latencias, 50), 2),
+        "ms_p99": round(percentil(latencias, 99), 2),
+        "status": codigos,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--url")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    almacenado = credenciales.hashear("clave-de-prueba")
+    inicio = time.perf_counter()
+    for _ in range(args.n):
+        credenciales.verificar("clave-de-prueba", almacenado)
+    t_hilo = time.perf_counter() - inicio
+    t_pool = asyncio.run(verificar_en_pool(args.n, almacenado))
+
+    resultado = {
+        "scrypt": {"n": credenciales.SCRYPT_N, "r": credenciales.SCRYPT_R, "p": credenciales.SCRYPT_P},
+        "workers": credenciales.WORKERS,
+        "ms_por_verificacion": round(1000 * t_hilo / args.n, 2),
+        "verificaciones_per_sec_1_hilo": round(args.n / t_hilo, 1),
+        "verificaciones_per_sec_pool": round(args.n / t_pool, 1),
+    }
+    if args.url:
+        resultado["http"] = asyncio.run(http(args.url, args.email, args.password, args.n, args.concurrency))
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
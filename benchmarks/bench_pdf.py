@@ -0,0 +1,103 @@
+"""Benchmark de extracción de texto de PDFs.
+
+Compara la extracción original (``texto += pagina.get_text()`` sin límite)
+con ``pdf_text`` sobre un corpus de PDFs y reporta páginas/segundo,
+caracteres y tokens estimados enviados al LLM, y tokens ahorrados::
+
+    python benchmarks/bench_pdf.py uploads/ --repeat 20
+    python benchmarks/bench_pdf.py corpus/ --max-pages 20 --max-chars 20000 --parallel
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fitz  # noqa: E402
+
+import pdf_text  # noqa: E402
+from llm import estimar_tokens  # noqa: E402
+
+
+def extraccion_original(datos: bytes) -> str:
+    doc = fitz.open(stream=datos, filetype="pdf")
+    texto = ""
+    for pagina in doc:
+        texto += pagina.get_text()
+    return texto
+
+
+def medir(funcion, documentos, repeticiones):
+    inicio = time.perf_counter()
+    textos = []
+    for _ in range(repeticiones):
+        textos = [funcion(datos) for datos in documentos]
+    return time.perf_counter() - inicio, textos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", default="uploads")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-pages", type=int, default=pdf_text.MAX_PAGINAS)
+    parser.add_argument("--max-chars", type=int, default=pdf_text.MAX_CARACTERES)
+    parser.add_argument("--parallel", action="store_true", help="usar extraer_texto_async (pool de procesos)")
+    args = parser.parse_args()
+
+    rutas = sorted(glob.glob(os.path.join(args.corpus, "**", "*.pdf"), recursive=True))
+    if not rutas:
+        sys.exit(f"No hay PDFs en {args.corpus}")
+    documentos = []
+    for ruta in rutas:
+        with open(ruta, "rb") as f:
+            documentos.append(f.read())
+    paginas_totales = sum(pdf_text.contar_paginas(d) for d in documentos)
+    paginas_leidas = sum(min(pdf_text.contar_paginas(d), args.max_pages) for d in documentos)
+
+    t_orig, textos_orig = medir(extraccion_original, documentos, args.repeat)
+
+    if args.parallel:
+        async def todos():
+            return await asyncio.gather(*(
+                pdf_text.extraer_texto_async(d, args.max_pages, args.max_chars) for d in documentos
+            ))
+        inicio = time.perf_counter()
+        for _ in range(args.repeat):
+            textos_nuevos = asyncio.run(todos())
+        t_nuevo = time.perf_counter() - inicio
+        pdf_text.cerrar_pool()
+    else:
+        t_nuevo, textos_nuevos = medir(
+            lambda d: pdf_text.extraer_texto(d, args.max_pages, args.max_chars), documentos, args.repeat
+        )
+
+    tokens_orig = sum(estimar_tokens(t) for t in textos_orig)
+    tokens_nuevos = sum(estimar_tokens(t) for t in textos_nuevos)
+    print(json.dumps({
+        "pdfs": len(documentos),
+        "pages": paginas_totales,
+        "repeat": args.repeat,
+        "original": {
+            "pages_per_sec": round(paginas_totales * args.repeat / t_orig, 1),
+            "ms_per_pdf": round(1000 * t_orig / (len(documentos) * args.repeat), 2),
+            "chars": sum(len(t) for t in textos_orig),
+            "tokens_est": tokens_orig,
+        },
+        "pdf_text": {
+            "pages_per_sec": round(paginas_leidas * args.repeat / t_nuevo, 1),
+            "ms_per_pdf": round(1000 * t_nuevo / (len(documentos) * args.repeat), 2),
+            "pages_read": paginas_leidas,
+            "chars": sum(len(t) for t in textos_nuevos),
+            "tokens_est": tokens_nuevos,
+        },
+        "tokens_saved": tokens_orig - tokens_nuevos,
+        "tokens_saved_pct": round(100 * (tokens_orig - tokens_nuevos) / tokens_orig, 1) if tokens_orig else 0.0,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
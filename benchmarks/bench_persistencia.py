@@ -0,0 +1,122 @@
+"""Micro-benchmark de la latencia de BD por postulación.
+
+Compara la persistencia anterior (transacción con INSERT de usuario,
+búsqueda/INSERT del estado e INSERT del CV, un viaje por sentencia) con la
+función ``registrar_postulacion`` (un solo viaje) contra la base de
+``PG_*``. Las filas creadas se borran al terminar::
+
+    python benchmarks/bench_persistencia.py --n 500
+    python benchmarks/bench_persistencia.py --n 500 --concurrency 8
+
+Con ``--concurrency`` > 1 se mide además el reintento idempotente: cada
+postulación se envía dos veces a la vez y solo debe crear un usuario.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database_async import aplicar_migraciones, cerrar_pool_async, get_async_pool  # noqa: E402
+
+from bench_carga import percentil  # noqa: E402
+
+ESTADO = "Apto"
+# Misma llamada a la función que index.SQL_REGISTRAR_POSTULACION (sin guardar el texto)
+SQL_REGISTRAR_POSTULACION = "SELECT usuario, cv, nuevo FROM registrar_postulacion($1, $2, $3, $4, $5, $6, $7)"
+
+
+async def original(pool, correo, blob_name):
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            user_id = await conn.fetchval("""
+                INSERT INTO users (auth_provider, email, first_name, last_name, role_id, status)
+                VALUES ($1, $2, $3, $4, $5, $6)
+                RETURNING id;
+            """, "email", correo, "Bench", "Persistencia", 2, True)
+            status_id = await conn.fetchval("SELECT id FROM cv_statuses WHERE name = $1", ESTADO)
+            if status_id is None:
+                status_id = await conn.fetchval("INSERT INTO cv_statuses (name) VALUES ($1) RETURNING id", ESTADO)
+            await conn.fetchval("""
+                INSERT INTO cvs (user_id, file_path, status_id, ia_result)
+                VALUES ($1, $2, $3, $4)
+                RETURNING id
+            """, user_id, blob_name, status_id, "Apto")
+
+
+async def funcion(pool, correo, blob_name, status_id):
+    await pool.fetchrow(SQL_REGISTRAR_POSTULACION, correo, uuid4().hex, "Bench", "Persistencia",
+                        blob_name, status_id, "Apto")
+
+
+async def medir(n, concurrencia, llamada):
+    latencias = []
+    sem = asyncio.Semaphore(concurrencia)
+
+    async def una(i):
+        async with sem:
+            inicio = time.perf_counter()
+            await llamada(f"bench-{uuid4().hex}@bench.local", f"bench/{i}.pdf")
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una(i) for i in range(n)))
+    total = time.perf_counter() - inicio
+    return {
+        "ms_p50": round(percentil(latencias, 50), 3),
+        "ms_p95": round(percentil(latencias, 95), 3),
+        "ms_p99": round(percentil(latencias, 99), 3),
+        "por_segundo": round(n / total, 1),
+    }
+
+
+async def reintentos(pool, n, status_id):
+    """Cada postulación llega dos veces en paralelo; cuenta usuarios creados."""
+    correos = [f"bench-{uuid4().hex}@bench.local" for _ in range(n)]
+    filas = await asyncio.gather(*(
+        pool.fetchrow(SQL_REGISTRAR_POSTULACION, correo, "mismo-hash", "Bench", "Persistencia",
+                      "bench/x.pdf", status_id, "Apto")
+        for correo in correos for _ in range(2)
+    ))
+    return {"postulaciones": n, "usuarios_creados": sum(1 for f in filas if f["nuevo"])}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    await aplicar_migraciones()
+    pool = await get_async_pool()
+    status_id = await pool.fetchval("SELECT id FROM cv_statuses WHERE name = $1", ESTADO)
+    if status_id is None:
+        status_id = await pool.fetchval("INSERT INTO cv_statuses (name) VALUES ($1) RETURNING id", ESTADO)
+
+    try:
+        resultado = {
+            "n": args.n,
+            "concurrency": args.concurrency,
+            "original": await medir(args.n, args.concurrency, lambda c, b: original(pool, c, b)),
+            "registrar_postulacion": await medir(
+                args.n, args.concurrency, lambda c, b: funcion(pool, c, b, status_id)),
+        }
+        if args.concurrency > 1:
+            resultado["reintentos"] = await reintentos(pool, args.n // 10 or 1, status_id)
+        print(json.dumps(resultado, indent=2))
+    finally:
+        async with pool.acquire() as conn:
+            await conn.execute("""
+                DELETE FROM cvs WHERE user_id IN (SELECT id FROM users WHERE email LIKE 'bench-%@bench.local')
+            """)
+            await conn.execute("DELETE FROM cv_postulaciones WHERE email LIKE 'bench-%@bench.local'")
+            await conn.execute("DELETE FROM users WHERE email LIKE 'bench-%@bench.local'")
+        await cerrar_pool_async()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
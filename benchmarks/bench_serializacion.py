@@ -0,0 +1,130 @@
+"""Benchmark de la serialización de listados: ruta actual vs ``FAST_JSON``.
+
+Arma una app mínima con los mismos modelos de respuesta que ``index``
+(``CVConUsuario`` y ``PagoOut``) y filas sintéticas con los tipos que
+devuelve psycopg2 (``datetime``, ``Decimal``), y la llama en proceso:
+
+- ``actual``: lista de dicts validada contra ``response_model`` y
+  codificada por FastAPI (lo que hacen hoy los endpoints).
+- ``rapido``: ``serializacion.respuesta_filas`` desde las tuplas.
+
+Reporta filas/segundo, CPU por petición y tamaño del cuerpo, y comprueba
+que ambos cuerpos decodifican a lo mismo::
+
+    python benchmarks/bench_serializacion.py --filas 5000 --n 50
+
+Con ``--url`` mide un endpoint real (lanzar la API con ``FAST_JSON=0`` y
+luego con ``FAST_JSON=1`` para comparar)::
+
+    python benchmarks/bench_serializacion.py --url http://localhost:8000/cvs/apto --n 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import serializacion  # noqa: E402
+from index import CAMPOS_CV, CAMPOS_PAGO, CVConUsuario, PagoOut  # noqa: E402
+
+from bench_carga import percentil  # noqa: E402
+
+
+def filas_cv(n: int) -> list:
+    base = datetime(2024, 1, 1, 8, 30)
+    return [(i, f"cvs/{i:06d}-cv.pdf", base + timedelta(minutes=i), 1000 + i, f"persona{i}@ejemplo.com",
+             "Nombre", f"Apellido {i}") for i in range(n)]
+
+
+def filas_pago(n: int) -> list:
+    base = datetime(2024, 1, 1, 8, 30, 15, 123456)
+    return [(i, f"Especialista {i % 50}", f"Cliente {i}", Decimal(f"{i % 900 + 10}.50"), "completed",
+             base + timedelta(seconds=i)) for i in range(n)]
+
+
+def app_prueba(cvs: list, pagos: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/actual/cvs", response_model=List[CVConUsuario])
+    def actual_cvs():
+        return [{
+            "cv_id": r[0], "file_path": r[1], "uploaded_at": r[2].isoformat(), "user_id": r[3],
+            "email": r[4], "first_name": r[5], "last_name": r[6],
+        } for r in cvs]
+
+    @app.get("/rapido/cvs", response_model=List[CVConUsuario])
+    def rapido_cvs():
+        return serializacion.respuesta_filas(CAMPOS_CV, cvs)
+
+    @app.get("/actual/pagos", response_model=List[PagoOut])
+    def actual_pagos():
+        return [{
+            "id": r[0], "specialist_name": r[1], "client_name": r[2], "amount": r[3],
+            "status": r[4], "created_at": r[5].isoformat(),
+        } for r in pagos]
+
+    @app.get("/rapido/pagos", response_model=List[PagoOut])
+    def rapido_pagos():
+        return serializacion.respuesta_filas(CAMPOS_PAGO, pagos)
+
+    return app
+
+
+def medir(client, ruta: str, n: int, filas: int) -> dict:
+    client.get(ruta)  # calentamiento
+    latencias, cpu = [], []
+    for _ in range(n):
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        r = client.get(ruta)
+        cpu.append((time.process_time() - inicio_cpu) * 1000)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        r.raise_for_status()
+    total = sum(latencias) / 1000
+    return {
+        "rows_per_sec": round(filas * n / total),
+        "ms_p50": round(percentil(latencias, 50), 2),
+        "ms_p99": round(percentil(latencias, 99), 2),
+        "cpu_ms_per_request": round(sum(cpu) / n, 2),
+        "bytes": len(r.content),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=5000)
+    parser.add_argument("--n", type=int, default=50, help="peticiones por variante")
+    parser.add_argument("--url", help="endpoint real a medir en lugar de la app de prueba")
+    args = parser.parse_args()
+
+    if args.url:
+        with httpx.Client(timeout=120) as client:
+            filas = len(client.get(args.url).json())
+            print(json.dumps({"url": args.url, "filas": filas, **medir(client, args.url, args.n, filas)}, indent=2))
+        return
+
+    client = TestClient(app_prueba(filas_cv(args.filas), filas_pago(args.filas)))
+    resultado = {"filas": args.filas, "n": args.n, "orjson": serializacion.orjson is not None}
+    for recurso in ("cvs", "pagos"):
+        actual, rapido = client.get(f"/actual/{recurso}").json(), client.get(f"/rapido/{recurso}").json()
+        if actual != rapido:
+            raise SystemExit(f"Los cuerpos de /{recurso} no coinciden")
+        resultado[recurso] = {
+            "actual": medir(client, f"/actual/{recurso}", args.n, args.filas),
+            "rapido": medir(client, f"/rapido/{recurso}", args.n, args.filas),
+        }
+        resultado[recurso]["speedup_cpu"] = round(
+            resultado[recurso]["actual"]["cpu_ms_per_request"] / resultado[recurso]["rapido"]["cpu_ms_per_request"], 1)
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
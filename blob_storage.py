@@ -0,0 +1,131 @@
+"""Acceso asíncrono a Azure Blob Storage.
+
+Un único ``BlobServiceClient`` (SDK ``aio``) por worker, creado al primer uso,
+reutiliza la sesión HTTP entre subidas. Los archivos grandes se suben por
+bloques en paralelo (``BLOB_MAX_CONCURRENCY``) y cada operación tiene
+timeouts configurables. Para desarrollo sirve Azurite con
+``AZURE_STORAGE_CONNECTION_STRING=UseDevelopmentStorage=true``.
+
+Las URLs firmadas (SAS de lectura, 30 minutos) se cachean por blob y se
+reutilizan hasta ``SAS_REFRESH_MARGIN`` segundos antes de expirar. Sin
+``AZURE_STORAGE_ACCOUNT_KEY`` y con ``AZURE_STORAGE_ACCOUNT_URL``, el
+cliente usa Azure AD y las SAS se firman con una user delegation key,
+también cacheada durante su vigencia. El SDK de Azure se importa al
+crear el cliente, no al importar este módulo.
+"""
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import metricas
+
+CONTAINER_NAME = "postulaciones"
+
+MAX_CONCURRENCIA = int(os.getenv("BLOB_MAX_CONCURRENCY") or 4)
+TAMANO_BLOQUE = int(os.getenv("BLOB_BLOCK_SIZE") or 4 * 1024 * 1024)
+TIMEOUT_CONEXION = float(os.getenv("BLOB_CONNECTION_TIMEOUT") or 10)
+TIMEOUT_LECTURA = float(os.getenv("BLOB_READ_TIMEOUT") or 60)
+TIMEOUT_OPERACION = int(os.getenv("BLOB_TIMEOUT") or 120)
+
+ACCOUNT_NAME = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
+ACCOUNT_KEY = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
+ACCOUNT_URL = os.getenv("AZURE_STORAGE_ACCOUNT_URL")
+
+SAS_DURACION = timedelta(minutes=30)
+SAS_MARGEN = timedelta(seconds=int(os.getenv("SAS_REFRESH_MARGIN") or 300))
+SAS_CACHE_MAX = int(os.getenv("SAS_CACHE_SIZE") or 10000)
+
+_cliente = None  # azure.storage.blob.aio.BlobServiceClient
+
+
+def get_cliente():
+    global _cliente
+    if _cliente is None:
+        from azure.storage.blob.aio import BlobServiceClient
+
+        opciones = dict(
+            max_single_put_size=TAMANO_BLOQUE,
+            max_block_size=TAMANO_BLOQUE,
+            connection_timeout=TIMEOUT_CONEXION,
+            read_timeout=TIMEOUT_LECTURA,
+        )
+        if ACCOUNT_URL and not ACCOUNT_KEY:
+            from azure.identity.aio import DefaultAzureCredential
+            _cliente = BlobServiceClient(ACCOUNT_URL, credential=DefaultAzureCredential(), **opciones)
+        else:
+            _cliente = BlobServiceClient.from_connection_string(
+                os.getenv("AZURE_STORAGE_CONNECTION_STRING"), **opciones
+            )
+    return _cliente
+
+
+async def cerrar_cliente():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.close()
+        _cliente = None
+
+
+async def subir(blob_name: str, datos: bytes, content_type: str = "application/pdf") -> str:
+    """Sube ``datos`` (sobrescribe si existe) y devuelve el nombre del blob."""
+    from azure.storage.blob import ContentSettings
+
+    blob_client = get_cliente().get_blob_client(container=CONTAINER_NAME, blob=blob_name)
+    with metricas.medir("blob", "upload"):
+        await blob_client.upload_blob(
+            datos,
+            overwrite=True,
+            max_concurrency=MAX_CONCURRENCIA,
+            content_settings=ContentSettings(content_type=content_type),
+            timeout=TIMEOUT_OPERACION,
+        )
+    return blob_name
+
+
+# --- URLs firmadas (SAS) ---------------------------------------------
+
+_sas_cache: OrderedDict = OrderedDict()  # blob_name -> (url, expira)
+_clave_delegacion = None  # (UserDelegationKey, expira)
+sas_contadores = {"hits": 0, "misses": 0}
+
+
+async def _get_clave_delegacion(ahora: datetime):
+    global _clave_delegacion
+    if _clave_delegacion is None or _clave_delegacion[1] - ahora < SAS_DURACION + SAS_MARGEN:
+        expira = ahora + timedelta(hours=12)
+        clave = await get_cliente().get_user_delegation_key(ahora - timedelta(minutes=5), expira)
+        _clave_delegacion = (clave, expira)
+    return _clave_delegacion[0]
+
+
+async def url_firmada(blob_name: str) -> str:
+    """URL de solo lectura para ``blob_name``, reutilizada mientras le quede vigencia."""
+    ahora = datetime.now(timezone.utc)
+    cacheada = _sas_cache.get(blob_name)
+    if cacheada and cacheada[1] - ahora > SAS_MARGEN:
+        _sas_cache.move_to_end(blob_name)
+        sas_contadores["hits"] += 1
+        return cacheada[0]
+
+    sas_contadores["misses"] += 1
+    from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+    expira = ahora + SAS_DURACION
+    firma = {"account_key": ACCOUNT_KEY} if ACCOUNT_KEY else {
+        "user_delegation_key": await _get_clave_delegacion(ahora)
+    }
+    sas_token = generate_blob_sas(
+        account_name=ACCOUNT_NAME,
+        container_name=CONTAINER_NAME,
+        blob_name=blob_name,
+        permission=BlobSasPermissions(read=True),
+        expiry=expira,
+        **firma,
+    )
+    url = f"https://{ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER_NAME}/{blob_name}?{sas_token}"
+
+    _sas_cache[blob_name] = (url, expira)
+    _sas_cache.move_to_end(blob_name)
+    while len(_sas_cache) > SAS_CACHE_MAX:
+        _sas_cache.popitem(last=False)
+    return url
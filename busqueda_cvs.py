@@ -0,0 +1,199 @@
+"""Búsqueda de texto completo y aproximada sobre los CVs (``GET /cvs/buscar``).
+
+El texto extraído de cada CV se guarda en ``cv_textos`` (sql/010) con un
+``tsvector`` en configuración ``cv_es`` (español, sin acentos si está
+``unaccent``) indexado con GIN.
+
+- ``texto``: ``websearch_to_tsquery`` (admite ``"frases"``, ``OR`` y
+  ``-excluir``), ordenado por ``ts_rank_cd``.
+- ``aproximado``: similitud de trigramas (``pg_trgm``, operador ``<%``)
+  para errores de tipeo (``sketchap`` encuentra ``SketchUp``).
+- ``auto`` (por defecto): texto completo; si la primera página sale vacía
+  y ``pg_trgm`` está instalada, aproximado.
+
+Para que una palabra muy común no obligue a rankear cientos de miles de
+filas, solo se rankean los ``CV_SEARCH_MAX_CANDIDATES`` CVs más recientes
+que coinciden. Los fragmentos resaltados se calculan solo para la página
+devuelta; el texto se escapa y las coincidencias van en ``<mark>``.
+
+El índice GIN no guarda posiciones: una ``"frase"`` de palabras muy
+comunes se verifica fila por fila. ``CV_SEARCH_TIMEOUT_MS`` acota esos
+casos (responde 504 en lugar de retener la conexión).
+"""
+import difflib
+import html
+import os
+import re
+import unicodedata
+
+from fastapi import HTTPException
+from psycopg2 import errors
+
+from paginacion import codificar_cursor, decodificar_cursor
+
+MAX_CANDIDATOS = int(os.getenv("CV_SEARCH_MAX_CANDIDATES") or 5000)
+UMBRAL_TRGM = float(os.getenv("CV_SEARCH_TRGM_THRESHOLD") or 0.5)
+TIMEOUT_MS = int(os.getenv("CV_SEARCH_TIMEOUT_MS") or 3000)
+MODOS = ("auto", "texto", "aproximado")
+
+# Marcas de control: el texto se escapa después y se reemplazan por <mark>
+_INICIO, _FIN, _SEPARADOR = "\x02", "\x03", "\x01"
+_OPCIONES_HEADLINE = (f"StartSel={_INICIO}, StopSel={_FIN}, MaxFragments=3, MaxWords=18, MinWords=6, "
+                      f"FragmentDelimiter={_SEPARADOR}")
+_PALABRA = re.compile(r"\w+")
+
+_trgm = None  # pg_trgm instalada (se consulta una vez por worker)
+
+
+def trgm_disponible(conn) -> bool:
+    global _trgm
+    if _trgm is None:
+        cur = conn.cursor()
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+        _trgm = cur.fetchone()[0]
+        cur.close()
+    return _trgm
+
+
+def _marcar(texto: str) -> list:
+    """Fragmentos con las marcas de control pasados a HTML seguro."""
+    seguro = html.escape(texto.strip()).replace(_INICIO, "<mark>").replace(_FIN, "</mark>")
+    return [f.strip() for f in seguro.split(_SEPARADOR) if f.strip()]
+
+
+def _normalizar(palabra: str) -> str:
+    sin_acentos = unicodedata.normalize("NFKD", palabra.lower())
+    return "".join(c for c in sin_acentos if not unicodedata.combining(c))
+
+
+def _parecida(palabra: str, terminos: list, memo: dict) -> bool:
+    if palabra not in memo:
+        memo[palabra] = any(
+            palabra.startswith(t) or (abs(len(palabra) - len(t)) <= 3 and
+                                      difflib.SequenceMatcher(None, palabra, t).ratio() >= 0.75)
+            for t in terminos
+        )
+    return memo[palabra]
+
+
+def resaltar_aproximado(texto: str, consulta: str, palabras_contexto: int = 8, max_fragmentos: int = 3) -> list:
+    """Fragmentos alrededor de las palabras parecidas a los términos buscados."""
+    terminos = [_normalizar(t) for t in _PALABRA.findall(consulta) if len(t) >= 3]
+    if not terminos:
+        return []
+    palabras = list(_PALABRA.finditer(texto))
+    memo: dict = {}
+    aciertos = [i for i, m in enumerate(palabras) if _parecida(_normalizar(m.group()), terminos, memo)]
+    fragmentos, hasta = [], -1
+    for i in aciertos:
+        if i <= hasta:
+            continue
+        desde, hasta = max(0, i - palabras_contexto), min(len(palabras) - 1, i + palabras_contexto)
+        marcado, pos = [], palabras[desde].start()
+        for j in range(desde, hasta + 1):
+            m = palabras[j]
+            marcado.append(html.escape(texto[pos:m.start()]))
+            palabra = html.escape(m.group())
+            marcado.append(f"<mark>{palabra}</mark>" if j in aciertos else palabra)
+            pos = m.end()
+        fragmentos.append(" ".join("".join(marcado).split()))
+        if len(fragmentos) >= max_fragmentos:
+            break
+    return fragmentos
+
+
+def _sql(modo: str, con_estado: bool, con_cursor: bool) -> str:
+    # cv_textos.cv_id referencia a cvs: solo hace falta unir para filtrar por estado
+    union = "JOIN cvs c ON c.id = t.cv_id" if con_estado else ""
+    estado = "AND c.status_id = %(estado)s" if con_estado else ""
+    keyset = "WHERE (r.rank, r.cv_id) < (%(rank)s::real, %(ultimo)s)" if con_cursor else ""
+    if modo == "texto":
+        coincide = "t.documento @@ websearch_to_tsquery('cv_es', %(q)s)"
+        rank = "ts_rank_cd(documento, websearch_to_tsquery('cv_es', %(q)s), 32)"
+        resaltado = "ts_headline('cv_es', t.texto, websearch_to_tsquery('cv_es', %(q)s), %(opciones)s)"
+    else:
+        coincide = "%(q)s <%% t.texto"
+        rank = "word_similarity(%(q)s, texto)"
+        resaltado = "t.texto"
+    return f"""
+        WITH candidatos AS (
+            SELECT t.cv_id, {"t.documento" if modo == "texto" else "t.texto"}
+            FROM cv_textos t
+            {union}
+            WHERE {coincide} {estado}
+            ORDER BY t.cv_id DESC
+            LIMIT %(candidatos)s
+        ), pagina AS (
+            SELECT r.cv_id, r.rank
+            FROM (SELECT cv_id, {rank}::real AS rank FROM candidatos) r
+            {keyset}
+            ORDER BY r.rank DESC, r.cv_id DESC
+            LIMIT %(limite)s
+        )
+        SELECT p.cv_id, p.rank, c.file_path, c.uploaded_at, c.status_id,
+               u.id, u.first_name, u.last_name, u.email, {resaltado}
+        FROM pagina p
+        JOIN cv_textos t ON t.cv_id = p.cv_id
+        JOIN cvs c ON c.id = p.cv_id
+        JOIN users u ON u.id = c.user_id
+        ORDER BY p.rank DESC, p.cv_id DESC
+    """
+
+
+def _consultar(conn, modo: str, q: str, status_id, limite: int, posicion) -> list:
+    params = {"q": q, "estado": status_id, "candidatos": MAX_CANDIDATOS, "limite": limite + 1,
+              "opciones": _OPCIONES_HEADLINE}
+    if posicion:
+        params["rank"], params["ultimo"] = posicion
+    cur = conn.cursor()
+    try:
+        # Locales a la transacción: el pool la revierte al devolver la conexión
+        cur.execute("SELECT set_config('statement_timeout', %s, true)", (str(TIMEOUT_MS),))
+        if modo == "aproximado":
+            cur.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", (str(UMBRAL_TRGM),))
+        cur.execute(_sql(modo, status_id is not None, bool(posicion)), params)
+        return cur.fetchall()
+    except errors.QueryCanceled:
+        raise HTTPException(status_code=504, detail="La búsqueda tardó demasiado; pruebe términos más específicos")
+    finally:
+        cur.close()
+
+
+def buscar(conn, q: str, status_id: int | None, modo: str, limite: int, cursor: str | None) -> tuple:
+    """``(resultados, modo_usado, cursor_siguiente)``."""
+    posicion = None
+    if cursor:
+        try:
+            modo, rank, ultimo = decodificar_cursor(cursor)
+            posicion = (float(rank), int(ultimo))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        if modo not in ("texto", "aproximado"):
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    if modo == "aproximado" and not trgm_disponible(conn):
+        raise HTTPException(status_code=400, detail="La búsqueda aproximada necesita la extensión pg_trgm")
+
+    usado = "texto" if modo == "auto" else modo
+    filas = _consultar(conn, usado, q, status_id, limite, posicion)
+    if modo == "auto" and not filas and trgm_disponible(conn):
+        usado = "aproximado"
+        filas = _consultar(conn, usado, q, status_id, limite, posicion)
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(usado, filas[-1][1], filas[-1][0])
+
+    resultados = [{
+        "cv_id": f[0],
+        "rank": round(f[1], 6),
+        "file_path": f[2],
+        "uploaded_at": f[3].isoformat() if f[3] else None,
+        "status_id": f[4],
+        "user_id": f[5],
+        "nombre": f"{f[6]} {f[7]}",
+        "email": f[8],
+        "fragmentos": _marcar(f[9]) if usado == "texto" else resaltar_aproximado(f[9], q),
+    } for f in filas]
+    return resultados, usado, siguiente
@@ -0,0 +1,119 @@
+"""Caché del catálogo de servicios (``GET /services/``).
+
+La lista se lee de PostgreSQL al primer uso y se guarda ya serializada en
+JSON, junto con su ETag, durante ``SERVICES_CACHE_TTL`` segundos. Las
+escrituras (crear/actualizar/eliminar) la invalidan en este worker y
+publican un ``NOTIFY`` en el canal ``services_cambios``; ``escuchar``
+mantiene una conexión dedicada con ``LISTEN`` para que los demás workers
+de gunicorn también la descarten (``SERVICES_CACHE_LISTEN=0`` lo apaga).
+
+Cada invalidación sube una generación: una carga que empezó antes de una
+escritura no deja en caché un catálogo viejo.
+"""
+import asyncio
+import hashlib
+import os
+import time
+
+import asyncpg
+
+import serializacion
+from database_async import get_async_pool
+
+TTL = float(os.getenv("SERVICES_CACHE_TTL") or 300)
+ESCUCHAR = os.getenv("SERVICES_CACHE_LISTEN", "1") != "0"
+CANAL = "services_cambios"
+
+_entrada = None  # (cuerpo, etag, expira)
+_generacion = 0
+_lock = asyncio.Lock()
+contadores = {"hits": 0, "misses": 0, "invalidaciones": 0, "notificaciones": 0}
+
+
+async def _cargar() -> tuple:
+    pool = await get_async_pool()
+    filas = await pool.fetch("SELECT id, name, description, image_url FROM services ORDER BY id")
+    cuerpo = serializacion.dumps([dict(f) for f in filas])
+    etag = '"' + hashlib.sha256(cuerpo).hexdigest()[:32] + '"'
+    return cuerpo, etag
+
+
+async def obtener() -> tuple:
+    """``(cuerpo_json, etag)`` del catálogo, desde caché si sigue vigente."""
+    global _entrada
+    entrada = _entrada
+    if entrada and entrada[2] > time.monotonic():
+        contadores["hits"] += 1
+        return entrada[0], entrada[1]
+
+    # Una sola carga a la vez; las demás peticiones esperan y reutilizan el resultado
+    async with _lock:
+        entrada = _entrada
+        if entrada and entrada[2] > time.monotonic():
+            contadores["hits"] += 1
+            return entrada[0], entrada[1]
+        contadores["misses"] += 1
+        generacion = _generacion
+        cuerpo, etag = await _cargar()
+        if generacion == _generacion:
+            _entrada = (cuerpo, etag, time.monotonic() + TTL)
+        return cuerpo, etag
+
+
+def invalidar():
+    global _entrada, _generacion
+    _entrada = None
+    _generacion += 1
+    contadores["invalidaciones"] += 1
+
+
+async def notificar_cambio(conn: asyncpg.Connection):
+    """Invalida la caché local y avisa al resto de workers."""
+    invalidar()
+    await conn.execute("SELECT pg_notify($1, '')", CANAL)
+
+
+def _al_notificar(conn, pid, canal, payload):
+    contadores["notificaciones"] += 1
+    invalidar()
+
+
+async def escuchar():
+    """Tarea de fondo: ``LISTEN services_cambios`` con reconexión."""
+    if not ESCUCHAR:
+        return
+    espera = 1
+    while True:
+        conn = None
+        try:
+            pool = await get_async_pool()
+            conn = await pool.acquire()
+            await conn.add_listener(CANAL, _al_notificar)
+            # Lo escrito mientras no escuchábamos no llegó: se descarta la caché
+            invalidar()
+            espera = 1
+            while not conn.is_closed():
+                await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[SERVICIOS] LISTEN {CANAL} falló: {e}")
+        finally:
+            if conn is not None:
+                try:
+                    await conn.remove_listener(CANAL, _al_notificar)
+                    await (await get_async_pool()).release(conn)
+                except Exception:
+                    pass
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, 60)
+
+
+def estadisticas() -> dict:
+    entrada = _entrada
+    return {
+        **contadores,
+        "vigente": bool(entrada and entrada[2] > time.monotonic()),
+        "etag": entrada[1] if entrada else None,
+        "ttl": TTL,
+    }
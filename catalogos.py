@@ -0,0 +1,110 @@
+"""Registro en memoria de las tablas de referencia ``cv_statuses`` y ``roles``.
+
+Son tablas pequeñas que casi nunca cambian: se cargan al arrancar y los
+caminos calientes resuelven nombre ↔ id sin consultar ni hacer JOIN.
+Un nombre desconocido provoca una recarga (como mucho una cada
+``CATALOGOS_RECARGA_MIN`` segundos) y ``POST /admin/catalogos/refrescar``
+recarga todo a mano.
+
+``id_estado_cv`` crea el estado si no existe. La inserción se serializa con
+un advisory lock por nombre, así dos postulaciones simultáneas con un
+estado nuevo no crean filas duplicadas aunque la tabla no tenga índice
+único en ``name``.
+"""
+import os
+import threading
+import time
+
+from database_async import get_async_pool
+
+RECARGA_MIN = float(os.getenv("CATALOGOS_RECARGA_MIN") or 5)
+
+
+class Catalogo:
+    def __init__(self, tabla: str):
+        self.tabla = tabla
+        self._por_nombre: dict = {}
+        self._por_id: dict = {}
+        self._cargado_en = 0.0
+        self._lock = threading.Lock()
+
+    def _reemplazar(self, filas):
+        por_id = {fila[0]: fila[1] for fila in filas}
+        with self._lock:
+            self._por_id = por_id
+            self._por_nombre = {nombre: id_ for id_, nombre in por_id.items()}
+            self._cargado_en = time.monotonic()
+
+    def _agregar(self, id_: int, nombre: str):
+        with self._lock:
+            self._por_id = {**self._por_id, id_: nombre}
+            self._por_nombre = {**self._por_nombre, nombre: id_}
+
+    def id(self, nombre: str) -> int | None:
+        return self._por_nombre.get(nombre)
+
+    def nombre(self, id_: int) -> str | None:
+        return self._por_id.get(id_)
+
+    def puede_recargar(self) -> bool:
+        return time.monotonic() - self._cargado_en >= RECARGA_MIN
+
+    def recargar(self, conn):
+        """Recarga síncrona con una conexión psycopg2 (endpoints ``def``)."""
+        cur = conn.cursor()
+        cur.execute(f"SELECT id, name FROM {self.tabla}")
+        self._reemplazar(cur.fetchall())
+        cur.close()
+
+    async def recargar_async(self):
+        pool = await get_async_pool()
+        self._reemplazar(await pool.fetch(f"SELECT id, name FROM {self.tabla}"))
+
+    def resolver_id(self, conn, nombre: str) -> int | None:
+        """``id`` de ``nombre``; si no está, recarga una vez con ``conn``."""
+        id_ = self.id(nombre)
+        if id_ is None and self.puede_recargar():
+            self.recargar(conn)
+            id_ = self.id(nombre)
+        return id_
+
+    def resolver_nombres(self, conn, ids) -> dict:
+        """``{id: nombre}`` para ``ids``, recargando si falta alguno."""
+        if any(i not in self._por_id for i in ids) and self.puede_recargar():
+            self.recargar(conn)
+        por_id = self._por_id
+        return {i: por_id.get(i) for i in ids}
+
+    def contenido(self) -> dict:
+        return dict(self._por_nombre)
+
+
+estados_cv = Catalogo("cv_statuses")
+roles = Catalogo("roles")
+
+
+async def cargar():
+    """Precarga ambos catálogos (startup)."""
+    await estados_cv.recargar_async()
+    await roles.recargar_async()
+
+
+async def id_estado_cv(nombre: str) -> int:
+    """``id`` del estado de CV ``nombre``, creándolo si hace falta."""
+    id_ = estados_cv.id(nombre)
+    if id_ is not None:
+        return id_
+
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('cv_statuses:' || $1))", nombre)
+            id_ = await conn.fetchval("SELECT id FROM cv_statuses WHERE name = $1", nombre)
+            if id_ is None:
+                id_ = await conn.fetchval("INSERT INTO cv_statuses (name) VALUES ($1) RETURNING id", nombre)
+    estados_cv._agregar(id_, nombre)
+    return id_
+
+
+def estadisticas() -> dict:
+    return {"cv_statuses": estados_cv.contenido(), "roles": roles.contenido()}
@@ -0,0 +1,255 @@
+"""Registro de consultas lentas y estadísticas por huella de SQL.
+
+Cada consulta que pasa por el cursor de ``database_postgres`` (y por el
+query logger del pool asyncpg) se normaliza (literales y parámetros a
+``?``, listas ``IN (...)`` colapsadas, espacios compactados) y se agrega
+por huella: llamadas, tiempo total/máximo, filas, errores y lentas.
+
+Las que tardan más de ``SLOW_QUERY_MS`` se imprimen con ``[SQL LENTA]``
+junto con la cantidad de parámetros y de filas. Con
+``SLOW_QUERY_EXPLAIN_RATE`` > 0 una fracción de las lentas de solo
+lectura (``SELECT``/``WITH`` sin escrituras) se vuelve a ejecutar con
+``EXPLAIN (ANALYZE, BUFFERS)`` en la misma conexión, dentro de un
+savepoint que siempre se revierte y con ``statement_timeout`` acotado;
+como mucho una vez cada ``SLOW_QUERY_EXPLAIN_INTERVAL`` segundos por
+huella, porque repetir la consulta suma su duración a la petición. El
+último plan queda en ``GET /admin/consultas/{huella}``. En asyncpg el
+logger es síncrono, así que ahí solo se registran tiempos.
+
+``SLOW_QUERY_LOG=0`` lo apaga. Las estadísticas son por worker.
+"""
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+
+from psycopg2 import extensions
+
+ACTIVO = os.getenv("SLOW_QUERY_LOG", "1") != "0"
+UMBRAL = float(os.getenv("SLOW_QUERY_MS") or 500) / 1000
+TASA_EXPLAIN = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE") or 0)
+INTERVALO_EXPLAIN = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL") or 300)
+TIMEOUT_EXPLAIN_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS") or 5000)
+MAX_HUELLAS = int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS") or 500)
+
+_COMENTARIOS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_PARAMETROS = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_NUMEROS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ARREGLOS = re.compile(r"ARRAY\[\s*\?(?:\s*,\s*\?)*\s*\]", re.I)
+_ESPACIOS = re.compile(r"\s+")
+_ESCRITURA = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+UPDATE|FOR\s+SHARE|NEXTVAL|SETVAL|PG_NOTIFY|"
+                        r"PG_ADVISORY\w*|REGISTRAR_\w+)\b", re.I)
+_RESET_POOL = "RESET ALL;"
+
+_lock = threading.Lock()
+_stats: dict = {}  # huella -> dict con los acumulados
+contadores = {"lentas": 0, "planes": 0, "errores_explain": 0, "descartadas": 0}
+
+
+@lru_cache(maxsize=2048)
+def normalizar(sql: str) -> tuple:
+    """``(texto_normalizado, huella)``; las consultas del repo son constantes,
+    así que casi siempre sale de la caché."""
+    texto = _COMENTARIOS.sub(" ", sql)
+    texto = _CADENAS.sub("?", texto)
+    texto = _PARAMETROS.sub("?", texto)
+    texto = _NUMEROS.sub("?", texto)
+    texto = _ESPACIOS.sub(" ", texto).strip().rstrip(";").strip()
+    texto = _LISTAS.sub("(?...)", texto)
+    texto = _ARREGLOS.sub("ARRAY[?...]", texto)
+    return texto, hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def _texto(query, cursor) -> str:
+    if isinstance(query, str):
+        return query
+    if isinstance(query, bytes):
+        return query.decode("utf-8", "replace")
+    # psycopg2.sql.Composed
+    return query.as_string(cursor)
+
+
+def _cantidad(params) -> int:
+    if params is None:
+        return 0
+    try:
+        return len(params)
+    except TypeError:
+        return 1
+
+
+def _es_solo_lectura(texto: str) -> bool:
+    if _ESCRITURA.search(texto):
+        return False
+    return texto[:7].upper() == "SELECT " or texto[:5].upper() == "WITH "
+
+
+def _acumular(motor: str, texto: str, huella: str, n_params: int, filas, segundos: float, error: bool) -> dict:
+    with _lock:
+        s = _stats.get(huella)
+        if s is None:
+            if len(_stats) >= MAX_HUELLAS:
+                # Se descarta la huella con menos tiempo acumulado
+                menor = min(_stats, key=lambda h: _stats[h]["total_s"])
+                del _stats[menor]
+                contadores["descartadas"] += 1
+            s = _stats[huella] = {
+                "huella": huella, "motor": motor, "consulta": texto, "llamadas": 0, "errores": 0,
+                "lentas": 0, "total_s": 0.0, "max_s": 0.0, "filas": 0, "parametros": n_params,
+                "ultima_lenta": None, "plan": None, "plan_en": None, "_ultimo_explain": 0.0,
+            }
+        s["llamadas"] += 1
+        s["total_s"] += segundos
+        s["max_s"] = max(s["max_s"], segundos)
+        s["parametros"] = n_params
+        if error:
+            s["errores"] += 1
+        if filas is not None and filas > 0:
+            s["filas"] += filas
+        if segundos >= UMBRAL:
+            s["lentas"] += 1
+            s["ultima_lenta"] = time.time()
+            contadores["lentas"] += 1
+        return s
+
+
+def _reportar(motor: str, texto: str, huella: str, n_params: int, filas, segundos: float, error: bool):
+    print(f"[SQL LENTA] {segundos * 1000:.0f} ms {motor} huella={huella} params={n_params} "
+          f"filas={filas if filas is not None else '-'}{' ERROR' if error else ''} {texto[:500]}")
+
+
+def _toca_explain(s: dict, texto: str) -> bool:
+    if TASA_EXPLAIN <= 0 or random.random() >= TASA_EXPLAIN:
+        return False
+    if not _es_solo_lectura(texto):
+        return False
+    with _lock:
+        ahora = time.monotonic()
+        if ahora - s["_ultimo_explain"] < INTERVALO_EXPLAIN and s["plan"] is not None:
+            return False
+        s["_ultimo_explain"] = ahora
+    return True
+
+
+def _explain(cursor, query, params) -> str:
+    conn = cursor.connection
+    if conn.info.transaction_status == extensions.TRANSACTION_STATUS_INERROR:
+        raise RuntimeError("transacción abortada")
+    sql = cursor.mogrify(query, params)
+    # Cursor base (no CursorMedido): el EXPLAIN no cuenta como consulta de la app
+    cur = conn.cursor(cursor_factory=extensions.cursor)
+    autocommit = conn.autocommit
+    try:
+        cur.execute("BEGIN" if autocommit else "SAVEPOINT consultas_lentas_explain")
+        try:
+            cur.execute(f"SET LOCAL statement_timeout = {TIMEOUT_EXPLAIN_MS}")
+            cur.execute(b"EXPLAIN (ANALYZE, BUFFERS) " + sql)
+            return "\n".join(fila[0] for fila in cur.fetchall())
+        finally:
+            # Siempre se revierte: lo que haya hecho la consulta no queda
+            if autocommit:
+                cur.execute("ROLLBACK")
+            else:
+                cur.execute("ROLLBACK TO SAVEPOINT consultas_lentas_explain")
+                cur.execute("RELEASE SAVEPOINT consultas_lentas_explain")
+    finally:
+        cur.close()
+
+
+def observar_psycopg2(cursor, query, params, segundos: float, error: bool, lote: bool = False):
+    """Llamado por ``CursorMedido`` después de cada ``execute``/``executemany``."""
+    if not ACTIVO:
+        return
+    try:
+        texto, huella = normalizar(_texto(query, cursor))
+        n_params = sum(_cantidad(p) for p in params) if lote else _cantidad(params)
+        filas = None if error else cursor.rowcount
+        s = _acumular("psycopg2", texto, huella, n_params, filas, segundos, error)
+        if segundos < UMBRAL:
+            return
+        _reportar("psycopg2", texto, huella, n_params, filas, segundos, error)
+        if error or lote or cursor.name or not _toca_explain(s, texto):
+            return
+        try:
+            plan = _explain(cursor, query, params)
+        except Exception as e:
+            contadores["errores_explain"] += 1
+            print(f"[SQL LENTA] EXPLAIN de {huella} falló: {e}")
+            return
+        with _lock:
+            s["plan"], s["plan_en"] = plan, time.time()
+        contadores["planes"] += 1
+    except Exception as e:
+        # El registro nunca debe romper la consulta de la app
+        print(f"[SQL LENTA] {e}")
+
+
+def query_logger_asyncpg(registro):
+    """Callback para ``asyncpg.Connection.add_query_logger``."""
+    if not ACTIVO or registro.query.endswith(_RESET_POOL):
+        return
+    try:
+        texto, huella = normalizar(registro.query)
+        error = registro.exception is not None
+        n_params = _cantidad(registro.args)
+        _acumular("asyncpg", texto, huella, n_params, None, registro.elapsed, error)
+        if registro.elapsed >= UMBRAL:
+            _reportar("asyncpg", texto, huella, n_params, None, registro.elapsed, error)
+    except Exception as e:
+        print(f"[SQL LENTA] {e}")
+
+
+# --- consulta de las estadísticas ----------------------------------------
+
+ORDENES = {
+    "total": lambda s: s["total_s"],
+    "media": lambda s: s["total_s"] / s["llamadas"],
+    "max": lambda s: s["max_s"],
+    "llamadas": lambda s: s["llamadas"],
+    "lentas": lambda s: s["lentas"],
+}
+
+
+def _publica(s: dict, con_plan: bool = False) -> dict:
+    fila = {k: v for k, v in s.items() if not k.startswith("_") and (con_plan or k != "plan")}
+    fila["media_ms"] = round(s["total_s"] / s["llamadas"] * 1000, 3) if s["llamadas"] else 0.0
+    fila["total_ms"] = round(fila.pop("total_s") * 1000, 3)
+    fila["max_ms"] = round(fila.pop("max_s") * 1000, 3)
+    if not con_plan:
+        fila["con_plan"] = s["plan"] is not None
+    return fila
+
+
+def estadisticas(orden: str = "total", limite: int = 50, motor: str | None = None) -> dict:
+    with _lock:
+        filas = [dict(s) for s in _stats.values() if motor is None or s["motor"] == motor]
+    filas.sort(key=ORDENES[orden], reverse=True)
+    return {
+        "activo": ACTIVO,
+        "umbral_ms": UMBRAL * 1000,
+        "tasa_explain": TASA_EXPLAIN,
+        "huellas": len(filas),
+        **contadores,
+        "consultas": [_publica(s) for s in filas[:limite]],
+    }
+
+
+def detalle(huella: str) -> dict | None:
+    with _lock:
+        s = _stats.get(huella)
+        s = dict(s) if s else None
+    return _publica(s, con_plan=True) if s else None
+
+
+def reiniciar() -> int:
+    with _lock:
+        n = len(_stats)
+        _stats.clear()
+    for clave in contadores:
+        contadores[clave] = 0
+    return n
@@ -0,0 +1,295 @@
+"""Envío de correos en segundo plano a través de la tabla ``email_outbox``.
+
+Los endpoints solo insertan el mensaje (``encolar``) con su propio cursor,
+dentro de la misma transacción que el cambio que lo origina: si la
+transacción se revierte no sale ningún correo, y un SMTP lento o caído ya
+no hace fallar ni colgar la petición.
+
+``enviar_pendientes`` (tarea de fondo en cada worker) reclama tandas de
+hasta ``EMAIL_BATCH_SIZE`` mensajes con ``FOR UPDATE SKIP LOCKED`` y los
+envía por una única conexión SMTP autenticada que se reutiliza entre
+tandas y se cierra tras ``EMAIL_IDLE_TIMEOUT`` segundos sin uso. Los
+errores transitorios se reintentan con backoff exponencial; un
+destinatario rechazado falla sin reintentos. Si no se puede conectar o
+autenticar (o el servidor rechaza al remitente), la tanda vuelve a
+``pending`` sin gastar intentos y no se intenta otro login hasta que pase
+un backoff que crece con cada fallo seguido: un error de credenciales no
+hace fallar los correos ni multiplica los logins. Para pruebas locales sirve
+``python -m aiosmtpd -n -l localhost:1025`` con ``SMTP_HOST=localhost
+SMTP_PORT=1025 SMTP_SSL=0``.
+"""
+import asyncio
+import os
+import random
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+from database_async import get_async_pool
+
+SMTP_HOST = os.getenv("SMTP_HOST") or "smtp.gmail.com"
+SMTP_PORT = int(os.getenv("SMTP_PORT") or 465)
+SMTP_SSL = os.getenv("SMTP_SSL", "1") == "1"
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT") or 30)
+
+TAMANO_TANDA = int(os.getenv("EMAIL_BATCH_SIZE") or 20)
+MAX_INTENTOS = int(os.getenv("EMAIL_MAX_ATTEMPTS") or 5)
+BACKOFF_BASE = float(os.getenv("EMAIL_BACKOFF_BASE") or 30)
+INTERVALO = float(os.getenv("EMAIL_POLL_INTERVAL") or 5)
+INACTIVIDAD = float(os.getenv("EMAIL_IDLE_TIMEOUT") or 60)
+BLOQUEO_MAX = float(os.getenv("EMAIL_LOCK_TIMEOUT") or 600)
+
+_smtp: smtplib.SMTP | None = None
+_ultimo_uso = 0.0
+_smtp_lock = threading.Lock()
+_fallos_conexion = 0  # fallos seguidos al conectar/autenticar
+_pausa_hasta = 0.0  # time.monotonic() antes del cual no se reintenta el login
+_aviso: asyncio.Event | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+contadores = {"enviados": 0, "reintentos": 0, "fallidos": 0, "conexiones": 0, "fallos_conexion": 0}
+
+
+class ErrorConexion(Exception):
+    """No se pudo conectar o autenticar con el servidor SMTP."""
+
+
+def encolar(cur, destinatario: str, asunto: str, cuerpo: str) -> int:
+    """Inserta el correo con el cursor (psycopg2) de la transacción en curso."""
+    cur.execute(
+        """INSERT INTO email_outbox (destinatario, asunto, cuerpo, max_attempts)
+           VALUES (%s, %s, %s, %s) RETURNING id""",
+        (destinatario, asunto, cuerpo, MAX_INTENTOS),
+    )
+    return cur.fetchone()[0]
+
+
+def avisar():
+    """Despierta al sender de este worker (llamar después del commit)."""
+    if _loop is not None and _aviso is not None:
+        _loop.call_soon_threadsafe(_aviso.set)
+
+
+# --- conexión SMTP ------------------------------------------------------
+
+def _conectar() -> smtplib.SMTP:
+    if SMTP_SSL:
+        smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    else:
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            smtp.starttls()
+    password = os.getenv("EMAIL_PASSWORD")
+    if password:
+        smtp.login(os.getenv("EMAIL_SENDER"), password)
+    contadores["conexiones"] += 1
+    return smtp
+
+
+def _cerrar_smtp():
+    global _smtp
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except Exception:
+            pass
+        _smtp = None
+
+
+def _cerrar_si_inactivo(forzar: bool = False):
+    with _smtp_lock:
+        if forzar or time.monotonic() - _ultimo_uso > INACTIVIDAD:
+            _cerrar_smtp()
+
+
+def _get_smtp() -> smtplib.SMTP:
+    global _smtp
+    if _smtp is not None and time.monotonic() - _ultimo_uso > INACTIVIDAD:
+        _cerrar_smtp()
+    if _smtp is None:
+        try:
+            _smtp = _conectar()
+        except OSError as e:  # smtplib.SMTPException incluida
+            raise ErrorConexion(f"Conexión SMTP: {e}") from e
+    return _smtp
+
+
+def _espera_conexion() -> float:
+    return BACKOFF_BASE * 2 ** min(_fallos_conexion - 1, 6) * random.uniform(0.5, 1.5)
+
+
+def _mensaje(fila) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = fila["asunto"]
+    msg["From"] = os.getenv("EMAIL_SENDER")
+    msg["To"] = fila["destinatario"]
+    msg.set_content(fila["cuerpo"])
+    return msg
+
+
+def _enviar_tanda(filas: list) -> list:
+    """Envía por la conexión compartida. Devuelve ``(id, error, reintentar,
+    conexion)`` por mensaje; ``conexion`` marca los que no se enviaron por
+    un problema de la conexión o de la cuenta, no del mensaje. Corre en un hilo."""
+    global _ultimo_uso, _fallos_conexion, _pausa_hasta
+    resultados = []
+    caido = None
+    with _smtp_lock:
+        if time.monotonic() < _pausa_hasta:
+            caido = "Conexión SMTP en pausa tras fallos seguidos"
+        for fila in filas:
+            if caido:
+                # Sin conexión usable: el resto de la tanda se reintenta luego
+                resultados.append((fila["id"], caido, True, True))
+                continue
+            for intento in (1, 2):
+                try:
+                    smtp = _get_smtp()
+                except ErrorConexion as e:
+                    caido = str(e)
+                    resultados.append((fila["id"], caido, True, True))
+                    break
+                try:
+                    smtp.send_message(_mensaje(fila))
+                    resultados.append((fila["id"], None, False, False))
+                    _fallos_conexion = 0
+                except smtplib.SMTPRecipientsRefused as e:
+                    resultados.append((fila["id"], f"Destinatario rechazado: {e.recipients}", False, False))
+                except (smtplib.SMTPSenderRefused, smtplib.SMTPAuthenticationError) as e:
+                    # Remitente o cuenta (p. ej. 530 sin login): no es culpa del mensaje
+                    _cerrar_smtp()
+                    caido = f"{e.smtp_code} {e.smtp_error!r}"
+                    resultados.append((fila["id"], caido, True, True))
+                except smtplib.SMTPResponseException as e:
+                    # 5xx es permanente; 4xx se reintenta
+                    resultados.append((fila["id"], f"{e.smtp_code} {e.smtp_error!r}", e.smtp_code < 500, False))
+                except OSError as e:
+                    # Desconexión o error de red (SMTPServerDisconnected incluido): la
+                    # conexión reutilizada pudo caducar, se reconecta una vez
+                    _cerrar_smtp()
+                    if intento == 1:
+                        continue
+                    caido = str(e) or type(e).__name__
+                    resultados.append((fila["id"], caido, True, True))
+                except Exception as e:
+                    resultados.append((fila["id"], str(e), True, False))
+                break
+        if caido and time.monotonic() >= _pausa_hasta:
+            _fallos_conexion += 1
+            contadores["fallos_conexion"] += 1
+            _pausa_hasta = time.monotonic() + _espera_conexion()
+            print(f"[CORREO] {caido}; se reintenta en {_pausa_hasta - time.monotonic():.0f} s")
+        _ultimo_uso = time.monotonic()
+    return resultados
+
+
+# --- sender ---------------------------------------------------------------
+
+async def _reclamar(pool) -> list:
+    return await pool.fetch(
+        """
+        UPDATE email_outbox
+        SET status = 'sending', locked_at = now(), attempts = attempts + 1
+        WHERE id IN (
+            SELECT id FROM email_outbox
+            WHERE (status = 'pending' AND run_after <= now())
+               OR (status = 'sending' AND locked_at < now() - make_interval(secs => $2))
+            ORDER BY run_after
+            FOR UPDATE SKIP LOCKED
+            LIMIT $1
+        )
+        RETURNING id, destinatario, asunto, cuerpo, attempts, max_attempts
+        """,
+        TAMANO_TANDA, BLOQUEO_MAX,
+    )
+
+
+async def _registrar(pool, filas: list, resultados: list):
+    por_id = {fila["id"]: fila for fila in filas}
+    ids, estados, errores, esperas, devolver = [], [], [], [], []
+    for id_, error, reintentar, conexion in resultados:
+        fila = por_id[id_]
+        if error is None:
+            estado, espera = "sent", 0.0
+            contadores["enviados"] += 1
+        elif conexion:
+            # No cuenta como intento del mensaje; espera lo mismo que el login
+            estado, espera = "pending", max(_pausa_hasta - time.monotonic(), 0.0)
+            contadores["reintentos"] += 1
+        elif reintentar and fila["attempts"] < fila["max_attempts"]:
+            estado = "pending"
+            espera = BACKOFF_BASE * 2 ** (fila["attempts"] - 1) * random.uniform(0.5, 1.5)
+            contadores["reintentos"] += 1
+        else:
+            estado, espera = "failed", 0.0
+            contadores["fallidos"] += 1
+            print(f"[CORREO] {id_} a {fila['destinatario']} falló: {error}")
+        ids.append(id_)
+        estados.append(estado)
+        errores.append(error)
+        esperas.append(espera)
+        devolver.append(bool(conexion and error is not None))
+
+    await pool.execute(
+        """
+        UPDATE email_outbox o
+        SET status = t.estado, error = t.error, locked_at = NULL,
+            attempts = o.attempts - CASE WHEN t.devolver THEN 1 ELSE 0 END,
+            run_after = now() + make_interval(secs => t.espera),
+            sent_at = CASE WHEN t.estado = 'sent' THEN now() END,
+            cuerpo = CASE WHEN t.estado = 'sent' THEN '' ELSE o.cuerpo END
+        FROM unnest($1::bigint[], $2::text[], $3::text[], $4::float8[], $5::bool[])
+             AS t(id, estado, error, espera, devolver)
+        WHERE o.id = t.id
+        """,
+        ids, estados, errores, esperas, devolver,
+    )
+
+
+async def enviar_pendientes():
+    """Tarea de fondo: envía la bandeja de salida por tandas."""
+    global _aviso, _loop
+    _loop = asyncio.get_running_loop()
+    _aviso = asyncio.Event()
+    try:
+        while True:
+            filas = []
+            try:
+                pool = await get_async_pool()
+                filas = await _reclamar(pool)
+                if filas:
+                    resultados = await asyncio.to_thread(_enviar_tanda, filas)
+                    await _registrar(pool, filas, resultados)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[CORREO] {e}")
+            if len(filas) < TAMANO_TANDA:
+                _aviso.clear()
+                try:
+                    await asyncio.wait_for(_aviso.wait(), timeout=INTERVALO)
+                except asyncio.TimeoutError:
+                    # Sin actividad: no mantener la sesión SMTP abierta de más
+                    if _smtp is not None:
+                        await asyncio.to_thread(_cerrar_si_inactivo)
+    finally:
+        _loop = None
+        await asyncio.to_thread(_cerrar_si_inactivo, True)
+
+
+async def estado(correo_id: int) -> dict | None:
+    pool = await get_async_pool()
+    fila = await pool.fetchrow(
+        """SELECT id, destinatario, asunto, status, attempts, max_attempts, error,
+                  created_at, run_after, sent_at
+           FROM email_outbox WHERE id = $1""",
+        correo_id,
+    )
+    return dict(fila) if fila else None
+
+
+async def resumen() -> dict:
+    pool = await get_async_pool()
+    filas = await pool.fetch("SELECT status, COUNT(*) AS n FROM email_outbox GROUP BY status")
+    return {"por_estado": {f["status"]: f["n"] for f in filas}, **contadores}
@@ -0,0 +1,192 @@
+"""Contraseñas con hash, verificación fuera del event loop y límite de intentos.
+
+- Hash ``scrypt`` (stdlib) con coste configurable: ``LOGIN_SCRYPT_N``
+  (potencia de 2), ``LOGIN_SCRYPT_R`` y ``LOGIN_SCRYPT_P``. Se guarda como
+  ``scrypt$n$r$p$sal$hash`` (base64), así un cambio de coste no invalida
+  los hashes existentes: se rehacen en el siguiente login correcto.
+- Las contraseñas antiguas en texto plano se aceptan (comparación en
+  tiempo constante) y se migran a hash al entrar.
+- La verificación corre en un pool de hilos propio (``LOGIN_HASH_WORKERS``)
+  para no bloquear el loop ni agotar el threadpool de FastAPI. Si el
+  correo no existe se verifica igual contra un hash ficticio, para que el
+  tiempo de respuesta no revele qué correos están registrados.
+- Límite de intentos fallidos en memoria por correo y, si se configura
+  ``LOGIN_MAX_FALLOS_IP``, por IP (ventana fija). Detrás de un proxy (el
+  front-end de Azure App Service) ``request.client.host`` es la IP del
+  proxy: ``LOGIN_TRUSTED_PROXIES`` (IPs o redes separadas por coma, o
+  ``*`` para confiar en el salto inmediato) permite tomar la IP del
+  cliente de ``X-Forwarded-For``. Sin esa opción el límite por IP
+  bloquearía a todos los clientes a la vez, por eso viene apagado.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import ipaddress
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+SCRYPT_N = 2 ** int(os.getenv("LOGIN_SCRYPT_N") or 14)
+SCRYPT_R = int(os.getenv("LOGIN_SCRYPT_R") or 8)
+SCRYPT_P = int(os.getenv("LOGIN_SCRYPT_P") or 1)
+WORKERS = int(os.getenv("LOGIN_HASH_WORKERS") or min(4, os.cpu_count() or 1))
+
+PREFIJO = "scrypt$"
+
+_pool: ThreadPoolExecutor | None = None
+
+
+def _b64(datos: bytes) -> str:
+    return base64.b64encode(datos).decode("ascii")
+
+
+def _scrypt(password: str, sal: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode("utf-8"), salt=sal, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+
+def hashear(password: str) -> str:
+    sal = secrets.token_bytes(16)
+    clave = _scrypt(password, sal, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{PREFIJO}{SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(sal)}${_b64(clave)}"
+
+
+@lru_cache(maxsize=1)
+def _ficticio() -> str:
+    # Se calcula en el primer login con correo inexistente, no al importar
+    return hashear(secrets.token_hex(16))
+
+
+def verificar(password: str, almacenado: str | None) -> tuple:
+    """``(correcta, rehacer)``: ``rehacer`` indica que conviene guardar un
+    hash nuevo (texto plano o coste distinto del actual)."""
+    if almacenado is None:
+        verificar(password, _ficticio())
+        return False, False
+    if not almacenado.startswith(PREFIJO):
+        # Contraseña heredada en texto plano
+        correcta = hmac.compare_digest(password.encode("utf-8"), almacenado.encode("utf-8"))
+        return correcta, correcta
+    _, n, r, p, sal, clave = almacenado.split("$")
+    n, r, p = int(n), int(r), int(p)
+    calculada = _scrypt(password, base64.b64decode(sal), n, r, p)
+    correcta = hmac.compare_digest(calculada, base64.b64decode(clave))
+    return correcta, correcta and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="hash")
+    return _pool
+
+
+def cerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def verificar_async(password: str, almacenado: str | None) -> tuple:
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), verificar, password, almacenado)
+
+
+async def hashear_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), hashear, password)
+
+
+# --- límite de intentos -------------------------------------------------
+
+class LimiteIntentos:
+    """Cuenta intentos fallidos por clave en ventanas fijas de ``ventana`` segundos."""
+
+    def __init__(self, maximo: int, ventana: float, max_claves: int = 100000):
+        self.maximo = maximo
+        self.ventana = ventana
+        self.max_claves = max_claves
+        self._contadores: dict = {}  # clave -> (fallos, inicio_ventana)
+
+    def bloqueado(self, clave: str) -> float:
+        """Segundos que faltan para poder reintentar (0 si no está bloqueado)."""
+        if self.maximo <= 0:
+            return 0.0
+        fallos, inicio = self._contadores.get(clave, (0, 0.0))
+        restante = inicio + self.ventana - time.monotonic()
+        return restante if fallos >= self.maximo and restante > 0 else 0.0
+
+    def fallo(self, clave: str):
+        if self.maximo <= 0:
+            return
+        ahora = time.monotonic()
+        fallos, inicio = self._contadores.get(clave, (0, ahora))
+        if ahora - inicio > self.ventana:
+            fallos, inicio = 0, ahora
+        self._contadores[clave] = (fallos + 1, inicio)
+        if len(self._contadores) > self.max_claves:
+            self._purgar(ahora)
+
+    def exito(self, clave: str):
+        self._contadores.pop(clave, None)
+
+    def _purgar(self, ahora: float):
+        vencidas = [c for c, (_, inicio) in self._contadores.items() if ahora - inicio > self.ventana]
+        for clave in vencidas:
+            del self._contadores[clave]
+        # Si todas siguen vigentes, se descartan las más antiguas
+        while len(self._contadores) > self.max_claves:
+            del self._contadores[next(iter(self._contadores))]
+
+
+# 0 = sin límite por IP (ver LOGIN_TRUSTED_PROXIES)
+limite_ip = LimiteIntentos(
+    int(os.getenv("LOGIN_MAX_FALLOS_IP") or 0), float(os.getenv("LOGIN_VENTANA_IP") or 300)
+)
+limite_correo = LimiteIntentos(
+    int(os.getenv("LOGIN_MAX_FALLOS_EMAIL") or 5), float(os.getenv("LOGIN_VENTANA_EMAIL") or 900)
+)
+
+
+# --- IP del cliente detrás de proxies --------------------------------
+
+_PROXIES = [p.strip() for p in (os.getenv("LOGIN_TRUSTED_PROXIES") or "").split(",") if p.strip()]
+CONFIAR_SALTO_INMEDIATO = "*" in _PROXIES
+PROXIES_CONFIABLES = [ipaddress.ip_network(p, strict=False) for p in _PROXIES if p != "*"]
+
+
+def _sin_puerto(salto: str) -> str:
+    """``[::1]:80`` -> ``::1``, ``1.2.3.4:80`` -> ``1.2.3.4`` (App Service agrega el puerto)."""
+    salto = salto.strip()
+    if salto.startswith("["):
+        return salto[1:].split("]", 1)[0]
+    if salto.count(":") == 1:
+        return salto.split(":", 1)[0]
+    return salto
+
+
+def _es_proxy(ip: str) -> bool:
+    try:
+        direccion = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(direccion in red for red in PROXIES_CONFIABLES)
+
+
+def ip_cliente(host: str | None, forwarded_for: str | None) -> str:
+    """IP del cliente: si la conexión viene de un proxy confiable, el primer
+    salto de ``X-Forwarded-For`` (de derecha a izquierda) que no es proxy.
+
+    Solo se leen las entradas agregadas por proxies confiables; lo que
+    el cliente haya puesto a la izquierda no se usa.
+    """
+    host = host or "?"
+    if not (CONFIAR_SALTO_INMEDIATO or _es_proxy(host)) or not forwarded_for:
+        return host
+    saltos = [_sin_puerto(s) for s in forwarded_for.split(",") if s.strip()]
+    for salto in reversed(saltos):
+        if not _es_proxy(salto):
+            return salto
+    return saltos[0] if saltos else host
@@ -0,0 +1,213 @@
+"""Cribado local de CVs antes del LLM.
+
+Compara el texto extraído con una especificación de criterios (palabras
+clave y expresiones regulares, cada criterio con un peso) y decide:
+
+- ``rechazo``: falta un criterio excluyente (p. ej. ninguna mención a
+  arquitectura) o el puntaje ponderado queda bajo ``umbral_rechazo``.
+  Es un "No apto" claro que no necesita al LLM.
+- ``dudoso``: todo lo demás, incluidos los CVs casi sin texto (PDF
+  escaneado), sigue al LLM. Localmente nunca se aprueba a nadie.
+
+``evaluar_lote`` arma la matriz CV x criterio (presencia) y el puntaje es su
+producto con el vector de pesos normalizado. Cada criterio compila sus
+patrones en una sola alternancia y se detiene en la primera coincidencia.
+El texto se compara en minúsculas y sin acentos. Los patrones incluyen
+las variantes en inglés (hay postulantes que envían el CV en inglés y el
+LLM los evalúa igual).
+
+Modos (``PRESCREEN_MODE``):
+
+- ``sombra`` (por defecto): se evalúa y se registra, pero todo va al LLM;
+  sirve para medir la concordancia antes de activarlo.
+- ``activo``: los rechazos se guardan sin llamar al LLM.
+- ``apagado``.
+
+Los criterios por defecto reflejan ``llm.PROMPT_CRITERIOS``;
+``PRESCREEN_CRITERIA`` apunta a un JSON con la misma forma para cambiarlos
+(hay que mantenerlos en línea con el prompt). Para medir la concordancia
+con decisiones ya tomadas por el LLM: ``benchmarks/bench_cribado.py``.
+"""
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+MODO = os.getenv("PRESCREEN_MODE", "sombra")
+MODOS = ("apagado", "sombra", "activo")
+
+# Marca del resultado guardado cuando el rechazo es local
+MARCA = "Cribado local (sin LLM)"
+
+CRITERIOS_POR_DEFECTO = {
+    "umbral_rechazo": 0.25,
+    "min_caracteres": 300,
+    "criterios": [
+        {"nombre": "profesion", "peso": 3, "excluyente": True, "patrones": [r"arquitect", r"architect"]},
+        {"nombre": "urbanismo", "peso": 2,
+         "patrones": [r"urbanis", r"urbano", r"espacios? publicos?", r"\burban\b", r"public spaces?"]},
+        {"nombre": "residencial", "peso": 2,
+         "patrones": [r"residencial", r"vivienda", r"multifamiliar", r"residential", r"housing", r"multi-?family"]},
+        {"nombre": "experiencia", "peso": 1, "patrones": [r"\b([5-9]|[1-4]\d)\s*\+?\s*(?:anos|years)\b"]},
+        {"nombre": "sketchup", "peso": 1, "patrones": [r"sketch\s*-?up"]},
+        {"nombre": "normativas", "peso": 1,
+         "patrones": [r"normativ", r"reglamento nacional de edificaciones", r"building codes?", r"regulations?"]},
+        {"nombre": "clientes", "peso": 1, "patrones": [r"clientes?", r"clients?"]},
+        {"nombre": "ingles", "peso": 1, "patrones": [r"ingles", r"english"]},
+        {"nombre": "urbanlab", "peso": 1, "patrones": [r"urban\s*lab"]},
+    ],
+}
+
+
+@dataclass
+class Criterio:
+    nombre: str
+    peso: float
+    patron: re.Pattern
+    excluyente: bool = False
+
+
+@dataclass
+class Especificacion:
+    criterios: list
+    umbral_rechazo: float
+    min_caracteres: int
+    version: str
+    pesos: list = field(init=False)
+
+    def __post_init__(self):
+        total = sum(c.peso for c in self.criterios) or 1.0
+        self.pesos = [c.peso / total for c in self.criterios]
+
+
+@dataclass
+class Evaluacion:
+    decision: str  # "rechazo" | "dudoso"
+    puntaje: float
+    faltan: list
+
+    @property
+    def rechazo(self) -> bool:
+        return self.decision == "rechazo"
+
+    def resumen(self) -> dict:
+        return {"decision": self.decision, "puntaje": round(self.puntaje, 3), "faltan": self.faltan}
+
+    def resultado(self, umbral: float) -> str:
+        """Texto con el formato de la respuesta del LLM (termina en "❌ No apto")."""
+        motivos = [f"{MARCA}: no cumple los criterios mínimos del perfil."]
+        if self.faltan:
+            motivos.append(f"- Sin menciones a: {', '.join(self.faltan)}")
+        motivos.append(f"- Puntaje {self.puntaje:.2f} (mínimo {umbral:.2f})")
+        return "\n".join(motivos) + "\n\n❌ No apto"
+
+
+def cargar(datos: dict) -> Especificacion:
+    criterios = [
+        Criterio(
+            nombre=c["nombre"],
+            peso=float(c.get("peso", 1)),
+            patron=re.compile("|".join(f"(?:{p})" for p in c["patrones"])),
+            excluyente=bool(c.get("excluyente")),
+        )
+        for c in datos["criterios"]
+    ]
+    version = hashlib.sha256(json.dumps(datos, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return Especificacion(criterios, float(datos.get("umbral_rechazo", 0.25)),
+                          int(datos.get("min_caracteres", 300)), version)
+
+
+def cargar_archivo(ruta: str) -> Especificacion:
+    with open(ruta, encoding="utf-8") as f:
+        return cargar(json.load(f))
+
+
+ESPECIFICACION = (cargar_archivo(os.environ["PRESCREEN_CRITERIA"]) if os.getenv("PRESCREEN_CRITERIA")
+                  else cargar(CRITERIOS_POR_DEFECTO))
+
+
+def normalizar(texto: str) -> str:
+    sin_acentos = unicodedata.normalize("NFKD", texto.lower())
+    return sin_acentos.encode("ascii", "ignore").decode("ascii")
+
+
+def matriz(textos: list, espec: Especificacion) -> list:
+    """Presencia (0/1) de cada criterio en cada texto ya normalizado."""
+    return [[1 if c.patron.search(t) else 0 for c in espec.criterios] for t in textos]
+
+
+def evaluar_lote(textos: list, espec: Especificacion | None = None, umbral: float | None = None) -> list:
+    espec = espec or ESPECIFICACION
+    umbral = espec.umbral_rechazo if umbral is None else umbral
+    normalizados = [normalizar(t or "") for t in textos]
+    evaluaciones = []
+    for texto, fila in zip(normalizados, matriz(normalizados, espec)):
+        puntaje = sum(p * x for p, x in zip(espec.pesos, fila))
+        faltan = [c.nombre for c, x in zip(espec.criterios, fila) if not x]
+        if len(texto.strip()) < espec.min_caracteres:
+            decision = "dudoso"
+        elif any(c.excluyente and not x for c, x in zip(espec.criterios, fila)) or puntaje < umbral:
+            decision = "rechazo"
+        else:
+            decision = "dudoso"
+        evaluaciones.append(Evaluacion(decision, puntaje, faltan))
+    return evaluaciones
+
+
+def evaluar(texto: str) -> Evaluacion:
+    return evaluar_lote([texto])[0]
+
+
+# --- Contadores (por worker) -----------------------------------------
+
+contadores = {
+    "evaluados": 0,
+    "rechazos": 0,
+    "dudosos": 0,
+    "llamadas_evitadas": 0,
+    # Modo sombra: rechazo local frente a la decisión del LLM
+    "rechazos_confirmados": 0,
+    "rechazos_contradichos": 0,
+    "no_aptos_no_detectados": 0,
+}
+
+
+def registrar(evaluacion: Evaluacion, evitada: bool):
+    contadores["evaluados"] += 1
+    contadores["rechazos" if evaluacion.rechazo else "dudosos"] += 1
+    if evitada:
+        contadores["llamadas_evitadas"] += 1
+
+
+def comparar(decision: str, estado_llm: str):
+    """Anota si el LLM coincidió con la decisión local (modo sombra)."""
+    if decision == "rechazo":
+        contadores["rechazos_confirmados" if estado_llm == "No Apto" else "rechazos_contradichos"] += 1
+    elif estado_llm == "No Apto":
+        contadores["no_aptos_no_detectados"] += 1
+
+
+def concordancia(confirmados: int, contradichos: int, no_detectados: int) -> dict:
+    """Precisión de los rechazos locales y qué parte de los "No apto" del LLM detectan."""
+    rechazos = confirmados + contradichos
+    no_aptos = confirmados + no_detectados
+    return {
+        "concordancia": round(confirmados / rechazos, 4) if rechazos else None,
+        "cobertura_no_aptos": round(confirmados / no_aptos, 4) if no_aptos else None,
+    }
+
+
+def estadisticas() -> dict:
+    evaluados = contadores["evaluados"]
+    return {
+        **contadores,
+        "modo": MODO,
+        "version_criterios": ESPECIFICACION.version,
+        "umbral_rechazo": ESPECIFICACION.umbral_rechazo,
+        "tasa_rechazo": round(contadores["rechazos"] / evaluados, 4) if evaluados else 0.0,
+        "tasa_evitadas": round(contadores["llamadas_evitadas"] / evaluados, 4) if evaluados else 0.0,
+        **concordancia(contadores["rechazos_confirmados"], contadores["rechazos_contradichos"],
+                       contadores["no_aptos_no_detectados"]),
+    }
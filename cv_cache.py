@@ -0,0 +1,94 @@
+"""Caché de resultados de análisis de CVs, direccionada por contenido.
+
+La clave es el SHA-256 del texto extraído (normalizado) más la versión de
+los criterios del prompt (``llm.VERSION_PROMPT``). Un LRU en memoria evita
+ir a PostgreSQL para los CVs más repetidos; la tabla
+``cv_analysis_cache`` comparte los resultados entre workers y reinicios.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+from database_async import get_async_pool
+from llm import VERSION_PROMPT
+
+TAMANO_LRU = int(os.getenv("CV_CACHE_SIZE") or 1000)
+
+_lru: OrderedDict = OrderedDict()
+contadores = {"hits_memoria": 0, "hits_db": 0, "misses": 0, "guardados": 0}
+
+
+def hash_texto(texto: str) -> str:
+    normalizado = " ".join(texto.split())
+    return hashlib.sha256(normalizado.encode("utf-8")).hexdigest()
+
+
+def _recordar(clave: tuple, resultado: str):
+    _lru[clave] = resultado
+    _lru.move_to_end(clave)
+    while len(_lru) > TAMANO_LRU:
+        _lru.popitem(last=False)
+
+
+async def obtener(texto: str) -> str | None:
+    clave = (hash_texto(texto), VERSION_PROMPT)
+    if clave in _lru:
+        _lru.move_to_end(clave)
+        contadores["hits_memoria"] += 1
+        return _lru[clave]
+
+    pool = await get_async_pool()
+    resultado = await pool.fetchval("""
+        UPDATE cv_analysis_cache
+        SET hits = hits + 1, last_hit_at = now()
+        WHERE text_hash = $1 AND prompt_version = $2
+        RETURNING resultado
+    """, *clave)
+    if resultado is None:
+        contadores["misses"] += 1
+        return None
+    contadores["hits_db"] += 1
+    _recordar(clave, resultado)
+    return resultado
+
+
+async def guardar(texto: str, resultado: str):
+    clave = (hash_texto(texto), VERSION_PROMPT)
+    pool = await get_async_pool()
+    await pool.execute("""
+        INSERT INTO cv_analysis_cache (text_hash, prompt_version, resultado)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (text_hash, prompt_version) DO UPDATE SET resultado = EXCLUDED.resultado
+    """, *clave, resultado)
+    contadores["guardados"] += 1
+    _recordar(clave, resultado)
+
+
+async def invalidar(todas: bool = False) -> int:
+    """Borra los análisis de versiones anteriores del prompt (o todos).
+
+    Solo limpia el LRU de este worker; los demás dejan de encontrar las
+    entradas viejas porque su clave incluye la versión del prompt.
+    """
+    pool = await get_async_pool()
+    if todas:
+        borradas = await pool.execute("DELETE FROM cv_analysis_cache")
+        _lru.clear()
+    else:
+        borradas = await pool.execute(
+            "DELETE FROM cv_analysis_cache WHERE prompt_version <> $1", VERSION_PROMPT
+        )
+        for clave in [c for c in _lru if c[1] != VERSION_PROMPT]:
+            del _lru[clave]
+    return int(borradas.split()[-1])
+
+
+def estadisticas() -> dict:
+    consultas = contadores["hits_memoria"] + contadores["hits_db"] + contadores["misses"]
+    aciertos = contadores["hits_memoria"] + contadores["hits_db"]
+    return {
+        **contadores,
+        "hit_ratio": round(aciertos / consultas, 4) if consultas else 0.0,
+        "entradas_memoria": len(_lru),
+        "version_prompt": VERSION_PROMPT,
+    }
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import time
+
+import asyncpg
+from dotenv import load_dotenv
+
+import consultas_lentas
+import metricas
+
+load_dotenv()
+
+_pool: asyncpg.Pool | None = None
+
+
+async def _preparar_conexion(conn: asyncpg.Connection):
+    conn.add_query_logger(metricas.query_logger_asyncpg)
+    conn.add_query_logger(consultas_lentas.query_logger_asyncpg)
+
+
+async def iniciar_pool_async() -> asyncpg.Pool:
+    """Crea el pool asyncpg compartido por los endpoints ``async``."""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host=os.getenv("PG_HOST"),
+            port=int(os.getenv("PG_PORT") or 5432),
+            user=os.getenv("PG_USER"),
+            password=os.getenv("PG_PASSWORD"),
+            database=os.getenv("PG_DBNAME"),
+            min_size=int(os.getenv("PG_ASYNC_POOL_MIN") or 1),
+            max_size=int(os.getenv("PG_ASYNC_POOL_MAX") or 10),
+            max_inactive_connection_lifetime=float(os.getenv("PG_POOL_MAX_IDLE") or 300),
+            command_timeout=float(os.getenv("PG_COMMAND_TIMEOUT") or 30),
+            init=_preparar_conexion,
+        )
+    return _pool
+
+
+async def cerrar_pool_async():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def get_async_pool() -> asyncpg.Pool:
+    """Pool asyncpg; se crea al primer uso si no se pudo crear al arrancar."""
+    return _pool if _pool is not None else await iniciar_pool_async()
+
+
+async def get_async_db():
+    """Dependencia de FastAPI: conexión asyncpg devuelta al pool al terminar."""
+    async with (await get_async_pool()).acquire() as conn:
+        yield conn
+
+
+def metricas_pool_async() -> dict:
+    if _pool is None:
+        return {"size": 0, "idle": 0, "min": 0, "max": 0}
+    return {
+        "size": _pool.get_size(),
+        "idle": _pool.get_idle_size(),
+        "min": _pool.get_min_size(),
+        "max": _pool.get_max_size(),
+    }
+
+
+MIGRACIONES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql")
+
+# Primera línea de los scripts que usan CREATE/DROP INDEX CONCURRENTLY: se
+# ejecutan sentencia por sentencia, fuera de una transacción
+SIN_TRANSACCION = "-- sin transacción"
+
+
+class MigracionFallida(Exception):
+    """Un script de ``sql/`` falló; la versión no queda registrada."""
+
+
+def _sentencias(script: str) -> list:
+    """Separa un script en sentencias por ``;``, respetando comillas,
+    comentarios y cuerpos ``$$ ... $$``."""
+    sentencias, inicio, i, n = [], 0, 0, len(script)
+    while i < n:
+        c = script[i]
+        if script.startswith("--", i):
+            i = script.find("\n", i)
+            i = n if i < 0 else i
+        elif script.startswith("/*", i):
+            i = script.find("*/", i + 2)
+            i = n if i < 0 else i + 2
+            continue
+        elif c == "'":
+            i = script.find("'", i + 1)
+            i = n if i < 0 else i
+        elif c == "$":
+            fin_tag = script.find("$", i + 1)
+            etiqueta = script[i:fin_tag + 1] if fin_tag > 0 else ""
+            if etiqueta and (etiqueta == "$$" or etiqueta[1:-1].isidentifier()):
+                i = script.find(etiqueta, fin_tag + 1)
+                i = n if i < 0 else i + len(etiqueta) - 1
+        elif c == ";":
+            sentencias.append(script[inicio:i].strip())
+            inicio = i + 1
+        i += 1
+    sentencias.append(script[inicio:].strip())
+    # Descarta los fragmentos que solo tienen comentarios
+    return [s for s in sentencias if any(l.strip() and not l.strip().startswith("--") for l in s.splitlines())]
+
+
+def _scripts() -> list:
+    if not os.path.isdir(MIGRACIONES_DIR):
+        return []
+    scripts = []
+    for nombre in sorted(os.listdir(MIGRACIONES_DIR)):
+        if nombre.endswith(".sql"):
+            with open(os.path.join(MIGRACIONES_DIR, nombre), encoding="utf-8") as f:
+                script = f.read()
+            scripts.append((nombre, script, hashlib.sha256(script.encode("utf-8")).hexdigest()[:16]))
+    return scripts
+
+
+async def _aplicadas(conn: asyncpg.Connection) -> dict:
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     TEXT PRIMARY KEY,
+            checksum    TEXT NOT NULL,
+            applied_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    return {f["version"]: f["checksum"] for f in await conn.fetch("SELECT version, checksum FROM schema_migrations")}
+
+
+async def estado_migraciones() -> list:
+    """``(script, aplicada, modificada)`` por cada script de ``sql/``."""
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        aplicadas = await _aplicadas(conn)
+    return [(nombre, nombre in aplicadas, nombre in aplicadas and aplicadas[nombre] != checksum)
+            for nombre, _, checksum in _scripts()]
+
+
+async def aplicar_migraciones() -> list:
+    """Aplica en orden los scripts de ``sql/`` que no figuran en
+    ``schema_migrations`` y devuelve sus nombres.
+
+    Cada script corre en una transacción junto con su registro, salvo los
+    que empiezan con ``SIN_TRANSACCION`` (índices ``CONCURRENTLY``), que
+    corren sentencia por sentencia; todos son idempotentes, así que uno
+    cortado a medias se puede volver a correr. Si uno falla se lanza
+    ``MigracionFallida`` y no se sigue con los demás. Un advisory lock evita
+    que dos procesos migren a la vez. Se corre como paso del despliegue
+    (``scripts/migrar.py``) o al arrancar con ``PG_AUTO_MIGRATE=1``.
+    """
+    pool = await get_async_pool()
+    aplicados = []
+    async with pool.acquire() as conn:
+        await conn.execute("SELECT pg_advisory_lock(hashtext('nexuserv_migraciones'))")
+        try:
+            aplicadas = await _aplicadas(conn)
+            for nombre, script, checksum in _scripts():
+                if nombre in aplicadas:
+                    if aplicadas[nombre] != checksum:
+                        print(f"[MIGRACION] {nombre} cambió después de aplicarse; no se vuelve a correr")
+                    continue
+                inicio = time.perf_counter()
+                try:
+                    if script.startswith(SIN_TRANSACCION):
+                        for sentencia in _sentencias(script):
+                            await conn.execute(sentencia)
+                        await conn.execute("INSERT INTO schema_migrations (version, checksum) VALUES ($1, $2)",
+                                           nombre, checksum)
+                    else:
+                        async with conn.transaction():
+                            await conn.execute(script)
+                            await conn.execute("INSERT INTO schema_migrations (version, checksum) VALUES ($1, $2)",
+                                               nombre, checksum)
+                except Exception as e:
+                    invalidos = await conn.fetch(
+                        "SELECT indexrelid::regclass::text AS indice FROM pg_index WHERE NOT indisvalid")
+                    if invalidos:
+                        # Un CREATE INDEX CONCURRENTLY cortado deja el índice
+                        # inválido y IF NOT EXISTS lo saltearía al reintentar
+                        print(f"[MIGRACION] Índices inválidos (borrar con DROP INDEX CONCURRENTLY antes de "
+                              f"reintentar): {', '.join(f['indice'] for f in invalidos)}")
+                    raise MigracionFallida(f"{nombre}: {e}") from e
+                print(f"[MIGRACION] {nombre} aplicada en {time.perf_counter() - inicio:.1f} s")
+                aplicados.append(nombre)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(hashtext('nexuserv_migraciones'))")
+    return aplicados
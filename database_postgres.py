@@ -1,15 +1,361 @@
-# database_postgres.py
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import extensions
 from dotenv import load_dotenv
+from fastapi import HTTPException
+
+import consultas_lentas
+import metricas
 
 load_dotenv()
 
-def get_pg_connection():
+
+def _env_int(nombre: str, defecto: int) -> int:
+    valor = os.getenv(nombre)
+    return int(valor) if valor else defecto
+
+
+def _env_float(nombre: str, defecto: float) -> float:
+    valor = os.getenv(nombre)
+    return float(valor) if valor else defecto
+
+
+class CursorMedido(extensions.cursor):
+    """Cursor que registra la duración de cada consulta en ``metricas`` y en
+    el registro de consultas lentas (``consultas_lentas``)."""
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        error = True
+        try:
+            resultado = super().execute(query, vars)
+            error = False
+            return resultado
+        finally:
+            segundos = time.perf_counter() - inicio
+            metricas.registrar("db", "psycopg2", segundos, error)
+            consultas_lentas.observar_psycopg2(self, query, vars, segundos, error)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        error = True
+        try:
+            resultado = super().executemany(query, vars_list)
+            error = False
+            return resultado
+        finally:
+            segundos = time.perf_counter() - inicio
+            metricas.registrar("db", "psycopg2", segundos, error)
+            consultas_lentas.observar_psycopg2(self, query, vars_list, segundos, error, lote=True)
+
+
+def _nueva_conexion():
     return psycopg2.connect(
         host=os.getenv("PG_HOST"),
         port=os.getenv("PG_PORT"),
         user=os.getenv("PG_USER"),
         password=os.getenv("PG_PASSWORD"),
-        database=os.getenv("PG_DBNAME")
+        database=os.getenv("PG_DBNAME"),
+        cursor_factory=CursorMedido,
     )
+
+
+class PoolTimeout(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera."""
+
+
+class PooledConnection:
+    """Conexión prestada por el pool.
+
+    Delega todo en la conexión de psycopg2, salvo ``close()``, que la
+    devuelve al pool en lugar de cerrarla.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self._prestada = False
+
+    def __getattr__(self, nombre):
+        return getattr(self._raw, nombre)
+
+    def cursor(self, *args, **kwargs):
+        return self._raw.cursor(*args, **kwargs)
+
+    def close(self):
+        if self._prestada:
+            self._pool.putconn(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Pool de conexiones psycopg2 seguro para hilos.
+
+    - ``minconn``/``maxconn``: tamaño mínimo y máximo.
+    - ``timeout``: segundos que se espera por una conexión libre.
+    - ``max_idle``: conexiones ociosas más tiempo que esto se reciclan.
+    - ``max_lifetime``: edad máxima de una conexión antes de reciclarla.
+    - ``ping_after``: si la conexión lleva ociosa más que esto, se valida
+      con ``SELECT 1`` antes de entregarla.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, timeout=10.0, max_idle=300.0,
+                 max_lifetime=1800.0, ping_after=5.0, connect=_nueva_conexion):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self._connect = connect
+
+        self._cond = threading.Condition()
+        self._libres = []  # pila LIFO de PooledConnection
+        self._total = 0
+        self._en_uso = 0
+        self._esperando = 0
+        self._cerrado = False
+
+        # Métricas acumuladas
+        self.checkouts = 0
+        self.timeouts = 0
+        self.recicladas = 0
+        self.fallos_ping = 0
+        self.checkout_seconds_sum = 0.0
+        self.checkout_seconds_max = 0.0
+
+    # --- ciclo de vida de conexiones ---------------------------------
+
+    def _abrir(self):
+        return PooledConnection(self, self._connect())
+
+    def _descartar(self, conn):
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+
+    def _caducada(self, conn, ahora):
+        return (
+            ahora - conn.created_at > self.max_lifetime
+            or ahora - conn.last_used > self.max_idle
+            or conn._raw.closed
+        )
+
+    def _sana(self, conn, ahora):
+        if ahora - conn.last_used < self.ping_after:
+            return True
+        try:
+            cur = conn._raw.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn._raw.rollback()
+            return True
+        except Exception:
+            self.fallos_ping += 1
+            return False
+
+    # --- API pública --------------------------------------------------
+
+    def getconn(self) -> PooledConnection:
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        with self._cond:
+            self._esperando += 1
+            try:
+                while True:
+                    if self._cerrado:
+                        raise PoolTimeout("El pool está cerrado")
+                    if self._libres:
+                        conn = self._libres.pop()
+                        break
+                    if self._total < self.maxconn:
+                        self._total += 1
+                        conn = None
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f"Sin conexiones libres tras {self.timeout}s "
+                            f"(max={self.maxconn})"
+                        )
+                    self._cond.wait(restante)
+                self._en_uso += 1
+            finally:
+                self._esperando -= 1
+
+        # Abrir / validar fuera del lock para no bloquear a otros hilos
+        try:
+            ahora = time.monotonic()
+            if conn is not None and (self._caducada(conn, ahora) or not self._sana(conn, ahora)):
+                self.recicladas += 1
+                self._descartar(conn)
+                conn = None
+            if conn is None:
+                conn = self._abrir()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._en_uso -= 1
+                self._cond.notify()
+            raise
+
+        conn._prestada = True
+        espera = time.monotonic() - inicio
+        with self._cond:
+            self.checkouts += 1
+            self.checkout_seconds_sum += espera
+            self.checkout_seconds_max = max(self.checkout_seconds_max, espera)
+        return conn
+
+    def putconn(self, conn: PooledConnection):
+        conn._prestada = False
+        raw = conn._raw
+        reutilizable = not raw.closed
+        if reutilizable:
+            try:
+                # Deshacer cualquier transacción que el handler dejó abierta
+                if raw.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+            except Exception:
+                reutilizable = False
+
+        with self._cond:
+            self._en_uso -= 1
+            if reutilizable and not self._cerrado:
+                conn.last_used = time.monotonic()
+                self._libres.append(conn)
+            else:
+                self._total -= 1
+                self._descartar(conn)
+            self._cond.notify()
+
+    def recycle_idle(self):
+        """Cierra conexiones ociosas caducadas, respetando ``minconn``."""
+        ahora = time.monotonic()
+        with self._cond:
+            conservar, cerrar = [], []
+            for conn in self._libres:
+                if self._caducada(conn, ahora) and self._total - len(cerrar) > self.minconn:
+                    cerrar.append(conn)
+                else:
+                    conservar.append(conn)
+            self._libres = conservar
+            self._total -= len(cerrar)
+            self.recicladas += len(cerrar)
+        for conn in cerrar:
+            self._descartar(conn)
+
+    def warm_up(self):
+        """Abre ``minconn`` conexiones por adelantado."""
+        conns = [self.getconn() for _ in range(max(self.minconn - self._total, 0))]
+        for conn in conns:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            self._cerrado = True
+            libres, self._libres = self._libres, []
+            self._total -= len(libres)
+            self._cond.notify_all()
+        for conn in libres:
+            self._descartar(conn)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._total,
+                "in_use": self._en_uso,
+                "idle": len(self._libres),
+                "waiting": self._esperando,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "checkouts_total": self.checkouts,
+                "checkout_timeouts_total": self.timeouts,
+                "recycled_total": self.recicladas,
+                "ping_failures_total": self.fallos_ping,
+                "checkout_seconds_sum": round(self.checkout_seconds_sum, 6),
+                "checkout_seconds_max": round(self.checkout_seconds_max, 6),
+                "checkout_seconds_avg": round(self.checkout_seconds_sum / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+pool = ConnectionPool(
+    minconn=_env_int("PG_POOL_MIN", 1),
+    maxconn=_env_int("PG_POOL_MAX", 10),
+    timeout=_env_float("PG_POOL_TIMEOUT", 10.0),
+    max_idle=_env_float("PG_POOL_MAX_IDLE", 300.0),
+    max_lifetime=_env_float("PG_POOL_MAX_LIFETIME", 1800.0),
+    ping_after=_env_float("PG_POOL_PING_AFTER", 5.0),
+)
+
+
+def get_pg_connection() -> PooledConnection:
+    """Conexión del pool; ``conn.close()`` la devuelve al pool."""
+    return pool.getconn()
+
+
+@contextmanager
+def conexion():
+    """Context manager que siempre devuelve la conexión al pool."""
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def get_db():
+    """Dependencia de FastAPI: una conexión por request, devuelta siempre
+    al pool al terminar (incluso si el handler lanza una excepción).
+
+    Si no hay conexión (pool agotado o base caída) responde 503: el
+    checkout ocurre antes del ``try`` de cada handler.
+    """
+    try:
+        conn = pool.getconn()
+    except (PoolTimeout, psycopg2.OperationalError) as e:
+        raise HTTPException(status_code=503, detail=f"Base de datos no disponible: {e}")
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _reciclador(intervalo: float):
+    while not pool._cerrado:
+        time.sleep(intervalo)
+        try:
+            pool.recycle_idle()
+        except Exception as e:
+            print(f"[POOL] Error reciclando conexiones: {e}")
+
+
+def iniciar_pool():
+    """Precalienta el pool y arranca el hilo que recicla conexiones ociosas."""
+    try:
+        pool.warm_up()
+    except Exception as e:
+        print(f"[POOL] No se pudo precalentar el pool: {e}")
+    hilo = threading.Thread(
+        target=_reciclador,
+        args=(_env_float("PG_POOL_RECYCLE_INTERVAL", 60.0),),
+        daemon=True,
+    )
+    hilo.start()
+
+
+def cerrar_pool():
+    pool.closeall()
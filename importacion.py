@@ -0,0 +1,112 @@
+"""Importación masiva de CVs (ferias de empleo).
+
+Cada CV de una importación se encola como un trabajo normal de
+``cv_jobs`` con ``payload["importacion"]``; el id del trabajo se deriva
+del id de la importación y del SHA-256 del PDF, así que volver a enviar
+los mismos archivos (o relanzar la CLI tras una interrupción) no duplica
+nada y solo agrega lo que faltaba.
+
+Los datos del postulante salen de un manifiesto CSV opcional (columnas
+``archivo,nombres,apellidos,correo,celular,dni,fecha_nacimiento``); sin
+manifiesto, el nombre se toma del archivo y el correo se busca en el texto
+del CV al guardarlo.
+"""
+import csv
+import hashlib
+import io
+import os
+import re
+import zipfile
+import zlib
+from uuid import UUID, uuid5
+
+MAX_ARCHIVOS = int(os.getenv("IMPORT_MAX_FILES") or 500)
+MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES") or 500 * 1024 * 1024)
+TAMANO_TANDA = int(os.getenv("IMPORT_ENQUEUE_CHUNK") or 50)
+
+CAMPOS = ("nombres", "apellidos", "correo", "celular", "dni", "fecha_nacimiento")
+_CORREO = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+
+
+def leer_manifiesto(contenido: bytes) -> dict:
+    """``{nombre_de_archivo: {campo: valor}}`` desde un CSV (utf-8, con o sin BOM).
+
+    Lanza ``ValueError`` si no es texto UTF-8 o no es un CSV válido.
+    """
+    try:
+        lector = csv.DictReader(io.StringIO(contenido.decode("utf-8-sig")))
+        return {
+            os.path.basename(fila["archivo"].strip()): {c: (fila.get(c) or "").strip() for c in CAMPOS}
+            for fila in lector if fila.get("archivo")
+        }
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(f"Manifiesto inválido (se espera un CSV en UTF-8): {e}") from e
+
+
+def validar_pdf(nombre: str, datos: bytes, max_bytes: int) -> str | None:
+    """Motivo de rechazo, o ``None`` si el archivo es aceptable."""
+    if len(datos) > max_bytes:
+        return f"supera el máximo de {max_bytes // (1024 * 1024)} MB"
+    if not datos.startswith(b"%PDF"):
+        return "no es un PDF"
+    return None
+
+
+def archivos_zip(archivo, max_bytes: int):
+    """Recorre los PDFs de un zip: ``(nombre, datos)`` o ``(nombre, motivo)``.
+
+    El tamaño se comprueba con lo declarado en el zip antes de descomprimir
+    y otra vez al leer (lectura acotada), para no inflar un zip malicioso.
+    Una entrada dañada se rechaza sola; un archivo que no es zip lanza
+    ``ValueError``.
+    """
+    try:
+        zf = zipfile.ZipFile(archivo)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Zip inválido: {e}") from e
+    with zf:
+        for info in zf.infolist():
+            nombre = os.path.basename(info.filename)
+            if info.is_dir() or not nombre.lower().endswith(".pdf") or nombre.startswith("."):
+                continue
+            if info.file_size > max_bytes:
+                yield nombre, f"supera el máximo de {max_bytes // (1024 * 1024)} MB"
+                continue
+            try:
+                with zf.open(info) as f:
+                    datos = f.read(max_bytes + 1)
+            except (zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError) as e:
+                # CRC incorrecto, compresión no soportada o entrada cifrada
+                yield nombre, f"no se pudo leer del zip: {e}"
+                continue
+            yield nombre, validar_pdf(nombre, datos, max_bytes) or datos
+
+
+def id_trabajo(importacion_id: UUID, hash_archivo: str) -> UUID:
+    return uuid5(importacion_id, hash_archivo)
+
+
+def trabajo(importacion_id: UUID, nombre: str, datos: bytes, manifiesto: dict, modo: str) -> tuple:
+    """``(job_id, payload, archivo)`` listo para ``JobQueue.encolar_varios``."""
+    hash_archivo = hashlib.sha256(datos).hexdigest()
+    fila = manifiesto.get(nombre, {})
+    nombres = fila.get("nombres") or re.sub(r"[_\-]+", " ", os.path.splitext(nombre)[0]).strip()
+    payload = {
+        "usuario": fila.get("correo") or nombres,
+        "fecha_nacimiento": fila.get("fecha_nacimiento") or None,
+        "nombres": nombres,
+        "apellidos": fila.get("apellidos") or "",
+        "correo": fila.get("correo") or None,
+        "celular": fila.get("celular") or None,
+        "dni": fila.get("dni") or None,
+        "archivo": nombre,
+        "hash_archivo": hash_archivo,
+        "lote": modo == "lote",
+        "importacion": str(importacion_id),
+    }
+    return id_trabajo(importacion_id, hash_archivo), payload, datos
+
+
+def correo_en_texto(texto: str) -> str | None:
+    encontrado = _CORREO.search(texto or "")
+    return encontrado.group(0).lower() if encontrado else None
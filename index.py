@@ -1,97 +1,454 @@
-from fastapi import FastAPI, HTTPException, Request, File, UploadFile, Form
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response, File, UploadFile, Form, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from azure.storage.blob import BlobServiceClient
-from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+from fastapi.responses import JSONResponse
 from fastapi import Query
 from typing import Optional
-import pyodbc
-import httpx
-import fitz  # PyMuPDF
-from uuid import uuid4
+from contextlib import asynccontextmanager
+from uuid import UUID, uuid4
+from datetime import datetime
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
 load_dotenv()
 import os
-import pymssql
-from openai import OpenAI  # ✅ NUEVA LIBRERÍA
 import random
+import hashlib
+import time
+from collections import OrderedDict
 import string
 
 #Para enviar correo
-import smtplib
-from email.message import EmailMessage
+import correo
 
 
 #Para postgres
 
-from database_postgres import get_pg_connection
-from pydantic import BaseModel
+from database_postgres import PooledConnection, conexion, get_db, iniciar_pool, cerrar_pool, pool
+from database_async import get_async_db, get_async_pool, iniciar_pool_async, cerrar_pool_async, metricas_pool_async, aplicar_migraciones
+from job_queue import JobQueue
+from llm import analizar_con_gpt4o, enviar_lote, recoger_lote, cerrar_cliente, get_cliente as get_cliente_llm
+import cv_cache
+import cribado
+import catalogo_servicios
+import catalogos
+import importacion
+import credenciales
+import metricas
+import consultas_lentas
+import serializacion
+import busqueda_cvs
+import blob_storage
+from paginacion import codificar_cursor, filtro_keyset, exportar
+from pdf_text import extraer_texto_async, cerrar_pool as cerrar_pool_pdf
+import asyncpg
+import asyncio
+from pydantic import BaseModel, Field
 from typing import List
 
 
-# Usa la clave de OpenAI desde variable de entorno
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
 
-blob_service_client = BlobServiceClient.from_connection_string(os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
-CONTAINER_NAME = "postulaciones"
-
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:4200",
-        "https://lemon-bush-042e64010.6.azurestaticapps.net",
-        "https://witty-water-0b1d5eb10.1.azurestaticapps.net",
-        "https://orange-field-0b261ba0f.2.azurestaticapps.net"
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Las rutas se registran en ``router``; ``crear_app`` (al final del archivo)
+# arma la aplicación con middlewares y ciclo de vida.
+router = APIRouter()
 
+ORIGENES_CORS = [
+    "http://localhost:4200",
+    "https://lemon-bush-042e64010.6.azurestaticapps.net",
+    "https://witty-water-0b1d5eb10.1.azurestaticapps.net",
+    "https://orange-field-0b261ba0f.2.azurestaticapps.net"
+]
 
-def extraer_texto_pdf(path: str) -> str:
-    doc = fitz.open(path)
-    texto = ""
-    for pagina in doc:
-        texto += pagina.get_text()
-    return texto
+# Crear los clientes de OpenAI y Azure al arrancar el worker (paga el import
+# de sus SDKs antes de servir) en lugar de en el primer CV
+PRECARGAR_CLIENTES = os.getenv("PRELOAD_CLIENTS", "0") == "1"
 
+tareas_fondo = []
 
-async def analizar_con_gpt4o(texto_cv: str) -> str:
-    prompt = f"""
-Este es el contenido de un currículum vitae de una persona que quiere postular a nuestra empresa:
 
-✅ CRITERIOS PARA SER APTO:
-- Profesión: Licenciada en Arquitectura
-- Experiencia: Al menos 5 años en proyectos residenciales y espacios públicos
-- Experiencia adicional: Asistente de proyecto en Urbanlab 3 años
-- Habilidades: Diseño arquitectónico y urbanismo, SketchUp, normativas, comunicación con clientes
-- Idioma: Inglés básico
+# Migraciones de sql/ al arrancar (opt-in): lo normal es correrlas como paso
+# del despliegue con scripts/migrar.py. Si una falla, el worker no arranca.
+MIGRAR_AL_ARRANCAR = os.getenv("PG_AUTO_MIGRATE", "0") == "1"
 
-Analiza el siguiente CV textual y responde si corresponde exactamente a este perfil. Al no tener estas caracteristicas, marcalo como ❌ No apto.
 
-Resume brevemente los motivos (3-5 líneas). Al final responde SOLO con:
+async def abrir_pools():
+    await asyncio.to_thread(iniciar_pool)
+    try:
+        await iniciar_pool_async()
+    except Exception as e:
+        print(f"[POOL] No se pudo crear el pool asyncpg: {e}")
+    if MIGRAR_AL_ARRANCAR:
+        await aplicar_migraciones()
+    try:
+        await catalogos.cargar()
+    except Exception as e:
+        print(f"[CATALOGOS] No se pudieron precargar: {e}")
+
+
+async def iniciar_pipeline():
+    """Solo los pools y los workers de postulaciones (con la persistencia
+    por lotes), sin correo, LISTEN ni lotes del LLM: lo usa la CLI de
+    importación (scripts/importar_cvs.py), que corre fuera del servidor."""
+    await abrir_pools()
+    cola_postulaciones.iniciar()
+    tareas_fondo.append(asyncio.create_task(persistir_lotes()))
+
+
+async def iniciar_conexiones():
+    await abrir_pools()
+    if PRECARGAR_CLIENTES:
+        get_cliente_llm()
+        blob_storage.get_cliente()
+    cola_postulaciones.iniciar()
+    tareas_fondo.append(asyncio.create_task(catalogo_servicios.escuchar()))
+    tareas_fondo.append(asyncio.create_task(persistir_lotes()))
+    tareas_fondo.append(asyncio.create_task(correo.enviar_pendientes()))
+    if LLM_BATCH_ENABLED:
+        tareas_fondo.append(asyncio.create_task(procesar_lotes_llm()))
+
+
+async def cerrar_conexiones():
+    for tarea in tareas_fondo:
+        tarea.cancel()
+    await asyncio.gather(*tareas_fondo, return_exceptions=True)
+    await cola_postulaciones.detener()
+    await cerrar_cliente()
+    await blob_storage.cerrar_cliente()
+    cerrar_pool_pdf()
+    credenciales.cerrar_pool()
+    await cerrar_pool_async()
+    cerrar_pool()
+
+
+# Subida de CVs: el cuerpo completo lo limita LimitarTamanoSubidas mientras
+# llega; acá se lee el archivo en bloques y se corta si supera el máximo.
+CV_MAX_BYTES = int(os.getenv("CV_MAX_BYTES") or 10 * 1024 * 1024)
+CV_CHUNK_BYTES = 64 * 1024
+
+
+async def leer_pdf_limitado(archivo: UploadFile, max_bytes: int = CV_MAX_BYTES) -> bytes:
+    buffer = bytearray()
+    while True:
+        bloque = await archivo.read(CV_CHUNK_BYTES)
+        if not bloque:
+            break
+        buffer.extend(bloque)
+        if len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"El CV supera el máximo de {max_bytes // (1024 * 1024)} MB")
+    if not buffer.startswith(b"%PDF"):
+        raise HTTPException(status_code=400, detail="El CV debe ser un archivo PDF")
+    return bytes(buffer)
+
+
+class LimitarTamanoSubidas:
+    """Middleware ASGI: corta los POST cuyo cuerpo supera el máximo.
+
+    Starlette parsea el multipart (y pasa a un archivo temporal las partes
+    de más de 1 MB) antes de que el handler vea el ``UploadFile``, así que
+    el límite se aplica acá, contando los bytes a medida que llegan: un
+    ``Content-Length`` excesivo se rechaza sin leer nada y un cuerpo sin
+    ``Content-Length`` (chunked) se corta al pasar el máximo. Los
+    multipart sin ``Content-Length`` se rechazan con 411.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        maximo = importacion.MAX_BYTES if scope["path"] == "/postulaciones/importaciones" else CV_MAX_BYTES
+        maximo += CV_CHUNK_BYTES  # margen para los campos del formulario
+        cabeceras = dict(scope["headers"])
+        longitud = cabeceras.get(b"content-length")
+        if longitud is None and cabeceras.get(b"content-type", b"").startswith(b"multipart/"):
+            await JSONResponse(status_code=411, content={"detail": "Falta Content-Length"})(scope, receive, send)
+            return
+        if longitud is not None and not longitud.isdigit():
+            await JSONResponse(status_code=400, content={"detail": "Content-Length inválido"})(scope, receive, send)
+            return
+        if longitud is not None and int(longitud) > maximo:
+            await JSONResponse(status_code=413, content={"detail": "El archivo supera el tamaño máximo permitido"})(
+                scope, receive, send)
+            return
+
+        recibidos = 0
+
+        async def recibir_limitado():
+            nonlocal recibidos
+            mensaje = await receive()
+            if mensaje["type"] == "http.request":
+                recibidos += len(mensaje.get("body", b""))
+                if recibidos > maximo:
+                    # FastAPI relanza las HTTPException del parseo del cuerpo
+                    raise HTTPException(status_code=413, detail="El archivo supera el tamaño máximo permitido")
+            return mensaje
+
+        await self.app(scope, recibir_limitado, send)
+
+
+async def instrumentar(request: Request, call_next):
+    # Latencia por ruta (plantilla, no la URL concreta) y tiempo/consultas de
+    # BD, LLM, blob y PDF acumulados durante la petición (ver metricas.py)
+    token = metricas.iniciar_peticion()
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        duracion = time.perf_counter() - inicio
+        datos = metricas.terminar_peticion(token)
+        ruta = request.scope.get("route")
+        metricas.observar_peticion(request.method, ruta.path if ruta else "sin_ruta", status, duracion, datos)
+    if metricas.SERVER_TIMING:
+        response.headers["Server-Timing"] = metricas.server_timing(duracion, datos)
+    return response
+
+
+# Pipeline de postulaciones: el endpoint guarda el CV y encola un trabajo;
+# los workers lo procesan por etapas (extract -> analyze -> persist).
+
+async def etapa_extraer(job: dict) -> dict:
+    datos = await cola_postulaciones.archivo(job["id"])
+
+    # La subida a Azure Blob Storage corre a la vez que la extracción
+    # (nombre fijo por trabajo: los reintentos sobrescriben)
+    blob_name = f"{job['id']}_{job['payload']['archivo']}"
+    texto, _ = await asyncio.gather(
+        extraer_texto_async(datos),
+        blob_storage.subir(blob_name, datos),
+    )
+    return {"texto": texto, "ruta_en_blob": blob_name}
+
+
+async def etapa_analizar(job: dict) -> dict:
+    texto = job["payload"]["texto"]
+
+    # Cribado local: en modo activo un "No apto" claro no llega al LLM; en
+    # modo sombra se compara con lo que decide el LLM (ver cribado.py)
+    extra = {}
+    if cribado.MODO in ("sombra", "activo"):
+        evaluacion = cribado.evaluar(texto)
+        evitada = evaluacion.rechazo and cribado.MODO == "activo"
+        cribado.registrar(evaluacion, evitada)
+        extra["cribado"] = evaluacion.resumen()
+        if evitada:
+            resultado = evaluacion.resultado(cribado.ESPECIFICACION.umbral_rechazo)
+            return destino_persistencia(job, {**resultado_ia(resultado), **extra})
+
+    # Un CV idéntico ya analizado con los mismos criterios no vuelve al LLM
+    resultado = await cv_cache.obtener(texto)
+    if resultado is not None:
+        return destino_persistencia(job, comparar_cribado({**resultado_ia(resultado), "cache": True, **extra}))
+
+    if job["payload"].get("lote") and LLM_BATCH_ENABLED:
+        return {"_etapa": "analyze_batch", **extra}
+    try:
+        resultado = await analizar_con_gpt4o(texto)
+    except Exception as e:
+        # Se reintenta; en el último intento se guarda el error como resultado
+        if job["attempts"] < job["max_attempts"]:
+            raise
+        return destino_persistencia(job, resultado_ia(f"❌ Error al procesar el CV: {str(e)}"))
+
+    await cv_cache.guardar(texto, resultado)
+    return destino_persistencia(job, comparar_cribado({**resultado_ia(resultado), **extra}))
 
-✅ Apto  
-❌ No apto
 
-CV:
-{texto_cv}
+def comparar_cribado(salida: dict, cribado_previo: dict | None = None) -> dict:
+    # Decisión del LLM frente a la del cribado local, si se evaluó
+    evaluacion = salida.get("cribado") or cribado_previo
+    if evaluacion:
+        cribado.comparar(evaluacion["decision"], salida["estado"])
+    return salida
+
+
+def resultado_ia(resultado: str) -> dict:
+    # Determinar estado
+    estado = "Apto" if resultado.strip().endswith("✅ Apto") else "No Apto"
+    return {"resultado": resultado, "estado": estado}
+
+
+def destino_persistencia(job: dict, salida: dict) -> dict:
+    # Las importaciones masivas se guardan por lotes (persistir_lotes)
+    if job["payload"].get("importacion"):
+        salida["_etapa"] = "persist_batch"
+    return salida
+
+
+# Consulta de persistencia: usuario + CV en una sola llamada a la función
+# registrar_postulacion (sql/006), idempotente por correo + hash del PDF, y
+# el texto extraído en cv_textos (sql/010) para la búsqueda, en el mismo viaje.
+SQL_REGISTRAR_POSTULACION = """
+    WITH r AS (
+        SELECT usuario, cv, nuevo FROM registrar_postulacion($1, $2, $3, $4, $5, $6, $7)
+    ), texto AS (
+        INSERT INTO cv_textos (cv_id, texto)
+        SELECT cv, $8 FROM r WHERE nuevo AND $8::text IS NOT NULL
+        ON CONFLICT DO NOTHING
+    )
+    SELECT usuario, cv, nuevo FROM r
 """
-    respuesta = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
+
+
+async def etapa_persistir(job: dict) -> dict:
+    datos = job["payload"]
+    blob_name = datos["ruta_en_blob"]
+    # Trabajos encolados antes de guardar el hash: se usa la ruta del blob
+    hash_archivo = datos.get("hash_archivo") or hashlib.sha256(blob_name.encode("utf-8")).hexdigest()
+
+    # id del estado desde el registro en memoria (se crea si es nuevo)
+    status_id = await catalogos.id_estado_cv(datos["estado"])
+
+    pool = await get_async_pool()
+    fila = await pool.fetchrow(
+        SQL_REGISTRAR_POSTULACION,
+        datos["correo"], hash_archivo, datos["nombres"], datos["apellidos"],
+        blob_name, status_id, datos["resultado"], datos.get("texto"),
+    )
+    return {"user_id": fila["usuario"], "cv_id": fila["cv"], "duplicada": not fila["nuevo"]}
+
+
+# Persistencia por lotes de las importaciones masivas: una sola consulta
+# registra todos los usuarios y CVs de la tanda.
+IMPORT_PERSIST_BATCH = int(os.getenv("IMPORT_PERSIST_BATCH") or 200)
+IMPORT_PERSIST_INTERVAL = float(os.getenv("IMPORT_PERSIST_INTERVAL") or 2)
+
+SQL_REGISTRAR_POSTULACIONES = """
+    WITH r AS (
+        SELECT t.n, t.texto, r.usuario, r.cv, r.nuevo
+        FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[], $6::int[], $7::text[], $8::text[])
+             WITH ORDINALITY AS t(email, file_hash, nombres, apellidos, file_path, status_id, resultado, texto, n)
+        CROSS JOIN LATERAL registrar_postulacion(
+            t.email, t.file_hash, t.nombres, t.apellidos, t.file_path, t.status_id, t.resultado) r
+    ), textos AS (
+        INSERT INTO cv_textos (cv_id, texto)
+        SELECT cv, texto FROM r WHERE nuevo AND texto IS NOT NULL
+        ON CONFLICT DO NOTHING
     )
-    return respuesta.choices[0].message.content
+    SELECT n, usuario, cv, nuevo FROM r ORDER BY n
+"""
 
 
+async def persistir_varios(jobs: list):
+    listos, filas = [], []
+    for job in jobs:
+        datos = job["payload"]
+        correo = datos.get("correo") or importacion.correo_en_texto(datos.get("texto"))
+        if not correo:
+            # Sin reintentos: el correo no va a aparecer en el CV
+            await cola_postulaciones.fallar(job, ValueError("No se encontró un correo en el CV ni en el manifiesto"),
+                                            reintentar=False)
+            continue
+        status_id = await catalogos.id_estado_cv(datos["estado"])
+        listos.append(job)
+        filas.append((correo, datos["hash_archivo"], datos["nombres"], datos["apellidos"],
+                      datos["ruta_en_blob"], status_id, datos["resultado"], datos.get("texto")))
+    if not listos:
+        return
+
+    pool = await get_async_pool()
+    try:
+        registrados = await pool.fetch(SQL_REGISTRAR_POSTULACIONES, *map(list, zip(*filas)))
+    except Exception as e:
+        # Una fila mala aborta la tanda: se reintenta de a uno para aislarla
+        print(f"[IMPORTACION] Lote de {len(listos)} falló ({e}); se guarda uno por uno")
+        for job, fila in zip(listos, filas):
+            try:
+                r = await pool.fetchrow(SQL_REGISTRAR_POSTULACION, *fila)
+                await cola_postulaciones.completar(job, {
+                    "correo": fila[0], "user_id": r["usuario"], "cv_id": r["cv"], "duplicada": not r["nuevo"]})
+            except Exception as e_fila:
+                await cola_postulaciones.fallar(job, e_fila)
+        return
+
+    await cola_postulaciones.completar_varios(listos, [
+        {"correo": fila[0], "user_id": r["usuario"], "cv_id": r["cv"], "duplicada": not r["nuevo"]}
+        for fila, r in zip(filas, registrados)
+    ])
+
+
+async def persistir_lotes():
+    while True:
+        jobs = []
+        try:
+            jobs = await cola_postulaciones.reclamar_varios("persist_batch", IMPORT_PERSIST_BATCH)
+            await persistir_varios(jobs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[IMPORTACION] {e}")
+        if len(jobs) < IMPORT_PERSIST_BATCH:
+            await asyncio.sleep(IMPORT_PERSIST_INTERVAL)
+
+
+cola_postulaciones = JobQueue(
+    tabla="cv_jobs",
+    etapas=["extract", "analyze", "persist"],
+    handlers={
+        "extract": etapa_extraer,
+        "analyze": etapa_analizar,
+        "persist": etapa_persistir,
+    },
+    concurrencia={
+        "extract": int(os.getenv("CV_JOBS_EXTRACT_WORKERS") or 2),
+        "analyze": int(os.getenv("CV_JOBS_ANALYZE_WORKERS") or 4),
+        "persist": int(os.getenv("CV_JOBS_PERSIST_WORKERS") or 2),
+    },
+    max_intentos=int(os.getenv("CV_JOBS_MAX_ATTEMPTS") or 3),
+    etapas_externas={"analyze_batch": "persist", "persist_batch": "done"},
+    # El PDF de un trabajo fallido se conserva unas horas para revisarlo
+    retencion_archivos_fallidos=float(os.getenv("CV_JOBS_FAILED_RETENTION_HOURS") or 72) * 3600,
+)
 
-@app.post("/postulaciones")
+
+# Modo lote: las postulaciones marcadas como "lote" se analizan juntas con la
+# Batch API (más barata, resultados en horas) en lugar de una llamada por CV.
+LLM_BATCH_ENABLED = os.getenv("LLM_BATCH_ENABLED", "0") == "1"
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE") or 500)
+LLM_BATCH_INTERVAL = float(os.getenv("LLM_BATCH_INTERVAL") or 300)
+
+
+async def procesar_lotes_llm():
+    while True:
+        try:
+            # 1. Enviar los CVs pendientes en un único lote
+            jobs = await cola_postulaciones.reclamar_varios("analyze_batch", LLM_BATCH_SIZE)
+            if jobs:
+                try:
+                    batch_id = await enviar_lote([(job["id"], job["payload"]["texto"]) for job in jobs])
+                except Exception as e:
+                    for job in jobs:
+                        await cola_postulaciones.fallar(job, e)
+                else:
+                    await cola_postulaciones.aparcar(jobs, {"batch_id": batch_id})
+
+            # 2. Recoger los lotes terminados
+            por_lote = {}
+            for job in await cola_postulaciones.aparcados("analyze_batch"):
+                por_lote.setdefault(job["payload"]["batch_id"], []).append(job)
+            for batch_id, jobs in por_lote.items():
+                try:
+                    resultados = await recoger_lote(batch_id)
+                except Exception as e:
+                    resultados = {str(job["id"]): e for job in jobs}
+                if resultados is None:
+                    continue
+                for job in jobs:
+                    resultado = resultados.get(str(job["id"]), RuntimeError("Sin respuesta en el lote"))
+                    if isinstance(resultado, Exception):
+                        salida = resultado_ia(f"❌ Error al procesar el CV: {str(resultado)}")
+                    else:
+                        await cv_cache.guardar(job["payload"]["texto"], resultado)
+                        salida = comparar_cribado(resultado_ia(resultado), job["payload"].get("cribado"))
+                    await cola_postulaciones.completar(job, destino_persistencia(job, salida))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[LOTE LLM] {e}")
+        await asyncio.sleep(LLM_BATCH_INTERVAL)
+
+
+@router.post("/postulaciones", status_code=202)
 async def crear_postulacion(
     usuario: str = Form(...),
     fecha_nacimiento: str = Form(...),
@@ -100,81 +457,156 @@ async def crear_postulacion(
     correo: str = Form(...),
     celular: str = Form(...),
     dni: str = Form(...),
-    cv: UploadFile = File(...)
+    cv: UploadFile = File(...),
+    modo: str = Form("inmediato")
 ):
-    ruta = f"uploads/{cv.filename}"
-
-    # Guardar temporalmente el archivo
-    with open(ruta, "wb") as f:
-        f.write(await cv.read())
-
-    texto = extraer_texto_pdf(ruta)
+    job_id = uuid4()
+    contenido = await leer_pdf_limitado(cv)
+    hash_archivo = hashlib.sha256(contenido).hexdigest()
 
-    # IA: resultado de análisis
     try:
-        resultado = await analizar_con_gpt4o(texto)
-    except Exception as e:
-        os.remove(ruta)
-        resultado = f"❌ Error al procesar el CV: {str(e)}"
-
-    # Determinar estado
-    estado = "Apto" if resultado.strip().endswith("✅ Apto") else "No Apto"
+        await cola_postulaciones.encolar({
+            "usuario": usuario,
+            "fecha_nacimiento": fecha_nacimiento,
+            "nombres": nombres,
+            "apellidos": apellidos,
+            "correo": correo,
+            "celular": celular,
+            "dni": dni,
+            "archivo": cv.filename,
+            "hash_archivo": hash_archivo,
+            "lote": modo == "lote",
+        }, job_id=job_id, archivo=contenido)
+    except Exception as db_error:
+        print(f"[ERROR SQL] {db_error}")
+        raise HTTPException(status_code=503, detail=f"No se pudo registrar la postulación: {str(db_error)}")
 
-    # Subir a Azure Blob Storage
-    blob_name = f"{uuid4()}_{cv.filename}"
-    blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=blob_name)
-    with open(ruta, "rb") as data:
-        blob_client.upload_blob(data, overwrite=True)
+    return {
+        "job_id": str(job_id),
+        "usuario": usuario,
+        "estado": "pendiente"
+    }
 
-    os.remove(ruta)
 
-    # INSERT en PostgreSQL
+@router.get("/postulaciones/{job_id}")
+async def estado_postulacion(job_id: UUID):
+    job = await cola_postulaciones.obtener(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Postulación no encontrada")
+
+    datos = job["payload"]
+    respuesta = {
+        "job_id": str(job["id"]),
+        "usuario": datos.get("usuario"),
+        "etapa": job["stage"],
+        "estado_trabajo": job["status"],
+        "intentos": job["attempts"],
+        "error": job["error"],
+    }
+    if job["status"] == "done":
+        respuesta.update({
+            "estado": datos.get("estado"),
+            "ruta_en_blob": datos.get("ruta_en_blob"),
+            "resultado_ia": datos.get("resultado"),
+            "duplicada": datos.get("duplicada", False),
+        })
+    return respuesta
+
+@router.post("/postulaciones/importaciones", status_code=202)
+async def importar_postulaciones(
+    cvs: List[UploadFile] = File(None),
+    archivo_zip: UploadFile = File(None, alias="zip"),
+    manifiesto: UploadFile = File(None),
+    importacion_id: Optional[UUID] = Form(None, description="Para reanudar o ampliar una importación"),
+    modo: str = Form("inmediato")
+):
+    """Encola muchos CVs (varios archivos y/o un zip) en el mismo pipeline que /postulaciones."""
+    importacion_id = importacion_id or uuid4()
     try:
-        conn = get_pg_connection()
-        cur = conn.cursor()
+        filas_manifiesto = importacion.leer_manifiesto(await manifiesto.read()) if manifiesto else {}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def archivos():
+        for cv in cvs or []:
+            yield cv.filename, cv
+        if archivo_zip:
+            # La descompresión corre en un hilo, entrada por entrada
+            entradas = importacion.archivos_zip(archivo_zip.file, CV_MAX_BYTES)
+            while (entrada := await asyncio.to_thread(next, entradas, None)) is not None:
+                yield entrada
+
+    encolados, existentes, rechazados, tanda = 0, 0, [], []
+
+    async def vaciar():
+        nonlocal encolados, existentes
+        nuevos = await cola_postulaciones.encolar_varios(tanda)
+        encolados += len(nuevos)
+        existentes += len(tanda) - len(nuevos)
+        tanda.clear()
 
-        # 1. Insertar usuario (tabla users)
-        cur.execute("""
-            INSERT INTO users (auth_provider, email, first_name, last_name, role_id, status)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id;
-        """, ("email", correo, nombres, apellidos, 2, True))
-        user_id = cur.fetchone()[0]
-
-        # 2. Insertar o recuperar id del estado en cv_statuses
-        cur.execute("SELECT id FROM cv_statuses WHERE name = %s", (estado,))
-        row = cur.fetchone()
-        if row:
-            status_id = row[0]
-        else:
-            cur.execute("INSERT INTO cv_statuses (name) VALUES (%s) RETURNING id", (estado,))
-            status_id = cur.fetchone()[0]
-
-        # 3. Insertar CV (tabla cvs)
-        cur.execute("""
-            INSERT INTO cvs (user_id, file_path, status_id, ia_result)
-            VALUES (%s, %s, %s, %s)
-        """, (user_id, blob_name, status_id, resultado))
+    try:
+        recibidos = 0
+        async for nombre, contenido in archivos():
+            recibidos += 1
+            if recibidos > importacion.MAX_ARCHIVOS:
+                # Se pueden enviar después con el mismo importacion_id
+                rechazados.append({"archivo": nombre, "motivo": f"supera el máximo de {importacion.MAX_ARCHIVOS} CVs por envío"})
+                continue
+            if not isinstance(contenido, (bytes, str)):
+                try:
+                    contenido = await leer_pdf_limitado(contenido)
+                except HTTPException as e:
+                    contenido = e.detail
+            if isinstance(contenido, str):
+                rechazados.append({"archivo": nombre, "motivo": contenido})
+                continue
+            tanda.append(importacion.trabajo(importacion_id, nombre, contenido, filas_manifiesto, modo))
+            if len(tanda) >= importacion.TAMANO_TANDA:
+                await vaciar()
+        await vaciar()
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Lo encolado hasta acá queda: se informa para reanudar con el mismo
+        # importacion_id (lo ya encolado vuelve como "ya_existentes")
+        print(f"[IMPORTACION] {importacion_id}: {e}")
+        raise HTTPException(
+            status_code=400 if isinstance(e, ValueError) else 503,
+            detail={
+                "mensaje": f"No se pudo procesar la importación: {e}",
+                "importacion_id": str(importacion_id),
+                "encolados": encolados,
+                "ya_existentes": existentes,
+                "rechazados": rechazados,
+            },
+        )
 
-        conn.commit()
-        cur.close()
-        conn.close()
+    return {
+        "importacion_id": str(importacion_id),
+        "encolados": encolados,
+        "ya_existentes": existentes,
+        "rechazados": rechazados,
+    }
 
-    except Exception as db_error:
-        print(f"[ERROR SQL] {db_error}")
-        return {"error": f"No se pudo guardar en la base de datos: {str(db_error)}"}
 
+@router.get("/postulaciones/importaciones/{importacion_id}")
+async def progreso_importacion(importacion_id: UUID):
+    resumen = await cola_postulaciones.resumen("importacion", str(importacion_id))
+    if not resumen["total"]:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    terminados = resumen["por_estado"].get("done", 0) + resumen["por_estado"].get("failed", 0)
     return {
-        "usuario": usuario,
-        "estado": estado,
-        "ruta_en_blob": blob_name,
-        "resultado_ia": resultado
+        "importacion_id": str(importacion_id),
+        **resumen,
+        "terminados": terminados,
+        "completa": terminados == resumen["total"],
     }
 
-@app.get("/cvs/detalle/{cv_id}")
-def detalle_cv(cv_id: int):
+
+@router.get("/cvs/detalle/{cv_id}")
+def detalle_cv(cv_id: int, conn: PooledConnection = Depends(get_db)):
     try:
-        conn = get_pg_connection()
         cur = conn.cursor()
         cur.execute("""
             SELECT c.ia_result, c.file_path, u.first_name, u.last_name
@@ -184,7 +616,6 @@ def detalle_cv(cv_id: int):
         """, (cv_id,))
         row = cur.fetchone()
         cur.close()
-        conn.close()
         if not row:
             raise HTTPException(status_code=404, detail="CV no encontrado")
 
@@ -198,22 +629,33 @@ def detalle_cv(cv_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/get-cv-url/{blob_name}")
-def obtener_url_cv(blob_name: str):
+@router.get("/get-cv-url/{blob_name}")
+async def obtener_url_cv(blob_name: str):
     try:
-        sas_token = generate_blob_sas(
-            account_name=os.getenv("AZURE_STORAGE_ACCOUNT_NAME"),
-            container_name=CONTAINER_NAME,
-            blob_name=blob_name,
-            account_key=os.getenv("AZURE_STORAGE_ACCOUNT_KEY"),
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(minutes=30)
-        )
-        url = f"https://{os.getenv('AZURE_STORAGE_ACCOUNT_NAME')}.blob.core.windows.net/{CONTAINER_NAME}/{blob_name}?{sas_token}"
-        return {"url": url}
+        return {"url": await blob_storage.url_firmada(blob_name)}
     except Exception as e:
         return {"error": str(e)}
-    
+
+
+# Blobs por petición en POST /get-cv-urls: más largas responden 422 en vez
+# de firmar miles de URLs (y pedir claves de delegación) en una sola llamada
+CV_URLS_MAX = int(os.getenv("CV_URLS_MAX") or 200)
+
+
+class CVUrlsRequest(BaseModel):
+    blobs: List[str] = Field(..., max_length=CV_URLS_MAX)
+
+@router.post("/get-cv-urls")
+async def obtener_urls_cv(datos: CVUrlsRequest):
+    """URLs firmadas para varios blobs en una sola petición."""
+    urls = {}
+    errores = {}
+    for blob_name in dict.fromkeys(datos.blobs):
+        try:
+            urls[blob_name] = await blob_storage.url_firmada(blob_name)
+        except Exception as e:
+            errores[blob_name] = str(e)
+    return {"urls": urls, "errores": errores}
 
 
 # Esquema opcional de respuesta
@@ -226,50 +668,95 @@ class UserResponse(BaseModel):
     phone_number: str | None = None
     document_number: str | None = None
 
-@app.post("/auth/cliente", response_model=UserResponse)
-def login_cliente(email: str = Form(...), password: str = Form(...)):
+# Perfil devuelto por el login, cacheado por usuario (LRU con TTL)
+PERFIL_TTL = float(os.getenv("LOGIN_PERFIL_TTL") or 300)
+PERFIL_CACHE_MAX = int(os.getenv("LOGIN_PERFIL_CACHE_SIZE") or 10000)
+_perfiles: OrderedDict = OrderedDict()  # user_id -> (perfil, expira)
+
+
+async def perfil_usuario(conn: asyncpg.Connection, user_id: int) -> dict:
+    cacheado = _perfiles.get(user_id)
+    if cacheado and cacheado[1] > time.monotonic():
+        _perfiles.move_to_end(user_id)
+        return cacheado[0]
+
+    # Un teléfono y un documento por usuario (sin multiplicar filas por JOIN)
+    fila = await conn.fetchrow("""
+        SELECT u.id, u.email, u.first_name, u.last_name, u.role_id,
+               (SELECT phone_number FROM user_phones WHERE user_id = u.id ORDER BY id LIMIT 1),
+               (SELECT document_number FROM user_documents WHERE user_id = u.id ORDER BY id LIMIT 1)
+        FROM users u WHERE u.id = $1
+    """, user_id)
+    perfil = {
+        "id": fila[0],
+        "email": fila[1],
+        "first_name": fila[2],
+        "last_name": fila[3],
+        "role_id": fila[4],
+        "phone_number": fila[5],
+        "document_number": fila[6]
+    }
+    _perfiles[user_id] = (perfil, time.monotonic() + PERFIL_TTL)
+    _perfiles.move_to_end(user_id)
+    while len(_perfiles) > PERFIL_CACHE_MAX:
+        _perfiles.popitem(last=False)
+    return perfil
+
+
+@router.post("/auth/cliente", response_model=UserResponse)
+async def login_cliente(request: Request, email: str = Form(...), password: str = Form(...),
+                        conn: asyncpg.Connection = Depends(get_async_db)):
+    ip = credenciales.ip_cliente(request.client.host if request.client else None,
+                                 request.headers.get("x-forwarded-for"))
+    espera = max(credenciales.limite_ip.bloqueado(ip), credenciales.limite_correo.bloqueado(email))
+    if espera:
+        raise HTTPException(status_code=429, detail="Demasiados intentos fallidos. Intente más tarde.",
+                            headers={"Retry-After": str(int(espera) + 1)})
     try:
-        conn = get_pg_connection()
-        cur = conn.cursor()
-
-        query = """
-        SELECT 
-            u.id,
-            u.email,
-            u.first_name,
-            u.last_name,
-            u.role_id,
-            up.phone_number,
-            ud.document_number
-        FROM users u
-        LEFT JOIN user_phones up ON up.user_id = u.id
-        LEFT JOIN user_documents ud ON ud.user_id = u.id
-        WHERE u.email = %s AND u.password = %s AND u.role_id = 1;
-        """
-
-        cur.execute(query, (email, password))
-        user = cur.fetchone()
+        # Índice users_email_cliente_idx (sql/009)
+        usuario = await conn.fetchrow(
+            "SELECT id, password FROM users WHERE email = $1 AND role_id = 1 LIMIT 1", email
+        )
+        correcta, rehacer = await credenciales.verificar_async(password, usuario["password"] if usuario else None)
 
-        cur.close()
-        conn.close()
-
-        if user:
-            return {
-                "id": user[0],
-                "email": user[1],
-                "first_name": user[2],
-                "last_name": user[3],
-                "role_id": user[4],
-                "phone_number": user[5],
-                "document_number": user[6]
-            }
-        else:
+        if not correcta:
+            credenciales.limite_ip.fallo(ip)
+            credenciales.limite_correo.fallo(email)
             raise HTTPException(status_code=401, detail="Credenciales inválidas o rol incorrecto.")
 
+        credenciales.limite_correo.exito(email)
+        if rehacer:
+            # Migra texto plano (o un coste viejo) al hash actual
+            await conn.execute("UPDATE users SET password = $1 WHERE id = $2",
+                               await credenciales.hashear_async(password), usuario["id"])
+        return await perfil_usuario(conn, usuario["id"])
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en el servidor: {str(e)}")
 
     
+# Paginación de service_requests: orden por (requested_at DESC, id DESC),
+# con las solicitudes sin fecha al final.
+def filtros_solicitudes(cursor: Optional[str], desde: Optional[datetime], hasta: Optional[datetime]):
+    filtros, params = [], []
+    if desde:
+        filtros.append("sr.requested_at >= %s")
+        params.append(desde)
+    if hasta:
+        filtros.append("sr.requested_at < %s")
+        params.append(hasta)
+    if cursor:
+        condicion, valores = filtro_keyset("sr.requested_at", "sr.id", cursor)
+        filtros.append(condicion)
+        params.extend(valores)
+    return filtros, params
+
+
+ORDEN_SOLICITUDES = "ORDER BY sr.requested_at DESC NULLS LAST, sr.id DESC"
+
+
 # Modelo de respuesta
 class ServiceRequestOut(BaseModel):
     id: int
@@ -278,28 +765,45 @@ class ServiceRequestOut(BaseModel):
     service_details: str
     phone_number: str
 
-@app.get("/service-requests/detalles", response_model=List[ServiceRequestOut])
-def get_service_requests():
+@router.get("/service-requests/detalles", response_model=List[ServiceRequestOut])
+def get_service_requests(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    formato: Optional[str] = Query(None, description="ndjson o csv para exportar todo en streaming"),
+    conn: PooledConnection = Depends(get_db)
+):
     try:
-        conn = get_pg_connection()
-        cur = conn.cursor()
-
-        query = """
+        filtros, params = filtros_solicitudes(None if formato else cursor, desde, hasta)
+        query = f"""
         SELECT
             sr.id,
             s.name AS service_name,
             CONCAT(u.first_name, ' ', u.last_name) AS user_name,
             sr.service_details,
-            sr.phone_number
+            sr.phone_number,
+            sr.requested_at
         FROM service_requests sr
         JOIN users u ON sr.user_id = u.id
-        JOIN services s ON sr.service_id = s.id;
+        JOIN services s ON sr.service_id = s.id
+        WHERE {" AND ".join(filtros) or "TRUE"}
+        {ORDEN_SOLICITUDES}
         """
-        cur.execute(query)
+        if formato:
+            columnas = ["id", "service_name", "user_name", "service_details", "phone_number", "requested_at"]
+            return exportar(conn, query, params, columnas, formato, "service_requests")
+
+        cur = conn.cursor()
+        cur.execute(query + " LIMIT %s", params + [limit + 1])
         rows = cur.fetchall()
 
         cur.close()
-        conn.close()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = codificar_cursor(rows[-1][5], rows[-1][0])
 
         result = []
         for row in rows:
@@ -313,9 +817,11 @@ def get_service_requests():
 
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en el servidor: {str(e)}")
-    
+
 
 
 
@@ -328,10 +834,14 @@ class CVConUsuario(BaseModel):
     first_name: str
     last_name: str
 
-@app.get("/cvs/apto", response_model=List[CVConUsuario])
-def get_cvs_apto():
+CAMPOS_CV = serializacion.campos(CVConUsuario)
+
+@router.get("/cvs/apto", response_model=List[CVConUsuario])
+def get_cvs_apto(conn: PooledConnection = Depends(get_db)):
     try:
-        conn = get_pg_connection()
+        status_id = catalogos.estados_cv.resolver_id(conn, "Apto")
+        if status_id is None:
+            return []
         cur = conn.cursor()
 
         query = """
@@ -344,14 +854,14 @@ def get_cvs_apto():
             u.first_name,
             u.last_name
         FROM cvs c
-        JOIN cv_statuses s ON c.status_id = s.id
         JOIN users u ON c.user_id = u.id
-        WHERE s.name = 'Apto';
+        WHERE c.status_id = %s;
         """
-        cur.execute(query)
+        cur.execute(query, (status_id,))
         rows = cur.fetchall()
         cur.close()
-        conn.close()
+        if serializacion.RAPIDO:
+            return serializacion.respuesta_filas(CAMPOS_CV, rows)
 
         result = []
         for row in rows:
@@ -371,10 +881,12 @@ def get_cvs_apto():
         raise HTTPException(status_code=500, detail=f"Error en el servidor: {str(e)}")
     
 
-@app.get("/cvs/estado/{estado}", response_model=List[CVConUsuario])
-def get_cvs_por_estado(estado: str):
+@router.get("/cvs/estado/{estado}", response_model=List[CVConUsuario])
+def get_cvs_por_estado(estado: str, conn: PooledConnection = Depends(get_db)):
     try:
-        conn = get_pg_connection()
+        status_id = catalogos.estados_cv.resolver_id(conn, estado)
+        if status_id is None:
+            return []
         cur = conn.cursor()
         query = """
         SELECT 
@@ -386,14 +898,14 @@ def get_cvs_por_estado(estado: str):
             u.first_name,
             u.last_name
         FROM cvs c
-        JOIN cv_statuses s ON c.status_id = s.id
         JOIN users u ON c.user_id = u.id
-        WHERE s.name = %s;
+        WHERE c.status_id = %s;
         """
-        cur.execute(query, (estado,))
+        cur.execute(query, (status_id,))
         rows = cur.fetchall()
         cur.close()
-        conn.close()
+        if serializacion.RAPIDO:
+            return serializacion.respuesta_filas(CAMPOS_CV, rows)
 
         return [{
             "cv_id": row[0],
@@ -409,83 +921,130 @@ def get_cvs_por_estado(estado: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/admin/usuarios")
-def obtener_usuarios():
+@router.get("/cvs/buscar")
+def buscar_cvs(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=200, description='Palabras, "frases", OR, -excluir'),
+    estado: Optional[str] = Query(None, description="Solo CVs en este estado (p. ej. Apto)"),
+    modo: str = Query("auto", description="auto, texto (tsvector) o aproximado (trigramas)"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    conn: PooledConnection = Depends(get_db)
+):
+    """CVs cuyo texto coincide con ``q``, por relevancia y con fragmentos resaltados."""
+    if modo not in busqueda_cvs.MODOS:
+        raise HTTPException(status_code=400, detail="modo debe ser auto, texto o aproximado")
+    try:
+        status_id = None
+        if estado:
+            status_id = catalogos.estados_cv.resolver_id(conn, estado)
+            if status_id is None:
+                return {"modo": modo, "resultados": []}
+        resultados, usado, siguiente = busqueda_cvs.buscar(conn, q, status_id, modo, limit, cursor)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la búsqueda: {str(e)}")
+
+    if siguiente:
+        response.headers["X-Next-Cursor"] = siguiente
+    for r in resultados:
+        r["estado"] = catalogos.estados_cv.nombre(r.pop("status_id"))
+    return {"modo": usado, "resultados": resultados}
+
+
+@router.get("/admin/usuarios")
+def obtener_usuarios(
+    response: Response,
+    cursor: Optional[int] = Query(None, description="id del último usuario de la página anterior"),
+    limit: int = Query(100, ge=1, le=500),
+    role_id: Optional[int] = Query(None),
+    status: Optional[bool] = Query(None),
+    q: Optional[str] = Query(None, description="Busca en nombre, apellido o email"),
+    conn: PooledConnection = Depends(get_db)
+):
     try:
-        conn = get_pg_connection()
         cur = conn.cursor()
 
-        query = """
-        SELECT 
-            u.id, u.first_name, u.last_name, u.email, u.status, u.role_id,
-            r.name AS role_name
-        FROM users u
-        JOIN roles r ON u.role_id = r.id;
+        # Paginación por id (keyset): solo se lee una página de usuarios y los
+        # teléfonos/direcciones/documentos se agregan en SQL solo para ella.
+        filtros = ["TRUE"]
+        params = []
+        if cursor is not None:
+            filtros.append("u.id > %s")
+            params.append(cursor)
+        if role_id is not None:
+            filtros.append("u.role_id = %s")
+            params.append(role_id)
+        if status is not None:
+            filtros.append("u.status = %s")
+            params.append(status)
+        if q:
+            filtros.append("(u.first_name ILIKE %s OR u.last_name ILIKE %s OR u.email ILIKE %s"
+                           " OR CONCAT(u.first_name, ' ', u.last_name) ILIKE %s)")
+            params.extend([f"%{q}%"] * 4)
+        params.append(limit + 1)
+
+        query = f"""
+        WITH pagina AS (
+            SELECT u.id, u.first_name, u.last_name, u.email, u.status, u.role_id
+            FROM users u
+            WHERE {" AND ".join(filtros)}
+            ORDER BY u.id
+            LIMIT %s
+        )
+        SELECT
+            p.id, p.first_name, p.last_name, p.email, p.status, p.role_id,
+            COALESCE(ph.phones, '{{}}'), COALESCE(ad.addresses, '{{}}'), COALESCE(dc.documents, '{{}}')
+        FROM pagina p
+        LEFT JOIN LATERAL (
+            SELECT array_agg(phone_number ORDER BY id) AS phones
+            FROM user_phones WHERE user_id = p.id
+        ) ph ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT array_agg(format('%%s (%%s, %%s)', address_text, latitude, longitude) ORDER BY id) AS addresses
+            FROM user_addresses WHERE user_id = p.id
+        ) ad ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT array_agg(document_number ORDER BY id) AS documents
+            FROM user_documents WHERE user_id = p.id
+        ) dc ON TRUE
+        ORDER BY p.id;
         """
-        cur.execute(query)
+        cur.execute(query, params)
         users = cur.fetchall()
+        cur.close()
 
-        # Obtener direcciones
-        cur.execute("""
-        SELECT user_id, address_text, latitude, longitude
-        FROM user_addresses
-        """)
-        addresses = cur.fetchall()
-        dir_map = {}
-        for u_id, address, lat, lon in addresses:
-            dir_map.setdefault(u_id, []).append(f"{address} ({lat}, {lon})")
-
-        # Obtener teléfonos
-        cur.execute("""
-        SELECT user_id, phone_number FROM user_phones
-        """)
-        phones = cur.fetchall()
-        phone_map = {}
-        for u_id, phone in phones:
-            phone_map.setdefault(u_id, []).append(phone)
-
-        # Obtener documentos
-        cur.execute("""
-        SELECT user_id, document_number FROM user_documents
-        """)
-        docs = cur.fetchall()
-        doc_map = {}
-        for u_id, doc in docs:
-            doc_map.setdefault(u_id, []).append(doc)
-
-        result = []
-        for u in users:
-            result.append({
-                "id": u[0],
-                "first_name": u[1],
-                "last_name": u[2],
-                "email": u[3],
-                "status": u[4],
-                "role_id": u[5],
-                "role_name": u[6],
-                "phones": phone_map.get(u[0], []),
-                "addresses": dir_map.get(u[0], []),
-                "documents": doc_map.get(u[0], [])
-            })
+        if len(users) > limit:
+            users = users[:limit]
+            response.headers["X-Next-Cursor"] = str(users[-1][0])
+        nombres_rol = catalogos.roles.resolver_nombres(conn, {u[5] for u in users})
 
-        cur.close()
-        conn.close()
-        return result
+        return [{
+            "id": u[0],
+            "first_name": u[1],
+            "last_name": u[2],
+            "email": u[3],
+            "status": u[4],
+            "role_id": u[5],
+            "role_name": nombres_rol[u[5]],
+            "phones": u[6],
+            "addresses": u[7],
+            "documents": u[8]
+        } for u in users]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.put("/admin/usuarios/{user_id}/estado")
-def cambiar_estado_usuario(user_id: int, estado: bool = Form(...)):
+@router.put("/admin/usuarios/{user_id}/estado")
+def cambiar_estado_usuario(user_id: int, estado: bool = Form(...), conn: PooledConnection = Depends(get_db)):
     try:
-        conn = get_pg_connection()
         cur = conn.cursor()
 
         cur.execute("UPDATE users SET status = %s WHERE id = %s", (estado, user_id))
         conn.commit()
 
         cur.close()
-        conn.close()
 
         return {"message": f"Usuario {user_id} actualizado a estado {'Activo' if estado else 'Inactivo'}"}
     except Exception as e:
@@ -499,13 +1058,48 @@ class PagoOut(BaseModel):
     status: str
     created_at: str
 
-@app.get("/admin/pagos", response_model=List[PagoOut])
-def obtener_pagos():
+CAMPOS_PAGO = serializacion.campos(PagoOut)
+
+def filtros_pagos(status: Optional[str], specialist_id: Optional[int],
+                  desde: Optional[datetime], hasta: Optional[datetime]):
+    filtros, params = [], []
+    if status:
+        filtros.append("p.status = %s")
+        params.append(status)
+    if specialist_id is not None:
+        filtros.append("p.specialist_id = %s")
+        params.append(specialist_id)
+    if desde:
+        filtros.append("p.created_at >= %s")
+        params.append(desde)
+    if hasta:
+        filtros.append("p.created_at < %s")
+        params.append(hasta)
+    return filtros, params
+
+
+@router.get("/admin/pagos", response_model=List[PagoOut])
+def obtener_pagos(
+    response: Response,
+    status: Optional[str] = Query(None),
+    specialist_id: Optional[int] = Query(None),
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    conn: PooledConnection = Depends(get_db)
+):
     try:
-        conn = get_pg_connection()
+        filtros, params = filtros_pagos(status, specialist_id, desde, hasta)
+        if cursor:
+            condicion, valores = filtro_keyset("p.created_at", "p.id", cursor)
+            filtros.append(condicion)
+            params.extend(valores)
+        params.append(limit + 1)
+
         cur = conn.cursor()
 
-        cur.execute("""
+        cur.execute(f"""
             SELECT p.id,
                    CONCAT(s.first_name, ' ', s.last_name) AS specialist_name,
                    CONCAT(c.first_name, ' ', c.last_name) AS client_name,
@@ -513,10 +1107,20 @@ def obtener_pagos():
             FROM payments p
             JOIN users s ON p.specialist_id = s.id
             JOIN users c ON p.client_id = c.id
-        """)
+            WHERE {" AND ".join(filtros) or "TRUE"}
+            ORDER BY p.created_at DESC NULLS LAST, p.id DESC
+            LIMIT %s
+        """, params)
         rows = cur.fetchall()
         cur.close()
-        conn.close()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = codificar_cursor(rows[-1][5], rows[-1][0])
+        if serializacion.RAPIDO:
+            # Una Response propia no hereda las cabeceras de ``response``
+            siguiente = response.headers.get("X-Next-Cursor")
+            return serializacion.respuesta_filas(CAMPOS_PAGO, rows, {"X-Next-Cursor": siguiente} if siguiente else None)
 
         return [{
             "id": r[0],
@@ -527,33 +1131,130 @@ def obtener_pagos():
             "created_at": r[5].isoformat()
         } for r in rows]
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
-    
-@app.put("/admin/pagos/{pago_id}/estado")
-def cambiar_estado_pago(pago_id: int, estado: str = Form(...)):
+
+
+@router.get("/admin/pagos/resumen")
+def resumen_pagos(
+    status: Optional[str] = Query(None),
+    specialist_id: Optional[int] = Query(None),
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    top: int = Query(50, ge=1, le=1000, description="Especialistas a listar, por monto total"),
+    fuente: str = Query("vivo", description="vivo (tabla payments) o vista (pagos_resumen_especialista)"),
+    conn: PooledConnection = Depends(get_db)
+):
+    """Totales, conteos por estado y agregados por especialista calculados en SQL."""
+    try:
+        cur = conn.cursor()
+        if fuente == "vista":
+            # La vista materializada no guarda fechas: solo admite estado y especialista
+            if desde or hasta:
+                raise HTTPException(status_code=400, detail="La vista no admite filtros de fecha; use fuente=vivo")
+            filtros, params = filtros_pagos(status, specialist_id, None, None)
+            origen = f"""
+                SELECT p.specialist_id, p.status, p.pagos AS n, p.monto AS monto
+                FROM pagos_resumen_especialista p
+                WHERE {" AND ".join(filtros) or "TRUE"}
+            """
+        else:
+            filtros, params = filtros_pagos(status, specialist_id, desde, hasta)
+            origen = f"""
+                SELECT p.specialist_id, p.status, COUNT(*) AS n, SUM(p.amount) AS monto
+                FROM payments p
+                WHERE {" AND ".join(filtros) or "TRUE"}
+                GROUP BY p.specialist_id, p.status
+            """
+
+        cur.execute(f"""
+            WITH base AS ({origen}),
+            por_estado AS (
+                SELECT status, SUM(n) AS n, SUM(monto) AS monto FROM base GROUP BY status
+            ),
+            por_especialista AS (
+                SELECT specialist_id, SUM(n) AS n, SUM(monto) AS monto
+                FROM base GROUP BY specialist_id
+                ORDER BY monto DESC NULLS LAST
+                LIMIT %s
+            )
+            SELECT
+                (SELECT COALESCE(SUM(n), 0) FROM base),
+                (SELECT COALESCE(SUM(monto), 0) FROM base),
+                (SELECT COALESCE(json_agg(json_build_object(
+                    'status', status, 'pagos', n, 'monto', monto) ORDER BY status), '[]') FROM por_estado),
+                (SELECT COALESCE(json_agg(json_build_object(
+                    'specialist_id', e.specialist_id,
+                    'specialist_name', CONCAT(u.first_name, ' ', u.last_name),
+                    'pagos', e.n, 'monto', e.monto) ORDER BY e.monto DESC), '[]')
+                 FROM por_especialista e JOIN users u ON u.id = e.specialist_id)
+        """, params + [top])
+        total_pagos, monto_total, por_estado, por_especialista = cur.fetchone()
+        cur.close()
+
+        return {
+            "total_pagos": total_pagos,
+            "monto_total": float(monto_total),
+            "por_estado": por_estado,
+            "por_especialista": por_especialista,
+            "fuente": fuente,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/admin/pagos/resumen/refrescar")
+def refrescar_resumen_pagos(conn: PooledConnection = Depends(get_db)):
+    """Recalcula la vista materializada sin bloquear las lecturas (CONCURRENTLY)."""
+    try:
+        cur = conn.cursor()
+        cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY pagos_resumen_especialista")
+        conn.commit()
+        cur.close()
+        return {"message": "Resumen de pagos actualizado"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.put("/admin/pagos/{pago_id}/estado")
+def cambiar_estado_pago(pago_id: int, estado: str = Form(...), conn: PooledConnection = Depends(get_db)):
     try:
-        conn = get_pg_connection()
         cur = conn.cursor()
         cur.execute("UPDATE payments SET status = %s WHERE id = %s", (estado, pago_id))
         conn.commit()
         cur.close()
-        conn.close()
         return {"message": f"Pago {pago_id} actualizado a estado {estado}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.get("/admin/solicitudes")
+@router.get("/admin/solicitudes")
 def obtener_solicitudes(
+    response: Response,
     status: Optional[str] = Query(None),
-    acceptance_status: Optional[str] = Query(None)
+    acceptance_status: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    formato: Optional[str] = Query(None, description="ndjson o csv para exportar todo en streaming"),
+    conn: PooledConnection = Depends(get_db)
 ):
     try:
-        conn = get_pg_connection()
-        cur = conn.cursor()
+        filtros, params = filtros_solicitudes(None if formato else cursor, desde, hasta)
 
-        query = """
+        if status:
+            filtros.insert(0, "sr.status = %s")
+            params.insert(0, status)
+        if acceptance_status:
+            filtros.insert(1 if status else 0, "sr.acceptance_status = %s")
+            params.insert(1 if status else 0, acceptance_status)
+
+        query = f"""
         SELECT
             sr.id,
             s.name AS service_name,
@@ -566,22 +1267,22 @@ def obtener_solicitudes(
         JOIN users c ON sr.user_id = c.id
         JOIN services s ON sr.service_id = s.id
         LEFT JOIN users e ON sr.specialist_id = e.id
-        WHERE 1=1
+        WHERE {" AND ".join(filtros) or "TRUE"}
+        {ORDEN_SOLICITUDES}
         """
-        params = []
+        if formato:
+            columnas = ["id", "service_name", "client_name", "specialist_name", "status", "acceptance_status", "requested_at"]
+            return exportar(conn, query, params, columnas, formato, "solicitudes")
 
-        if status:
-            query += " AND sr.status = %s"
-            params.append(status)
-        if acceptance_status:
-            query += " AND sr.acceptance_status = %s"
-            params.append(acceptance_status)
-
-        cur.execute(query, params)
+        cur = conn.cursor()
+        cur.execute(query + " LIMIT %s", params + [limit + 1])
         rows = cur.fetchall()
 
         cur.close()
-        conn.close()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = codificar_cursor(rows[-1][6], rows[-1][0])
 
         return [
             {
@@ -595,33 +1296,116 @@ def obtener_solicitudes(
             }
             for r in rows
         ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
+
 
 def generar_password(nombre: str, apellido: str, length: int = 4) -> str:
     aleatorio = ''.join(random.choices(string.ascii_letters + string.digits, k=length))
     return f"{nombre.lower()}{apellido.lower()}{aleatorio}"
 
-def enviar_correo(destinatario: str, asunto: str, cuerpo: str):
-    remitente = os.getenv("EMAIL_SENDER")
-    password = os.getenv("EMAIL_PASSWORD")
+# Especialistas más cercanos: el índice GiST de sql/011 recorre las
+# direcciones por distancia euclídea en grados (KNN); sobre esos candidatos
+# se calcula la distancia real (haversine) y se reordena. Se piden
+# ``NEAREST_OVERFETCH`` veces más candidatos para absorber la diferencia
+# entre ambas métricas y a los especialistas con varias direcciones.
+CERCANOS_SOBREMUESTREO = int(os.getenv("NEAREST_OVERFETCH") or 4)
 
-    msg = EmailMessage()
-    msg['Subject'] = asunto
-    msg['From'] = remitente
-    msg['To'] = destinatario
-    msg.set_content(cuerpo)
+# Valor de service_requests.acceptance_status para una solicitud aceptada.
+# Esta API no lo escribe: lo pone la app de especialistas al aceptar la
+# solicitud (en la base solo aparecen 'pendiente' y 'aceptado'). El índice
+# parcial service_requests_especialista_servicio_idx de sql/011 filtra por
+# el mismo literal; si cambia, hay que rehacer ese índice.
+SOLICITUD_ACEPTADA = "aceptado"
 
-    with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp:
-        smtp.login(remitente, password)
-        smtp.send_message(msg)
 
+class EspecialistaCercano(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    email: Optional[str]
+    address_text: Optional[str]
+    latitude: float
+    longitude: float
+    distancia_km: float
+
+
+@router.get("/especialistas/cercanos", response_model=List[EspecialistaCercano])
+def especialistas_cercanos(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    service_id: Optional[int] = Query(None, description="solo especialistas con solicitudes aceptadas de este servicio"),
+    radio_km: Optional[float] = Query(None, gt=0),
+    limit: int = Query(10, ge=1, le=100),
+    conn: PooledConnection = Depends(get_db)
+):
+    """Especialistas activos (rol 3) más cercanos a ``(lat, lon)``, con la distancia en km."""
+    try:
+        servicio = """
+              AND EXISTS (
+                  SELECT 1 FROM service_requests sr
+                  WHERE sr.specialist_id = a.user_id AND sr.service_id = %(servicio)s
+                    AND sr.acceptance_status = %(aceptada)s
+              )""" if service_id is not None else ""
+        radio = "WHERE d.km <= %(radio)s" if radio_km is not None else ""
+
+        cur = conn.cursor()
+        cur.execute(f"""
+            WITH candidatos AS (
+                SELECT a.user_id, a.address_text, a.latitude::float8 AS lat, a.longitude::float8 AS lon
+                FROM user_addresses a
+                JOIN users u ON u.id = a.user_id
+                -- a.especialista: índice parcial user_addresses_especialista_punto_idx (sql/011)
+                WHERE a.especialista AND a.latitude IS NOT NULL AND a.longitude IS NOT NULL
+                  AND u.role_id = 3 AND u.status {servicio}
+                ORDER BY point(a.longitude::float8, a.latitude::float8) <-> point(%(lon)s, %(lat)s)
+                LIMIT %(candidatos)s
+            ), distancias AS (
+                SELECT DISTINCT ON (c.user_id) c.*,
+                       2 * 6371 * asin(sqrt(
+                           power(sin(radians(c.lat - %(lat)s) / 2), 2)
+                           + cos(radians(%(lat)s)) * cos(radians(c.lat)) * power(sin(radians(c.lon - %(lon)s) / 2), 2)
+                       )) AS km
+                FROM candidatos c
+                ORDER BY c.user_id, km
+            )
+            SELECT d.user_id, u.first_name, u.last_name, u.email, d.address_text, d.lat, d.lon, d.km
+            FROM distancias d
+            JOIN users u ON u.id = d.user_id
+            {radio}
+            ORDER BY d.km, d.user_id
+            LIMIT %(limite)s
+        """, {"lat": lat, "lon": lon, "servicio": service_id, "aceptada": SOLICITUD_ACEPTADA,
+              "radio": radio_km, "limite": limit, "candidatos": limit * CERCANOS_SOBREMUESTREO})
+        rows = cur.fetchall()
+        cur.close()
 
-@app.put("/postulantes/aceptar/{user_id}")
-def aceptar_postulante(user_id: int):
+        return [{
+            "id": r[0],
+            "first_name": r[1],
+            "last_name": r[2],
+            "email": r[3],
+            "address_text": r[4],
+            "latitude": r[5],
+            "longitude": r[6],
+            "distancia_km": round(r[7], 3)
+        } for r in rows]
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def enviar_correo(cur, destinatario: str, asunto: str, cuerpo: str) -> int:
+    # Solo lo deja en email_outbox (misma transacción que ``cur``); el envío
+    # real lo hace correo.enviar_pendientes en segundo plano.
+    return correo.encolar(cur, destinatario, asunto, cuerpo)
+
+
+@router.put("/postulantes/aceptar/{user_id}")
+def aceptar_postulante(user_id: int, conn: PooledConnection = Depends(get_db)):
     try:
-        conn = get_pg_connection()
         cur = conn.cursor()
 
         # Obtener datos del usuario
@@ -640,9 +1424,8 @@ def aceptar_postulante(user_id: int):
             SET password = %s, role_id = 3 
             WHERE id = %s;
         """, (nueva_pass, user_id))
-        conn.commit()
 
-        # Enviar correo
+        # Encolar correo (se confirma junto con el cambio de rol)
         asunto = "Acceso como Especialista"
         cuerpo = f"""
 Hola {first_name} {last_name},
@@ -658,13 +1441,16 @@ Recuerda descargar la aplicacion desde google play.
 Saludos,
 Equipo Nexuserv
 """
-        enviar_correo(email, asunto, cuerpo)
+        correo_id = enviar_correo(cur, email, asunto, cuerpo)
+        conn.commit()
+        correo.avisar()
 
         cur.close()
-        conn.close()
 
-        return {"mensaje": "Postulante aceptado y correo enviado."}
+        return {"mensaje": "Postulante aceptado; el correo se enviará en segundo plano.", "correo_id": correo_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en el servidor: {str(e)}")
 
@@ -680,78 +1466,64 @@ class ServiceResponse(Service):
     id: int
 
 # Endpoint para crear un servicio
-@app.post("/services/", response_model=ServiceResponse)
-async def create_service(service: Service):
+@router.post("/services/", response_model=ServiceResponse)
+async def create_service(service: Service, conn: asyncpg.Connection = Depends(get_async_db)):
     try:
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        new_service = await conn.fetchrow("""
             INSERT INTO services (name, description, image_url)
-            VALUES (%s, %s, %s) RETURNING id, name, description, image_url;
-        """, (service.name, service.description, service.image_url))
-        new_service = cursor.fetchone()
-        conn.commit()
-        cursor.close()
-        conn.close()
+            VALUES ($1, $2, $3) RETURNING id, name, description, image_url;
+        """, service.name, service.description, service.image_url)
+        await catalogo_servicios.notificar_cambio(conn)
         return ServiceResponse(id=new_service[0], name=service.name, description=service.description, image_url=service.image_url)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear servicio: {e}")
 
 
 # Endpoint para obtener todos los servicios
-@app.get("/services/", response_model=List[ServiceResponse])
-async def get_services():
+@router.get("/services/", response_model=List[ServiceResponse])
+async def get_services(request: Request):
     try:
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, description, image_url FROM services")
-        services = cursor.fetchall()
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return [ServiceResponse(id=row[0], name=row[1], description=row[2], image_url=row[3]) for row in services]
+        cuerpo, etag = await catalogo_servicios.obtener()
+        cabeceras = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=cabeceras)
+        return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener servicios: {e}")
 
 
 # Endpoint para actualizar un servicio
-@app.put("/services/{service_id}", response_model=ServiceResponse)
-async def update_service(service_id: int, service: Service):
+@router.put("/services/{service_id}", response_model=ServiceResponse)
+async def update_service(service_id: int, service: Service, conn: asyncpg.Connection = Depends(get_async_db)):
     try:
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        updated_service = await conn.fetchrow("""
             UPDATE services
-            SET name = %s, description = %s, image_url = %s
-            WHERE id = %s RETURNING id, name, description, image_url;
-        """, (service.name, service.description, service.image_url, service_id))
-        updated_service = cursor.fetchone()
-        conn.commit()
-        cursor.close()
-        conn.close()
+            SET name = $1, description = $2, image_url = $3
+            WHERE id = $4 RETURNING id, name, description, image_url;
+        """, service.name, service.description, service.image_url, service_id)
         if updated_service:
+            await catalogo_servicios.notificar_cambio(conn)
             return ServiceResponse(id=updated_service[0], name=updated_service[1], description=updated_service[2], image_url=updated_service[3])
         else:
             raise HTTPException(status_code=404, detail="Servicio no encontrado")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar servicio: {e}")
 
 
 # Endpoint para eliminar un servicio
-@app.delete("/services/{service_id}", response_model=ServiceResponse)
-async def delete_service(service_id: int):
+@router.delete("/services/{service_id}", response_model=ServiceResponse)
+async def delete_service(service_id: int, conn: asyncpg.Connection = Depends(get_async_db)):
     try:
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM services WHERE id = %s RETURNING id, name, description, image_url;", (service_id,))
-        deleted_service = cursor.fetchone()
-        conn.commit()
-        cursor.close()
-        conn.close()
+        deleted_service = await conn.fetchrow("DELETE FROM services WHERE id = $1 RETURNING id, name, description, image_url;", service_id)
         if deleted_service:
+            await catalogo_servicios.notificar_cambio(conn)
             return ServiceResponse(id=deleted_service[0], name=deleted_service[1], description=deleted_service[2], image_url=deleted_service[3])
         else:
             raise HTTPException(status_code=404, detail="Servicio no encontrado")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar servicio: {e}")
 
@@ -761,28 +1533,161 @@ async def delete_service(service_id: int):
 
 # Pruebas de conexion para probar Api
 
-@app.get("/test-pg")
+@router.get("/test-pg")
 def test_pg():
+    # Diagnóstico: el checkout va dentro del try para informar también los
+    # fallos de conexión (no usa get_db, que respondería 503)
     try:
-        conn = get_pg_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT version();")
-        version = cur.fetchone()
-        cur.close()
-        conn.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT version();")
+            version = cur.fetchone()
+            cur.close()
         return {"pg_version": version[0]}
     except Exception as e:
         return {"error": f"PostgreSQL error: {str(e)}"}
     
 
-@app.get("/")
+@router.get("/admin/cache/analisis")
+def estadisticas_cache_analisis():
+    return cv_cache.estadisticas()
+
+
+@router.delete("/admin/cache/analisis")
+async def invalidar_cache_analisis(todas: bool = Query(False)):
+    """Borra los análisis de criterios anteriores; ``todas=true`` vacía la caché."""
+    borradas = await cv_cache.invalidar(todas)
+    return {"borradas": borradas, "version_prompt": cv_cache.VERSION_PROMPT}
+
+
+@router.get("/admin/cribado")
+def estadisticas_cribado():
+    """Rechazos locales, llamadas al LLM evitadas y concordancia con el LLM (este worker)."""
+    return cribado.estadisticas()
+
+
+@router.get("/admin/cache/servicios")
+def estadisticas_cache_servicios():
+    return catalogo_servicios.estadisticas()
+
+
+@router.get("/admin/catalogos")
+def ver_catalogos():
+    return catalogos.estadisticas()
+
+
+@router.post("/admin/catalogos/refrescar")
+async def refrescar_catalogos():
+    await catalogos.cargar()
+    return catalogos.estadisticas()
+
+
+@router.get("/admin/correos")
+async def resumen_correos():
+    return await correo.resumen()
+
+
+@router.get("/admin/correos/{correo_id}")
+async def estado_correo(correo_id: int):
+    estado = await correo.estado(correo_id)
+    if not estado:
+        raise HTTPException(status_code=404, detail="Correo no encontrado")
+    return estado
+
+
+@router.get("/admin/consultas")
+def estadisticas_consultas(
+    orden: str = Query("total", pattern="^(total|media|max|llamadas|lentas)$"),
+    limit: int = Query(50, ge=1, le=500),
+    motor: Optional[str] = Query(None, pattern="^(psycopg2|asyncpg)$"),
+):
+    """Consultas agregadas por huella (texto normalizado), de este worker."""
+    return consultas_lentas.estadisticas(orden, limit, motor)
+
+
+@router.get("/admin/consultas/{huella}")
+def detalle_consulta(huella: str):
+    """Acumulados de una huella y su último ``EXPLAIN (ANALYZE, BUFFERS)``, si se capturó."""
+    detalle = consultas_lentas.detalle(huella)
+    if not detalle:
+        raise HTTPException(status_code=404, detail="Consulta no encontrada")
+    return detalle
+
+
+@router.delete("/admin/consultas")
+def reiniciar_consultas():
+    return {"borradas": consultas_lentas.reiniciar()}
+
+
+def _gauges():
+    gauges = {f"nexu_pg_pool_{k}": v for k, v in pool.metrics().items()}
+    gauges.update({f"nexu_pg_async_pool_{k}": v for k, v in metricas_pool_async().items()})
+    gauges.update({f"nexu_cv_cache_{k}": v for k, v in cv_cache.contadores.items()})
+    gauges.update({f"nexu_cribado_{k}": v for k, v in cribado.contadores.items()})
+    gauges.update({f"nexu_sas_cache_{k}": v for k, v in blob_storage.sas_contadores.items()})
+    gauges.update({f"nexu_email_{k}": v for k, v in correo.contadores.items()})
+    gauges.update({f"nexu_sql_{k}": v for k, v in consultas_lentas.contadores.items()})
+    return gauges
+
+
+metricas.agregar_recolector(_gauges)
+
+
+@router.get("/metrics", include_in_schema=False)
+def exponer_metricas():
+    return Response(metricas.exponer(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/pool")
+def metricas_pool():
+    return {"sync": pool.metrics(), "async": metricas_pool_async()}
+
+
+@router.get("/")
 def root():
     return {"message": "¡Hola desde Azure!"}
 
-@app.get("/test-email")
-def test_email():
+@router.get("/test-email")
+def test_email(conn: PooledConnection = Depends(get_db)):
     try:
-        enviar_correo("jesusitolspro.19@gmail.com", "Prueba desde FastAPI", "¡Correo de prueba enviado!")
-        return {"message": "Correo enviado correctamente"}
+        cur = conn.cursor()
+        correo_id = enviar_correo(cur, "jesusitolspro.19@gmail.com", "Prueba desde FastAPI", "¡Correo de prueba enviado!")
+        conn.commit()
+        cur.close()
+        correo.avisar()
+        return {"message": "Correo encolado", "correo_id": correo_id}
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+# --- aplicación -----------------------------------------------------------
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    await iniciar_conexiones()
+    try:
+        yield
+    finally:
+        await cerrar_conexiones()
+
+
+def crear_app() -> FastAPI:
+    """Arma la aplicación: rutas, middlewares y ciclo de vida (pools,
+    clientes y tareas de fondo se crean una vez por worker al arrancar)."""
+    app = FastAPI(lifespan=ciclo_de_vida)
+    app.include_router(router)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=ORIGENES_CORS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
+    )
+    # El último agregado es el más externo: ``instrumentar`` mide todo
+    app.add_middleware(LimitarTamanoSubidas)
+    app.middleware("http")(instrumentar)
+    return app
+
+
+app = crear_app()
@@ -0,0 +1,353 @@
+"""Cola de trabajos por etapas respaldada por una tabla de PostgreSQL.
+
+Cada etapa tiene su propio grupo de workers (concurrencia acotada). Un
+worker reclama un trabajo con ``FOR UPDATE SKIP LOCKED``, ejecuta el
+handler de la etapa y, según el resultado, lo pasa a la siguiente etapa,
+lo reprograma con backoff o lo marca como fallido.
+
+Los handlers reciben el trabajo como ``dict`` (``id``, ``stage``,
+``attempts``, ``max_attempts``, ``payload``) y devuelven un ``dict`` que
+se mezcla en ``payload`` para las etapas siguientes. Si ese ``dict``
+incluye ``"_etapa"``, el trabajo se desvía a esa etapa en lugar de la
+siguiente de la lista.
+
+Las ``etapas_externas`` no tienen workers propios: las consume otro
+proceso (p. ej. el envío por lotes al LLM) con ``reclamar_varios``,
+``aparcar``, ``aparcados``, ``completar``, ``completar_varios`` y ``fallar``.
+"""
+import asyncio
+import json
+import random
+from uuid import UUID, uuid4
+
+from database_async import get_async_pool
+
+
+class JobQueue:
+    def __init__(self, tabla: str, etapas: list, handlers: dict, concurrencia: dict,
+                 max_intentos: int = 3, backoff_base: float = 2.0, lock_timeout: float = 600.0,
+                 etapas_externas: dict | None = None, retencion_archivos_fallidos: float = 72 * 3600):
+        self.tabla = tabla
+        self.etapas = etapas
+        self.etapas_externas = etapas_externas or {}
+        self.handlers = handlers
+        self.concurrencia = concurrencia
+        self.max_intentos = max_intentos
+        self.backoff_base = backoff_base
+        self.lock_timeout = lock_timeout
+        self.retencion_archivos_fallidos = retencion_archivos_fallidos
+        self._tareas = []
+        self._token = uuid4().hex  # locked_by de los trabajos reclamados por este proceso
+        self._avisos = {etapa: asyncio.Event() for etapa in etapas}
+
+    def _siguiente(self, etapa: str) -> str:
+        if etapa in self.etapas_externas:
+            return self.etapas_externas[etapa]
+        i = self.etapas.index(etapa)
+        return self.etapas[i + 1] if i + 1 < len(self.etapas) else "done"
+
+    # --- productor ----------------------------------------------------
+
+    async def encolar(self, payload: dict, job_id: UUID | None = None, archivo: bytes | None = None) -> UUID:
+        """Crea un trabajo; ``archivo`` se guarda aparte del payload (columna ``archivo``)."""
+        job_id = job_id or uuid4()
+        pool = await get_async_pool()
+        await pool.execute(
+            f"INSERT INTO {self.tabla} (id, stage, max_attempts, payload, archivo) VALUES ($1, $2, $3, $4::jsonb, $5)",
+            job_id, self.etapas[0], self.max_intentos, json.dumps(payload), archivo,
+        )
+        self._avisos[self.etapas[0]].set()
+        return job_id
+
+    async def encolar_varios(self, trabajos: list) -> list:
+        """Encola ``[(job_id, payload, archivo), ...]`` en un solo INSERT.
+
+        Los ids que ya existen se ignoran; devuelve los ids insertados.
+        """
+        if not trabajos:
+            return []
+        ids, payloads, archivos = zip(*trabajos)
+        pool = await get_async_pool()
+        filas = await pool.fetch(
+            f"""INSERT INTO {self.tabla} (id, stage, max_attempts, payload, archivo)
+                SELECT t.id, $4, $5, t.payload, t.archivo
+                FROM unnest($1::uuid[], $2::jsonb[], $3::bytea[]) AS t(id, payload, archivo)
+                ON CONFLICT (id) DO NOTHING
+                RETURNING id""",
+            list(ids), [json.dumps(p) for p in payloads], list(archivos), self.etapas[0], self.max_intentos,
+        )
+        self._avisos[self.etapas[0]].set()
+        return [fila["id"] for fila in filas]
+
+    async def obtener(self, job_id: UUID) -> dict | None:
+        pool = await get_async_pool()
+        row = await pool.fetchrow(
+            f"""SELECT id, stage, status, attempts, max_attempts, payload, error, created_at, updated_at
+                FROM {self.tabla} WHERE id = $1""",
+            job_id,
+        )
+        if not row:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    async def archivo(self, job_id: UUID) -> bytes | None:
+        pool = await get_async_pool()
+        return await pool.fetchval(f"SELECT archivo FROM {self.tabla} WHERE id = $1", job_id)
+
+    # --- consumidor ---------------------------------------------------
+
+    async def _reclamar(self, etapa: str) -> dict | None:
+        pool = await get_async_pool()
+        row = await pool.fetchrow(
+            f"""
+            UPDATE {self.tabla}
+            SET status = 'running', locked_at = now(), locked_by = $2, attempts = attempts + 1, updated_at = now()
+            WHERE id = (
+                SELECT id FROM {self.tabla}
+                WHERE status = 'pending' AND stage = $1 AND run_after <= now()
+                ORDER BY run_after
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, stage, attempts, max_attempts, payload
+            """,
+            etapa, self._token,
+        )
+        if not row:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    async def _avanzar(self, job: dict, salida: dict):
+        salida = dict(salida or {})
+        siguiente = salida.pop("_etapa", None) or self._siguiente(job["stage"])
+        pool = await get_async_pool()
+        await pool.execute(
+            f"""
+            UPDATE {self.tabla}
+            SET stage = $2, status = $3, attempts = 0, locked_at = NULL, error = NULL,
+                payload = payload || $4::jsonb, updated_at = now(),
+                archivo = CASE WHEN $3 = 'done' THEN NULL ELSE archivo END
+            WHERE id = $1
+            """,
+            job["id"], siguiente, "done" if siguiente == "done" else "pending", json.dumps(salida),
+        )
+        if siguiente in self._avisos:
+            self._avisos[siguiente].set()
+
+    async def _fallar(self, job: dict, error: Exception):
+        pool = await get_async_pool()
+        if job["attempts"] >= job["max_attempts"]:
+            await pool.execute(
+                f"""UPDATE {self.tabla}
+                    SET status = 'failed', locked_at = NULL, error = $2, updated_at = now()
+                    WHERE id = $1""",
+                job["id"], str(error),
+            )
+            return
+        espera = self.backoff_base * 2 ** (job["attempts"] - 1) * random.uniform(0.5, 1.5)
+        await pool.execute(
+            f"""UPDATE {self.tabla}
+                SET status = 'pending', locked_at = NULL, error = $2,
+                    run_after = now() + make_interval(secs => $3), updated_at = now()
+                WHERE id = $1""",
+            job["id"], str(error), espera,
+        )
+
+    # --- etapas externas -----------------------------------------------
+
+    async def reclamar_varios(self, etapa: str, limite: int) -> list:
+        pool = await get_async_pool()
+        rows = await pool.fetch(
+            f"""
+            UPDATE {self.tabla}
+            SET status = 'running', locked_at = now(), locked_by = $3, attempts = attempts + 1, updated_at = now()
+            WHERE id IN (
+                SELECT id FROM {self.tabla}
+                WHERE status = 'pending' AND stage = $1 AND run_after <= now()
+                ORDER BY run_after
+                FOR UPDATE SKIP LOCKED
+                LIMIT $2
+            )
+            RETURNING id, stage, attempts, max_attempts, payload
+            """,
+            etapa, limite, self._token,
+        )
+        jobs = [dict(row) for row in rows]
+        for job in jobs:
+            job["payload"] = json.loads(job["payload"])
+        return jobs
+
+    async def aparcar(self, jobs: list, datos: dict):
+        """Deja los trabajos en ``waiting`` (p. ej. mientras un lote externo termina)."""
+        pool = await get_async_pool()
+        await pool.execute(
+            f"""UPDATE {self.tabla}
+                SET status = 'waiting', locked_at = NULL, payload = payload || $2::jsonb, updated_at = now()
+                WHERE id = ANY($1::uuid[])""",
+            [job["id"] for job in jobs], json.dumps(datos),
+        )
+
+    async def aparcados(self, etapa: str) -> list:
+        pool = await get_async_pool()
+        rows = await pool.fetch(
+            f"""SELECT id, stage, attempts, max_attempts, payload
+                FROM {self.tabla} WHERE status = 'waiting' AND stage = $1""",
+            etapa,
+        )
+        jobs = [dict(row) for row in rows]
+        for job in jobs:
+            job["payload"] = json.loads(job["payload"])
+        return jobs
+
+    async def completar(self, job: dict, salida: dict):
+        await self._avanzar(job, salida)
+
+    async def completar_varios(self, jobs: list, salidas: list):
+        """Como ``completar`` para trabajos de una misma etapa, en un solo UPDATE."""
+        if not jobs:
+            return
+        siguiente = self._siguiente(jobs[0]["stage"])
+        pool = await get_async_pool()
+        await pool.execute(
+            f"""
+            UPDATE {self.tabla} j
+            SET stage = $3, status = $4, attempts = 0, locked_at = NULL, error = NULL,
+                payload = j.payload || t.salida, updated_at = now(),
+                archivo = CASE WHEN $4 = 'done' THEN NULL ELSE j.archivo END
+            FROM unnest($1::uuid[], $2::jsonb[]) AS t(id, salida)
+            WHERE j.id = t.id
+            """,
+            [job["id"] for job in jobs], [json.dumps(s) for s in salidas],
+            siguiente, "done" if siguiente == "done" else "pending",
+        )
+        if siguiente in self._avisos:
+            self._avisos[siguiente].set()
+
+    async def fallar(self, job: dict, error: Exception, reintentar: bool = True):
+        if not reintentar:
+            job = {**job, "attempts": job["max_attempts"]}
+        await self._fallar(job, error)
+
+    async def resumen(self, clave: str, valor: str, max_errores: int = 50) -> dict:
+        """Conteos por estado y etapa de los trabajos con ``payload[clave] = valor``.
+
+        ``clave`` la fija el código (no viene del cliente) y se interpola
+        tal cual para que el planner pueda usar un índice por expresión.
+        """
+        pool = await get_async_pool()
+        filtro = f"payload->>'{clave}' = $1"
+        filas = await pool.fetch(
+            f"""SELECT stage, status, COUNT(*) AS n,
+                       COUNT(*) FILTER (WHERE (payload->>'duplicada')::boolean) AS duplicadas
+                FROM {self.tabla} WHERE {filtro}
+                GROUP BY stage, status""",
+            valor,
+        )
+        errores = await pool.fetch(
+            f"""SELECT id, payload->>'archivo' AS archivo, error
+                FROM {self.tabla} WHERE {filtro} AND status = 'failed'
+                ORDER BY updated_at DESC LIMIT $2""",
+            valor, max_errores,
+        )
+        por_estado, por_etapa = {}, {}
+        for fila in filas:
+            por_estado[fila["status"]] = por_estado.get(fila["status"], 0) + fila["n"]
+            if fila["status"] not in ("done", "failed"):
+                por_etapa[fila["stage"]] = por_etapa.get(fila["stage"], 0) + fila["n"]
+        return {
+            "total": sum(por_estado.values()),
+            "por_estado": por_estado,
+            "por_etapa": por_etapa,
+            "duplicadas": sum(fila["duplicadas"] for fila in filas),
+            "errores": [dict(e) for e in errores],
+        }
+
+    async def _liberar_bloqueados(self):
+        """Devuelve a ``pending`` trabajos de workers que murieron a medias."""
+        pool = await get_async_pool()
+        await pool.execute(
+            f"""UPDATE {self.tabla} SET status = 'pending', locked_at = NULL, updated_at = now()
+                WHERE status = 'running' AND locked_at < now() - make_interval(secs => $1)""",
+            self.lock_timeout,
+        )
+
+    async def _worker(self, etapa: str):
+        aviso = self._avisos[etapa]
+        while True:
+            try:
+                job = await self._reclamar(etapa)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[COLA {self.tabla}] Error reclamando trabajo de '{etapa}': {e}")
+                job = None
+            if job is None:
+                aviso.clear()
+                try:
+                    await asyncio.wait_for(aviso.wait(), timeout=2.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                salida = await self.handlers[etapa](job)
+                await self._avanzar(job, salida)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[COLA {self.tabla}] Trabajo {job['id']} falló en '{etapa}' (intento {job['attempts']}): {e}")
+                try:
+                    await self._fallar(job, e)
+                except Exception as e2:
+                    # Queda en 'running'; _liberar_bloqueados lo recupera
+                    print(f"[COLA {self.tabla}] No se pudo registrar el fallo de {job['id']}: {e2}")
+
+    async def _purgar_archivos_fallidos(self):
+        """Borra el ``archivo`` de los trabajos fallidos hace más de
+        ``retencion_archivos_fallidos`` segundos (los terminados lo borran al
+        pasar a ``done``); mientras tanto queda para revisar el fallo."""
+        pool = await get_async_pool()
+        await pool.execute(
+            f"""UPDATE {self.tabla} SET archivo = NULL
+                WHERE status = 'failed' AND archivo IS NOT NULL
+                  AND updated_at < now() - make_interval(secs => $1)""",
+            self.retencion_archivos_fallidos,
+        )
+
+    async def _mantenimiento(self):
+        while True:
+            await asyncio.sleep(60)
+            try:
+                await self._liberar_bloqueados()
+                await self._purgar_archivos_fallidos()
+            except Exception as e:
+                print(f"[COLA {self.tabla}] Error en el mantenimiento de la cola: {e}")
+
+    def iniciar(self):
+        for etapa in self.etapas:
+            for _ in range(self.concurrencia.get(etapa, 1)):
+                self._tareas.append(asyncio.create_task(self._worker(etapa)))
+        self._tareas.append(asyncio.create_task(self._mantenimiento()))
+
+    async def detener(self):
+        """Detiene los workers y devuelve a ``pending`` (sin gastar el intento)
+        lo que este proceso tenía a medias, incluido lo reclamado con
+        ``reclamar_varios``, para que otro worker lo retome sin esperar a
+        ``lock_timeout``."""
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+        try:
+            pool = await get_async_pool()
+            await pool.execute(
+                f"""UPDATE {self.tabla}
+                    SET status = 'pending', locked_at = NULL, attempts = GREATEST(attempts - 1, 0), updated_at = now()
+                    WHERE locked_by = $1 AND status = 'running'""",
+                self._token,
+            )
+        except Exception as e:
+            print(f"[COLA {self.tabla}] No se pudieron liberar los trabajos en curso: {e}")
@@ -0,0 +1,231 @@
+"""Cliente asíncrono de OpenAI para el análisis de CVs.
+
+- Un semáforo global limita las llamadas simultáneas (``LLM_MAX_CONCURRENCY``).
+- Dos token buckets respetan los límites del proveedor por minuto
+  (``LLM_RPM`` peticiones y ``LLM_TPM`` tokens).
+- Timeouts por llamada (``LLM_TIMEOUT``) y reintentos con backoff
+  exponencial y jitter en 429/5xx/timeouts (``LLM_MAX_RETRIES``).
+- Modo lote: ``enviar_lote``/``recoger_lote`` usan la Batch API para
+  cribados masivos fuera de hora punta.
+
+``OPENAI_BASE_URL`` permite apuntar a un servidor local de pruebas
+(ver ``scripts/fake_llm_server.py``). El SDK de ``openai`` (casi un
+segundo de import) se carga con el cliente, en la primera llamada.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+
+import metricas
+
+MODELO = os.getenv("LLM_MODEL", "gpt-4o")
+MAX_TOKENS_RESPUESTA = 400
+
+PROMPT_CRITERIOS = """
+Este es el contenido de un currículum vitae de una persona que quiere postular a nuestra empresa:
+
+✅ CRITERIOS PARA SER APTO:
+- Profesión: Licenciada en Arquitectura
+- Experiencia: Al menos 5 años en proyectos residenciales y espacios públicos
+- Experiencia adicional: Asistente de proyecto en Urbanlab 3 años
+- Habilidades: Diseño arquitectónico y urbanismo, SketchUp, normativas, comunicación con clientes
+- Idioma: Inglés básico
+
+Analiza el siguiente CV textual y responde si corresponde exactamente a este perfil. Al no tener estas caracteristicas, marcalo como ❌ No apto.
+
+Resume brevemente los motivos (3-5 líneas). Al final responde SOLO con:
+
+✅ Apto  
+❌ No apto
+
+CV:
+"""
+
+
+# Identifica los criterios vigentes: cambia si se edita el prompt o el modelo,
+# lo que invalida los análisis cacheados (ver cv_cache.py).
+VERSION_PROMPT = os.getenv("LLM_PROMPT_VERSION") or hashlib.sha256(
+    f"{MODELO}\n{PROMPT_CRITERIOS}".encode("utf-8")
+).hexdigest()[:16]
+
+
+def construir_prompt(texto_cv: str) -> str:
+    return f"{PROMPT_CRITERIOS}{texto_cv}\n"
+
+
+def estimar_tokens(texto: str) -> int:
+    # Aproximación habitual: ~4 caracteres por token
+    return len(texto) // 4 + 1
+
+
+class TokenBucket:
+    """Token bucket asíncrono que se rellena ``por_minuto`` unidades por minuto."""
+
+    def __init__(self, por_minuto: int):
+        self.capacidad = float(por_minuto)
+        self.tokens = float(por_minuto)
+        self.tasa = por_minuto / 60.0
+        self.actualizado = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.actualizado) * self.tasa)
+        self.actualizado = ahora
+
+    async def adquirir(self, n: float = 1):
+        n = min(n, self.capacidad)
+        async with self._lock:
+            while True:
+                self._rellenar()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((n - self.tokens) / self.tasa)
+
+    def ajustar(self, diferencia: float):
+        """Corrige el saldo con el consumo real (puede quedar negativo)."""
+        self._rellenar()
+        self.tokens -= diferencia
+
+
+_cliente = None  # openai.AsyncOpenAI
+_semaforo = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY") or 8))
+_rpm = TokenBucket(int(os.getenv("LLM_RPM") or 500))
+_tpm = TokenBucket(int(os.getenv("LLM_TPM") or 30000))
+
+TIMEOUT = float(os.getenv("LLM_TIMEOUT") or 60)
+MAX_REINTENTOS = int(os.getenv("LLM_MAX_RETRIES") or 5)
+
+
+def get_cliente():
+    global _cliente
+    if _cliente is None:
+        from openai import AsyncOpenAI
+
+        _cliente = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            timeout=TIMEOUT,
+            max_retries=0,  # los reintentos se manejan aquí, con jitter
+        )
+    return _cliente
+
+
+async def cerrar_cliente():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.close()
+        _cliente = None
+
+
+def _reintentable(error: Exception) -> bool:
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+    if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def _espera(intento: int, error: Exception) -> float:
+    # Respetar Retry-After si el proveedor lo envía
+    respuesta = getattr(error, "response", None)
+    if respuesta is not None:
+        retry_after = respuesta.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, 1)
+            except ValueError:
+                pass
+    # Backoff exponencial con "full jitter"
+    return random.uniform(0, min(60.0, 2 ** intento))
+
+
+async def completar(prompt: str) -> str:
+    estimado = estimar_tokens(prompt) + MAX_TOKENS_RESPUESTA
+    for intento in range(MAX_REINTENTOS + 1):
+        await _rpm.adquirir(1)
+        await _tpm.adquirir(estimado)
+        try:
+            async with _semaforo:
+                with metricas.medir("llm", "chat"):
+                    respuesta = await get_cliente().chat.completions.create(
+                        model=MODELO,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0,
+                        max_tokens=MAX_TOKENS_RESPUESTA,
+                    )
+        except Exception as e:
+            if intento >= MAX_REINTENTOS or not _reintentable(e):
+                raise
+            await asyncio.sleep(_espera(intento, e))
+            continue
+
+        if respuesta.usage:
+            _tpm.ajustar(respuesta.usage.total_tokens - estimado)
+            metricas.llm_tokens.sumar(respuesta.usage.prompt_tokens, "prompt")
+            metricas.llm_tokens.sumar(respuesta.usage.completion_tokens, "completion")
+        return respuesta.choices[0].message.content
+
+
+async def analizar_con_gpt4o(texto_cv: str) -> str:
+    return await completar(construir_prompt(texto_cv))
+
+
+# --- Modo lote (Batch API) -------------------------------------------
+
+async def enviar_lote(items: list) -> str:
+    """Envía ``[(custom_id, texto_cv), ...]`` como un lote; devuelve el id del lote."""
+    lineas = []
+    for custom_id, texto_cv in items:
+        lineas.append(json.dumps({
+            "custom_id": str(custom_id),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": MODELO,
+                "messages": [{"role": "user", "content": construir_prompt(texto_cv)}],
+                "temperature": 0,
+                "max_tokens": MAX_TOKENS_RESPUESTA,
+            },
+        }, ensure_ascii=False))
+    cliente = get_cliente()
+    archivo = await cliente.files.create(
+        file=("lote.jsonl", "\n".join(lineas).encode("utf-8")),
+        purpose="batch",
+    )
+    lote = await cliente.batches.create(
+        input_file_id=archivo.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return lote.id
+
+
+async def recoger_lote(batch_id: str) -> dict | None:
+    """Resultados ``{custom_id: texto o Exception}`` si el lote terminó; ``None`` si sigue en curso."""
+    cliente = get_cliente()
+    lote = await cliente.batches.retrieve(batch_id)
+    if lote.status in ("validating", "in_progress", "finalizing"):
+        return None
+    if lote.status != "completed":
+        raise RuntimeError(f"El lote {batch_id} terminó con estado {lote.status}")
+
+    resultados = {}
+    for file_id in (lote.output_file_id, lote.error_file_id):
+        if not file_id:
+            continue
+        contenido = await cliente.files.content(file_id)
+        for linea in contenido.text.splitlines():
+            if not linea.strip():
+                continue
+            item = json.loads(linea)
+            respuesta = item.get("response") or {}
+            if respuesta.get("status_code") == 200:
+                resultados[item["custom_id"]] = respuesta["body"]["choices"][0]["message"]["content"]
+            else:
+                resultados[item["custom_id"]] = RuntimeError(str(item.get("error") or respuesta))
+    return resultados
@@ -0,0 +1,184 @@
+"""Métricas de rendimiento en formato Prometheus.
+
+Histogramas y contadores en memoria (por worker) que se exponen en
+``GET /metrics``. El middleware de ``index.py`` abre un contexto por
+petición; ``medir(componente)`` suma el tiempo de cada llamada a la
+petición en curso (si la hay) y a un histograma global, de modo que el
+trabajo de los workers de la cola también queda medido.
+
+Componentes: ``db`` (cursor de psycopg2 y query logger de asyncpg),
+``llm``, ``blob`` y ``pdf``. Con ``METRICS_SERVER_TIMING=1`` cada
+respuesta lleva además una cabecera ``Server-Timing`` con esos tiempos.
+
+No hay agregación entre procesos: con varios workers de gunicorn, cada uno
+expone sus propias series.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "0") == "1"
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+COMPONENTES = ("db", "llm", "blob", "pdf")
+
+_lock = threading.Lock()
+_peticion: contextvars.ContextVar = contextvars.ContextVar("metricas_peticion", default=None)
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple, buckets: tuple = BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series: dict = {}  # valores de etiquetas -> [conteos por bucket..., suma, total]
+
+    def observar(self, valor: float, *etiquetas):
+        with _lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [0] * (len(self.buckets) + 2)
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with _lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for valores, serie in series.items():
+            base = _etiquetas(self.etiquetas, valores)
+            for limite, n in zip(self.buckets, serie):
+                lineas.append(f'{self.nombre}_bucket{{{base}{"," if base else ""}le="{limite}"}} {n}')
+            lineas.append(f'{self.nombre}_bucket{{{base}{"," if base else ""}le="+Inf"}} {serie[-1]}')
+            lineas.append(f"{self.nombre}_sum{{{base}}} {serie[-2]}")
+            lineas.append(f"{self.nombre}_count{{{base}}} {serie[-1]}")
+        return lineas
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._series: dict = {}
+
+    def sumar(self, valor: float, *etiquetas):
+        with _lock:
+            self._series[etiquetas] = self._series.get(etiquetas, 0) + valor
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with _lock:
+            series = dict(self._series)
+        for valores, total in series.items():
+            lineas.append(f"{self.nombre}{{{_etiquetas(self.etiquetas, valores)}}} {total}")
+        return lineas
+
+
+def _etiquetas(nombres: tuple, valores: tuple) -> str:
+    return ",".join(f'{n}="{str(v)}"' for n, v in zip(nombres, valores))
+
+
+http_latencia = Histograma("nexu_http_request_duration_seconds", "Latencia de las peticiones HTTP",
+                           ("method", "route", "status"))
+http_db_tiempo = Histograma("nexu_http_request_db_seconds", "Tiempo en base de datos por petición",
+                            ("route",))
+http_db_consultas = Histograma("nexu_http_request_db_queries", "Consultas a base de datos por petición",
+                               ("route",), BUCKETS_CONSULTAS)
+componente_latencia = Histograma("nexu_component_duration_seconds",
+                                 "Duración de cada llamada a un componente (db, llm, blob, pdf)",
+                                 ("component", "operation"))
+llm_tokens = Contador("nexu_llm_tokens_total", "Tokens consumidos en el LLM", ("type",))
+errores = Contador("nexu_component_errors_total", "Llamadas a componentes que terminaron en error",
+                   ("component", "operation"))
+
+_metricas = [http_latencia, http_db_tiempo, http_db_consultas, componente_latencia, llm_tokens, errores]
+_recolectores = []  # funciones que devuelven {nombre: valor} de gauges
+
+
+# --- contexto por petición ------------------------------------------------
+
+def iniciar_peticion():
+    """Abre el acumulador de la petición actual; devuelve el token para cerrarlo."""
+    return _peticion.set({c: [0.0, 0] for c in COMPONENTES})
+
+
+def terminar_peticion(token) -> dict:
+    datos = _peticion.get()
+    _peticion.reset(token)
+    return datos
+
+
+def registrar(componente: str, operacion: str, segundos: float, error: bool = False):
+    componente_latencia.observar(segundos, componente, operacion)
+    if error:
+        errores.sumar(1, componente, operacion)
+    datos = _peticion.get()
+    if datos is not None:
+        datos[componente][0] += segundos
+        datos[componente][1] += 1
+
+
+@contextmanager
+def medir(componente: str, operacion: str = ""):
+    """Mide el bloque (sirve en código síncrono y dentro de corrutinas)."""
+    inicio = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        registrar(componente, operacion, time.perf_counter() - inicio, error)
+
+
+def observar_peticion(metodo: str, ruta: str, status: int, segundos: float, datos: dict):
+    http_latencia.observar(segundos, metodo, ruta, status)
+    http_db_tiempo.observar(datos["db"][0], ruta)
+    http_db_consultas.observar(datos["db"][1], ruta)
+
+
+def server_timing(total: float, datos: dict) -> str:
+    partes = [f'{c};dur={datos[c][0] * 1000:.1f};desc="{datos[c][1]} llamadas"'
+              for c in COMPONENTES if datos[c][1]]
+    partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+# --- hooks ----------------------------------------------------------------
+
+def query_logger_asyncpg(registro):
+    """Callback para ``asyncpg.Connection.add_query_logger``."""
+    # El reset que hace el pool al devolver la conexión no es una consulta de la app
+    if registro.query.endswith("RESET ALL;"):
+        return
+    registrar("db", "asyncpg", registro.elapsed, registro.exception is not None)
+
+
+def agregar_recolector(funcion):
+    """``funcion()`` devuelve ``{nombre_gauge: valor}`` al exponer /metrics."""
+    _recolectores.append(funcion)
+
+
+def exponer() -> str:
+    lineas = []
+    for metrica in _metricas:
+        lineas.extend(metrica.exponer())
+    for funcion in _recolectores:
+        try:
+            valores = funcion()
+        except Exception as e:
+            print(f"[METRICAS] {e}")
+            continue
+        for nombre, valor in valores.items():
+            lineas.append(f"# TYPE {nombre} gauge")
+            lineas.append(f"{nombre} {valor}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,112 @@
+"""Utilidades de paginación por cursor y exportación en streaming.
+
+Los cursores son opacos para el cliente: codifican en base64 los valores
+de las columnas de orden de la última fila entregada.
+
+``exportar`` recorre la consulta con un cursor de servidor (named cursor
+de psycopg2) sobre la conexión del request, de modo que una exportación
+completa usa memoria constante sin importar cuántas filas tenga y no
+ocupa una segunda conexión del pool.
+"""
+import base64
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+FILAS_POR_LOTE = 2000
+
+
+def codificar_cursor(*valores) -> str:
+    crudo = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in valores])
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor: str) -> list:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def filtro_keyset(columna_fecha: str, columna_id: str, cursor: str):
+    """Condición ``WHERE`` para la página siguiente en un listado ordenado por
+    ``columna_fecha DESC NULLS LAST, columna_id DESC``."""
+    try:
+        fecha, ultimo_id = decodificar_cursor(cursor)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if fecha is None:
+        return f"({columna_fecha} IS NULL AND {columna_id} < %s)", [ultimo_id]
+    return (
+        f"""({columna_fecha} < %s::timestamptz
+                 OR ({columna_fecha} = %s::timestamptz AND {columna_id} < %s)
+                 OR {columna_fecha} IS NULL)""",
+        [fecha, fecha, ultimo_id],
+    )
+
+
+def _valor(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return float(v)
+    return v
+
+
+def _filas(cur, primeras: list):
+    try:
+        yield from primeras
+        yield from cur
+    finally:
+        cur.close()
+
+
+def _ndjson(filas, columnas):
+    for fila in filas:
+        yield json.dumps(dict(zip(columnas, map(_valor, fila))), ensure_ascii=False) + "\n"
+
+
+def _csv(filas, columnas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for i, fila in enumerate(filas, 1):
+        escritor.writerow(map(_valor, fila))
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def exportar(conn, query: str, params, columnas: list, formato: str, nombre: str) -> StreamingResponse:
+    """Respuesta en streaming (``ndjson`` o ``csv``) para ``query``.
+
+    Usa la conexión del request (``get_db``), que FastAPI devuelve al pool
+    recién al terminar de enviar la respuesta. La consulta se declara y se
+    lee el primer lote antes de empezar a responder: si falla, el handler
+    responde con un error en lugar de un 200 truncado.
+    """
+    if formato not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Formato no soportado (use ndjson o csv)")
+    cur = conn.cursor(name=f"export_{nombre}")
+    cur.itersize = FILAS_POR_LOTE
+    try:
+        cur.execute(query, params)
+        primeras = cur.fetchmany(FILAS_POR_LOTE)
+    except Exception:
+        cur.close()
+        raise
+    filas = _filas(cur, primeras)
+    if formato == "ndjson":
+        return StreamingResponse(_ndjson(filas, columnas), media_type="application/x-ndjson")
+    return StreamingResponse(
+        _csv(filas, columnas),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.csv"'},
+    )
@@ -0,0 +1,155 @@
+"""Extracción de texto de CVs en PDF con presupuesto de páginas y caracteres.
+
+- Solo se leen las primeras ``PDF_MAX_PAGES`` páginas y el texto se corta
+  en ``PDF_MAX_CHARS`` caracteres (lo que de verdad se envía al LLM).
+- Las páginas se juntan con ``"\\n".join`` en lugar de concatenar en bucle.
+- Se eliminan marcadores de página ("Pág. 2", "2 de 5"), líneas duplicadas
+  consecutivas y espacios sobrantes. En documentos de ``PDF_MIN_PAGES_HEADERS``
+  páginas o más, una línea que aparece en los bordes (primeras o últimas
+  ``PDF_HEADER_LINES`` líneas) de la mayoría de las páginas es un
+  encabezado/pie: se conserva su primera aparición y se quitan las demás de
+  los bordes. El cuerpo de las páginas nunca se toca.
+- Los documentos grandes se extraen en paralelo en un pool de procesos,
+  por rangos de páginas; ``extraer_texto_async`` nunca bloquea el event loop.
+- PyMuPDF se importa en el primer PDF (``_fitz``), no al cargar el módulo.
+"""
+import asyncio
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import metricas
+
+MAX_PAGINAS = int(os.getenv("PDF_MAX_PAGES") or 20)
+MAX_CARACTERES = int(os.getenv("PDF_MAX_CHARS") or 20000)
+MIN_PAGINAS_PARALELO = int(os.getenv("PDF_PARALLEL_MIN_PAGES") or 16)
+WORKERS = int(os.getenv("PDF_WORKERS") or min(4, os.cpu_count() or 1))
+
+_ESPACIOS = re.compile(r"[ \t ]+")
+MIN_PAGINAS_ENCABEZADOS = int(os.getenv("PDF_MIN_PAGES_HEADERS") or 3)
+LINEAS_BORDE = int(os.getenv("PDF_HEADER_LINES") or 3)
+
+# Solo marcadores explícitos y números chicos: "2015" o "2018 / 2020" son
+# fechas que el LLM necesita para contar años de experiencia
+_NUMERO_PAGINA = re.compile(
+    r"^(?:(?:p[aá]g(?:ina)?\.?|page)\s*\d{1,3}(?:\s*(?:de|of|/)\s*\d{1,3})?|\d{1,3}\s+(?:de|of)\s+\d{1,3})$",
+    re.IGNORECASE,
+)
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _fitz():
+    import fitz  # PyMuPDF
+
+    return fitz
+
+
+def _paginas(datos: bytes, inicio: int, fin: int) -> list:
+    """Texto crudo de las páginas ``[inicio, fin)``. Corre en otro proceso."""
+    with _fitz().open(stream=datos, filetype="pdf") as doc:
+        return [doc[i].get_text() for i in range(inicio, fin)]
+
+
+def _lineas(pagina: str) -> list:
+    lineas = []
+    for linea in pagina.splitlines():
+        linea = _ESPACIOS.sub(" ", linea).strip()
+        if linea and not _NUMERO_PAGINA.match(linea):
+            lineas.append(linea)
+    return lineas
+
+
+def _borde(n: int) -> set:
+    """Posiciones de las primeras y últimas líneas de una página de ``n``
+    (``LINEAS_BORDE``, y nunca más de un cuarto de la página por lado)."""
+    k = min(LINEAS_BORDE, n // 4)
+    return set(range(k)) | set(range(n - k, n))
+
+
+def limpiar(paginas: list, max_caracteres: int = MAX_CARACTERES) -> str:
+    """Normaliza, quita encabezados/pies repetidos y aplica el presupuesto."""
+    paginas = [_lineas(p) for p in paginas]
+
+    # Encabezado o pie: en el borde de la mayoría de las páginas (y de al
+    # menos MIN_PAGINAS_ENCABEZADOS). Con menos páginas no se distingue de
+    # contenido que se repite (nombre, profesión, herramientas).
+    repetidas = set()
+    if len(paginas) >= MIN_PAGINAS_ENCABEZADOS:
+        apariciones = Counter(
+            linea for lineas in paginas for linea in {lineas[i] for i in _borde(len(lineas))}
+        )
+        umbral = max(MIN_PAGINAS_ENCABEZADOS, len(paginas) // 2 + 1)
+        repetidas = {linea for linea, n in apariciones.items() if n >= umbral}
+
+    salida = []
+    total = 0
+    anterior = None
+    vistas = set()
+    for lineas in paginas:
+        borde = _borde(len(lineas)) if repetidas else ()
+        for i, linea in enumerate(lineas):
+            if i in borde and linea in repetidas:
+                if linea in vistas:
+                    continue
+                vistas.add(linea)
+            if linea == anterior:
+                continue
+            anterior = linea
+            salida.append(linea)
+            total += len(linea) + 1
+            if total >= max_caracteres:
+                return "\n".join(salida)[:max_caracteres]
+    return "\n".join(salida)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=WORKERS)
+    return _pool
+
+
+def cerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def contar_paginas(datos: bytes) -> int:
+    with _fitz().open(stream=datos, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def _extraer_local(datos: bytes, max_paginas: int, permitir_paralelo: bool):
+    """Abre el PDF una sola vez: devuelve ``(n, paginas)``, o ``(n, None)``
+    si conviene repartir la extracción en el pool de procesos."""
+    with _fitz().open(stream=datos, filetype="pdf") as doc:
+        n = min(doc.page_count, max_paginas)
+        if permitir_paralelo and n >= MIN_PAGINAS_PARALELO and WORKERS > 1:
+            return n, None
+        return n, [doc[i].get_text() for i in range(n)]
+
+
+def extraer_texto(datos: bytes, max_paginas: int = MAX_PAGINAS, max_caracteres: int = MAX_CARACTERES) -> str:
+    """Extracción síncrona en el proceso actual."""
+    with metricas.medir("pdf", "extract"):
+        _, paginas = _extraer_local(datos, max_paginas, permitir_paralelo=False)
+        return limpiar(paginas, max_caracteres)
+
+
+async def extraer_texto_async(datos: bytes, max_paginas: int = MAX_PAGINAS,
+                              max_caracteres: int = MAX_CARACTERES) -> str:
+    with metricas.medir("pdf", "extract"):
+        n, paginas = await asyncio.to_thread(_extraer_local, datos, max_paginas, True)
+        if paginas is None:
+            loop = asyncio.get_running_loop()
+            tramo = -(-n // WORKERS)
+            partes = await asyncio.gather(*(
+                loop.run_in_executor(_get_pool(), _paginas, datos, inicio, min(inicio + tramo, n))
+                for inicio in range(0, n, tramo)
+            ))
+            paginas = [pagina for parte in partes for pagina in parte]
+        return await asyncio.to_thread(limpiar, paginas, max_caracteres)
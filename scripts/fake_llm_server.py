@@ -0,0 +1,117 @@
+"""Servidor local que imita la API de OpenAI para pruebas sin coste.
+
+Implementa ``/v1/chat/completions`` y lo mínimo de ``/v1/files`` y
+``/v1/batches`` para el modo lote. La respuesta es determinista: "Apto"
+si el CV menciona arquitectura y SketchUp, "No apto" en otro caso.
+
+Uso::
+
+    uvicorn scripts.fake_llm_server:app --port 8099
+    OPENAI_BASE_URL=http://localhost:8099/v1 OPENAI_API_KEY=fake uvicorn index:app
+
+Variables opcionales: ``FAKE_LLM_LATENCY`` (segundos por respuesta) y
+``FAKE_LLM_ERROR_RATE`` (fracción de peticiones que responden 429).
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from uuid import uuid4
+
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+app = FastAPI()
+
+LATENCIA = float(os.getenv("FAKE_LLM_LATENCY") or 0.2)
+TASA_ERROR = float(os.getenv("FAKE_LLM_ERROR_RATE") or 0)
+
+_archivos = {}
+_lotes = {}
+
+
+def _responder(body: dict) -> dict:
+    prompt = body["messages"][-1]["content"]
+    cv = prompt.split("CV:", 1)[-1].lower()
+    apto = "arquitect" in cv and "sketchup" in cv
+    contenido = (
+        "Análisis simulado del CV.\n\n"
+        + ("✅ Apto" if apto else "❌ No apto")
+    )
+    tokens_prompt = len(prompt) // 4
+    return {
+        "id": f"chatcmpl-{uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": contenido},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": tokens_prompt,
+            "completion_tokens": 20,
+            "total_tokens": tokens_prompt + 20,
+        },
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    if random.random() < TASA_ERROR:
+        return JSONResponse(
+            {"error": {"message": "Rate limit simulado", "type": "rate_limit_error"}},
+            status_code=429,
+            headers={"retry-after": "1"},
+        )
+    await asyncio.sleep(LATENCIA)
+    return _responder(await request.json())
+
+
+@app.post("/v1/files")
+async def subir_archivo(file: UploadFile = File(...), purpose: str = Form(...)):
+    file_id = f"file-{uuid4().hex}"
+    _archivos[file_id] = await file.read()
+    return {"id": file_id, "object": "file", "bytes": len(_archivos[file_id]),
+            "created_at": int(time.time()), "filename": file.filename, "purpose": purpose,
+            "status": "processed"}
+
+
+@app.get("/v1/files/{file_id}/content")
+async def contenido_archivo(file_id: str):
+    return PlainTextResponse(_archivos[file_id].decode("utf-8"))
+
+
+def _lote_json(batch_id: str) -> dict:
+    return _lotes[batch_id]
+
+
+@app.post("/v1/batches")
+async def crear_lote(request: Request):
+    body = await request.json()
+    salida = []
+    for linea in _archivos[body["input_file_id"]].decode("utf-8").splitlines():
+        item = json.loads(linea)
+        salida.append(json.dumps({
+            "id": f"batch_req_{uuid4().hex}",
+            "custom_id": item["custom_id"],
+            "response": {"status_code": 200, "body": _responder(item["body"])},
+            "error": None,
+        }, ensure_ascii=False))
+    output_id = f"file-{uuid4().hex}"
+    _archivos[output_id] = "\n".join(salida).encode("utf-8")
+    batch_id = f"batch_{uuid4().hex}"
+    _lotes[batch_id] = {
+        "id": batch_id, "object": "batch", "endpoint": body["endpoint"],
+        "input_file_id": body["input_file_id"], "completion_window": body["completion_window"],
+        "status": "completed", "output_file_id": output_id, "error_file_id": None,
+        "created_at": int(time.time()),
+    }
+    return _lote_json(batch_id)
+
+
+@app.get("/v1/batches/{batch_id}")
+async def obtener_lote(batch_id: str):
+    return _lote_json(batch_id)
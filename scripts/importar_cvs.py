@@ -0,0 +1,123 @@
+"""Importa una carpeta (o un zip) de CVs por el pipeline de postulaciones.
+
+Usa la misma cola ``cv_jobs`` y las mismas etapas que ``POST /postulaciones``,
+corriendo los workers en este proceso (los de la API, si están arriba,
+también ayudan). Con ``--modo lote``, los envíos a la Batch API los hace el
+servidor (``LLM_BATCH_ENABLED=1``); este proceso no envía correos ni
+escucha cambios del catálogo. Muestra el progreso hasta que todos los CVs
+terminan::
+
+    python scripts/importar_cvs.py feria/ --manifiesto feria/datos.csv
+    python scripts/importar_cvs.py feria.zip --concurrencia 8 --modo lote
+
+Si se interrumpe, volver a lanzar el mismo comando reanuda: el id de la
+importación se guarda junto a los CVs (``.importacion``) y los trabajos ya
+encolados no se repiten.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+from uuid import UUID, uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("origen", help="carpeta con PDFs o archivo .zip")
+    parser.add_argument("--manifiesto", help="CSV con archivo,nombres,apellidos,correo,celular,dni,fecha_nacimiento")
+    parser.add_argument("--importacion", type=UUID, help="id de una importación previa a reanudar")
+    parser.add_argument("--concurrencia", type=int, default=4, help="CVs extraídos/analizados a la vez")
+    parser.add_argument("--modo", choices=["inmediato", "lote"], default="inmediato")
+    parser.add_argument("--intervalo", type=float, default=2.0, help="segundos entre reportes de progreso")
+    return parser.parse_args()
+
+
+def archivo_estado(origen: str) -> str:
+    if os.path.isdir(origen):
+        return os.path.join(origen, ".importacion")
+    return origen + ".importacion"
+
+
+def leer_id(args) -> UUID:
+    if args.importacion:
+        return args.importacion
+    ruta = archivo_estado(args.origen)
+    if os.path.exists(ruta):
+        with open(ruta) as f:
+            return UUID(f.read().strip())
+    importacion_id = uuid4()
+    with open(ruta, "w") as f:
+        f.write(str(importacion_id))
+    return importacion_id
+
+
+def recorrer(origen: str, max_bytes: int):
+    from importacion import archivos_zip, validar_pdf
+
+    if os.path.isdir(origen):
+        for ruta in sorted(glob.glob(os.path.join(origen, "**", "*.pdf"), recursive=True)):
+            with open(ruta, "rb") as f:
+                datos = f.read(max_bytes + 1)
+            yield os.path.basename(ruta), validar_pdf(ruta, datos, max_bytes) or datos
+    else:
+        with open(origen, "rb") as f:
+            yield from archivos_zip(f, max_bytes)
+
+
+async def main():
+    args = parsear_argumentos()
+    # La concurrencia de las etapas se lee al importar index
+    for etapa in ("EXTRACT", "ANALYZE"):
+        os.environ[f"CV_JOBS_{etapa}_WORKERS"] = str(args.concurrencia)
+
+    import importacion
+    import index
+
+    importacion_id = leer_id(args)
+    manifiesto = {}
+    if args.manifiesto:
+        with open(args.manifiesto, "rb") as f:
+            manifiesto = importacion.leer_manifiesto(f.read())
+
+    # Solo pools y workers: el correo, el LISTEN de servicios y los lotes del
+    # LLM quedan a cargo del servidor
+    await index.iniciar_pipeline()
+    try:
+        encolados, existentes, tanda = 0, 0, []
+        for nombre, datos in recorrer(args.origen, index.CV_MAX_BYTES):
+            if isinstance(datos, str):
+                print(f"  rechazado {nombre}: {datos}")
+                continue
+            tanda.append(importacion.trabajo(importacion_id, nombre, datos, manifiesto, args.modo))
+            if len(tanda) >= importacion.TAMANO_TANDA:
+                nuevos = await index.cola_postulaciones.encolar_varios(tanda)
+                encolados, existentes = encolados + len(nuevos), existentes + len(tanda) - len(nuevos)
+                tanda = []
+        nuevos = await index.cola_postulaciones.encolar_varios(tanda)
+        encolados, existentes = encolados + len(nuevos), existentes + len(tanda) - len(nuevos)
+        print(f"Importación {importacion_id}: {encolados} encolados, {existentes} ya estaban")
+
+        inicio = time.monotonic()
+        while True:
+            resumen = await index.cola_postulaciones.resumen("importacion", str(importacion_id))
+            estados = resumen["por_estado"]
+            hechos, fallidos = estados.get("done", 0), estados.get("failed", 0)
+            etapas = ", ".join(f"{e}={n}" for e, n in sorted(resumen["por_etapa"].items()))
+            print(f"[{time.monotonic() - inicio:6.0f}s] {hechos + fallidos}/{resumen['total']} "
+                  f"(ok={hechos}, fallidos={fallidos}, duplicados={resumen['duplicadas']}) {etapas}", flush=True)
+            if hechos + fallidos >= resumen["total"]:
+                break
+            await asyncio.sleep(args.intervalo)
+
+        for error in resumen["errores"]:
+            print(f"  falló {error['archivo']}: {error['error']}")
+    finally:
+        await index.cerrar_conexiones()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""Aplica los scripts pendientes de ``sql/`` (paso del despliegue).
+
+Las versiones aplicadas quedan en ``schema_migrations``; los índices sobre
+tablas con tráfico se crean con ``CONCURRENTLY``, así que se puede correr
+con la API en línea. Termina con código 1 si un script falla::
+
+    python scripts/migrar.py
+    python scripts/migrar.py --estado
+
+En App Service puede ir en el comando de inicio, antes de gunicorn
+(``python scripts/migrar.py && gunicorn ...``): si falla, la app no arranca
+sobre un esquema a medio migrar.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database_async import (MigracionFallida, aplicar_migraciones, cerrar_pool_async,  # noqa: E402
+                            estado_migraciones)
+
+
+async def main(args) -> int:
+    try:
+        if args.estado:
+            for nombre, aplicada, modificada in await estado_migraciones():
+                marca = "aplicada" if aplicada else "pendiente"
+                print(f"{nombre:45} {marca}{' (modificada después de aplicarse)' if modificada else ''}")
+            return 0
+        aplicadas = await aplicar_migraciones()
+        print(f"{len(aplicadas)} migraciones aplicadas" if aplicadas else "Sin migraciones pendientes")
+        return 0
+    except MigracionFallida as e:
+        print(f"[MIGRACION] Falló {e}")
+        return 1
+    finally:
+        await cerrar_pool_async()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--estado", action="store_true", help="listar las migraciones aplicadas y pendientes")
+    sys.exit(asyncio.run(main(parser.parse_args())))
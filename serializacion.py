@@ -0,0 +1,59 @@
+"""Serialización rápida de listados grandes.
+
+Por defecto los listados devuelven dicts y FastAPI los valida contra el
+``response_model`` y los codifica con el encoder estándar; con miles de
+filas eso se come la CPU de la petición. Con ``FAST_JSON=1``,
+``/cvs/apto``, ``/cvs/estado/{estado}`` y ``/admin/pagos`` arman el JSON
+directamente de las tuplas del cursor con ``orjson`` y devuelven los
+bytes sin pasar por la validación. ``/services/`` ya devuelve bytes
+cacheados; su caché se codifica con ``dumps``.
+
+El esquema no cambia: las claves salen de los campos del modelo, en el
+mismo orden que las columnas del ``SELECT``; ``datetime`` se escribe en
+ISO 8601 igual que ``isoformat()`` y ``Decimal`` como número. Si
+``orjson`` no está instalado se usa ``json`` de la librería estándar.
+"""
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RAPIDO = os.getenv("FAST_JSON", "0") == "1"
+
+if RAPIDO and orjson is None:
+    print("[JSON] FAST_JSON=1 pero orjson no está instalado; se usa json estándar")
+
+
+def _convertir(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} no es serializable a JSON")
+
+
+def dumps(datos) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(datos, default=_convertir)
+    return json.dumps(datos, ensure_ascii=False, default=_convertir, separators=(",", ":")).encode("utf-8")
+
+
+def campos(modelo) -> tuple:
+    """Nombres de los campos de un modelo pydantic, en orden de declaración."""
+    return tuple(modelo.model_fields)
+
+
+def filas_json(columnas: tuple, filas) -> bytes:
+    """Lista de objetos JSON desde tuplas ``(col1, col2, ...)`` del cursor."""
+    return dumps([dict(zip(columnas, fila)) for fila in filas])
+
+
+def respuesta_filas(columnas: tuple, filas, headers: dict | None = None) -> Response:
+    return Response(content=filas_json(columnas, filas), media_type="application/json", headers=headers)
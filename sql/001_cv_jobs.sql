@@ -0,0 +1,19 @@
+-- Cola de trabajos para el procesamiento de CVs (POST /postulaciones).
+-- Cada trabajo avanza por etapas: extract -> analyze -> persist -> done.
+CREATE TABLE IF NOT EXISTS cv_jobs (
+    id           UUID PRIMARY KEY,
+    stage        TEXT        NOT NULL DEFAULT 'extract',
+    status       TEXT        NOT NULL DEFAULT 'pending',   -- pending | running | done | failed
+    attempts     INT         NOT NULL DEFAULT 0,
+    max_attempts INT         NOT NULL DEFAULT 3,
+    run_after    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    locked_at    TIMESTAMPTZ,
+    payload      JSONB       NOT NULL DEFAULT '{}'::jsonb,
+    error        TEXT,
+    created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS cv_jobs_pendientes_idx
+    ON cv_jobs (stage, run_after)
+    WHERE status = 'pending';
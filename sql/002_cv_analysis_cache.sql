@@ -0,0 +1,11 @@
+-- Caché de análisis de CVs por contenido: hash del texto extraído + versión
+-- de los criterios del prompt. Ver cv_cache.py.
+CREATE TABLE IF NOT EXISTS cv_analysis_cache (
+    text_hash      TEXT        NOT NULL,
+    prompt_version TEXT        NOT NULL,
+    resultado      TEXT        NOT NULL,
+    hits           INT         NOT NULL DEFAULT 0,
+    created_at     TIMESTAMPTZ NOT NULL DEFAULT now(),
+    last_hit_at    TIMESTAMPTZ,
+    PRIMARY KEY (text_hash, prompt_version)
+);
@@ -0,0 +1,3 @@
+-- El CV subido se guarda en la propia cola (sin archivos temporales en disco).
+-- Se vacía cuando el trabajo termina.
+ALTER TABLE cv_jobs ADD COLUMN IF NOT EXISTS archivo BYTEA;
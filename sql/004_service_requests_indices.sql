@@ -0,0 +1,25 @@
+-- sin transacción (índices CONCURRENTLY: ver database_async.aplicar_migraciones)
+-- Índices para los listados paginados de service_requests
+-- (/admin/solicitudes y /service-requests/detalles).
+--
+-- Las consultas ordenan por requested_at DESC NULLS LAST, id DESC; un
+-- índice con requested_at DESC (NULLS FIRST) no sirve ese orden en ningún
+-- sentido, así que las columnas se declaran igual que el ORDER BY.
+--
+-- Filtro por estado + orden por fecha: cubre
+--   WHERE status = ? [AND acceptance_status = ?] ORDER BY requested_at DESC NULLS LAST, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS service_requests_status_fecha_nl_idx
+    ON service_requests (status, acceptance_status, requested_at DESC NULLS LAST, id DESC);
+
+-- Solo acceptance_status (sin status) + orden por fecha
+CREATE INDEX CONCURRENTLY IF NOT EXISTS service_requests_aceptacion_fecha_nl_idx
+    ON service_requests (acceptance_status, requested_at DESC NULLS LAST, id DESC);
+
+-- Listado sin filtros de estado, rangos de fechas y cursor por (requested_at, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS service_requests_fecha_nl_idx
+    ON service_requests (requested_at DESC NULLS LAST, id DESC);
+
+-- Versiones anteriores (NULLS FIRST), que ninguna consulta usa
+DROP INDEX CONCURRENTLY IF EXISTS service_requests_status_fecha_idx;
+DROP INDEX CONCURRENTLY IF EXISTS service_requests_aceptacion_fecha_idx;
+DROP INDEX CONCURRENTLY IF EXISTS service_requests_fecha_idx;
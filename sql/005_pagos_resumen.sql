@@ -0,0 +1,25 @@
+-- sin transacción (índices CONCURRENTLY: ver database_async.aplicar_migraciones)
+-- Listado paginado de /admin/pagos: orden por (created_at DESC NULLS LAST, id
+-- DESC), declarado igual en los índices para que sirvan ese orden sin Sort
+CREATE INDEX CONCURRENTLY IF NOT EXISTS payments_fecha_nl_idx
+    ON payments (created_at DESC NULLS LAST, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS payments_estado_fecha_nl_idx
+    ON payments (status, created_at DESC NULLS LAST, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS payments_especialista_fecha_nl_idx
+    ON payments (specialist_id, created_at DESC NULLS LAST, id DESC);
+
+-- Versiones anteriores (created_at DESC = NULLS FIRST), que ninguna consulta usa
+DROP INDEX CONCURRENTLY IF EXISTS payments_fecha_idx;
+DROP INDEX CONCURRENTLY IF EXISTS payments_estado_fecha_idx;
+DROP INDEX CONCURRENTLY IF EXISTS payments_especialista_fecha_idx;
+
+-- Agregados por especialista y estado para /admin/pagos/resumen?fuente=vista.
+-- Se actualiza con POST /admin/pagos/resumen/refrescar
+-- (REFRESH ... CONCURRENTLY, que requiere el índice único).
+CREATE MATERIALIZED VIEW IF NOT EXISTS pagos_resumen_especialista AS
+    SELECT specialist_id, status, COUNT(*) AS pagos, SUM(amount) AS monto
+    FROM payments
+    GROUP BY specialist_id, status;
+
+CREATE UNIQUE INDEX IF NOT EXISTS pagos_resumen_especialista_uq
+    ON pagos_resumen_especialista (specialist_id, status);
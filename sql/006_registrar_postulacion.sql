@@ -0,0 +1,44 @@
+-- Idempotencia de postulaciones: un mismo correo con el mismo archivo
+-- (SHA-256 del PDF) solo crea un usuario y un CV, aunque el cliente reintente.
+CREATE TABLE IF NOT EXISTS cv_postulaciones (
+    email       TEXT NOT NULL,
+    file_hash   TEXT NOT NULL,
+    user_id     INTEGER,
+    cv_id       INTEGER,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (email, file_hash)
+);
+
+-- Registra usuario + CV en un solo viaje de ida y vuelta.
+-- Un segundo llamado concurrente con la misma clave espera en el INSERT de
+-- cv_postulaciones hasta que el primero confirma, y devuelve sus ids.
+CREATE OR REPLACE FUNCTION registrar_postulacion(
+    p_email TEXT, p_file_hash TEXT, p_nombres TEXT, p_apellidos TEXT,
+    p_file_path TEXT, p_status_id INTEGER, p_resultado TEXT,
+    OUT usuario INTEGER, OUT cv INTEGER, OUT nuevo BOOLEAN
+) LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO cv_postulaciones (email, file_hash) VALUES (p_email, p_file_hash)
+    ON CONFLICT DO NOTHING;
+
+    IF NOT FOUND THEN
+        SELECT r.user_id, r.cv_id INTO usuario, cv
+        FROM cv_postulaciones r
+        WHERE r.email = p_email AND r.file_hash = p_file_hash;
+        nuevo := FALSE;
+        RETURN;
+    END IF;
+
+    INSERT INTO users (auth_provider, email, first_name, last_name, role_id, status)
+    VALUES ('email', p_email, p_nombres, p_apellidos, 2, TRUE)
+    RETURNING id INTO usuario;
+
+    INSERT INTO cvs (user_id, file_path, status_id, ia_result)
+    VALUES (usuario, p_file_path, p_status_id, p_resultado)
+    RETURNING id INTO cv;
+
+    UPDATE cv_postulaciones r SET user_id = usuario, cv_id = cv
+    WHERE r.email = p_email AND r.file_hash = p_file_hash;
+    nuevo := TRUE;
+END;
+$$;
@@ -0,0 +1,9 @@
+-- sin transacción (índices CONCURRENTLY: ver database_async.aplicar_migraciones)
+-- Progreso de importaciones masivas: trabajos por payload->>'importacion'.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cv_jobs_importacion_idx
+    ON cv_jobs ((payload->>'importacion'))
+    WHERE payload->>'importacion' IS NOT NULL;
+
+-- Proceso que reclamó el trabajo: al detenerse, cada proceso devuelve a
+-- 'pending' lo suyo sin esperar a lock_timeout (p. ej. CLI interrumpida).
+ALTER TABLE cv_jobs ADD COLUMN IF NOT EXISTS locked_by TEXT;
@@ -0,0 +1,20 @@
+-- Bandeja de salida de correos. Se escribe en la misma transacción que el
+-- cambio que origina el correo; el envío lo hace correo.enviar_pendientes.
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id           BIGSERIAL PRIMARY KEY,
+    destinatario TEXT        NOT NULL,
+    asunto       TEXT        NOT NULL,
+    cuerpo       TEXT        NOT NULL,   -- se vacía al enviarse (puede llevar credenciales)
+    status       TEXT        NOT NULL DEFAULT 'pending',   -- pending | sending | sent | failed
+    attempts     INT         NOT NULL DEFAULT 0,
+    max_attempts INT         NOT NULL DEFAULT 5,
+    run_after    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    locked_at    TIMESTAMPTZ,
+    error        TEXT,
+    created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    sent_at      TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS email_outbox_pendientes_idx
+    ON email_outbox (run_after)
+    WHERE status = 'pending';
@@ -0,0 +1,20 @@
+-- sin transacción (índices CONCURRENTLY: ver database_async.aplicar_migraciones)
+-- Login de clientes (POST /auth/cliente): búsqueda por correo con índice
+-- único entre los usuarios con rol cliente. Si ya hay correos repetidos
+-- entre clientes, se crea un índice normal y se avisa para depurarlos.
+-- (CONCURRENTLY no se puede usar dentro de DO; corre una sola vez.)
+DO $$
+BEGIN
+    IF to_regclass('users_email_cliente_idx') IS NULL THEN
+        IF EXISTS (SELECT 1 FROM users WHERE role_id = 1 GROUP BY email HAVING COUNT(*) > 1) THEN
+            RAISE NOTICE 'Correos de clientes duplicados: se crea users_email_cliente_idx sin UNIQUE';
+            CREATE INDEX users_email_cliente_idx ON users (email) WHERE role_id = 1;
+        ELSE
+            CREATE UNIQUE INDEX users_email_cliente_idx ON users (email) WHERE role_id = 1;
+        END IF;
+    END IF;
+END $$;
+
+-- Teléfono y documento del perfil: el primero de cada usuario
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_phones_usuario_idx ON user_phones (user_id, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_documents_usuario_idx ON user_documents (user_id, id);
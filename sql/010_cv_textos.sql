@@ -0,0 +1,54 @@
+-- Búsqueda de CVs (GET /cvs/buscar): texto extraído de cada CV con su
+-- tsvector (índice GIN) y, si está pg_trgm, un índice de trigramas para
+-- búsquedas aproximadas (errores de tipeo, nombres de herramientas).
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'unaccent') THEN
+        CREATE EXTENSION IF NOT EXISTS unaccent;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    END IF;
+EXCEPTION WHEN insufficient_privilege THEN
+    RAISE NOTICE 'Sin permisos para crear unaccent/pg_trgm: la búsqueda de CVs queda sin ellas';
+END $$;
+
+-- Español con stemming; sin acentos si unaccent está instalada al crearla
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'cv_es') THEN
+        CREATE TEXT SEARCH CONFIGURATION cv_es (COPY = spanish);
+        IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'unaccent') THEN
+            ALTER TEXT SEARCH CONFIGURATION cv_es
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+        END IF;
+    END IF;
+END $$;
+
+DO $$
+BEGIN
+    IF to_regclass('cv_textos') IS NULL THEN
+        CREATE TABLE cv_textos (
+            cv_id      INTEGER PRIMARY KEY REFERENCES cvs (id) ON DELETE CASCADE,
+            texto      TEXT NOT NULL,
+            documento  TSVECTOR GENERATED ALWAYS AS (to_tsvector('cv_es', texto)) STORED,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        -- CVs anteriores: el texto sigue en el payload de sus trabajos terminados
+        INSERT INTO cv_textos (cv_id, texto)
+        SELECT DISTINCT ON ((j.payload->>'cv_id')::int) (j.payload->>'cv_id')::int, j.payload->>'texto'
+        FROM cv_jobs j
+        JOIN cvs c ON c.id = (j.payload->>'cv_id')::int
+        WHERE j.status = 'done' AND j.payload->>'texto' IS NOT NULL AND j.payload->>'cv_id' IS NOT NULL
+        ORDER BY (j.payload->>'cv_id')::int, j.updated_at DESC;
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS cv_textos_documento_idx ON cv_textos USING GIN (documento);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS cv_textos_trgm_idx ON cv_textos USING GIN (texto gin_trgm_ops);
+    END IF;
+END $$;
@@ -0,0 +1,64 @@
+-- sin transacción (índices CONCURRENTLY: ver database_async.aplicar_migraciones)
+-- Especialistas más cercanos (GET /especialistas/cercanos): índice GiST
+-- sobre point(longitud, latitud) para recorrer las direcciones por
+-- distancia (KNN, operador <->) sin ordenar toda la tabla.
+--
+-- Solo se indexan las direcciones de especialistas activos: con todas las
+-- direcciones, el recorrido KNN pasaba por las de los clientes y las
+-- descartaba después con el filtro de rol (más lento cuanto más clientes
+-- hay cerca). user_addresses.especialista copia "role_id = 3 AND status"
+-- del usuario y lo mantienen los triggers de abajo.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'user_addresses' AND column_name = 'especialista') THEN
+        ALTER TABLE user_addresses ADD COLUMN especialista BOOLEAN NOT NULL DEFAULT FALSE;
+        UPDATE user_addresses a SET especialista = TRUE
+        FROM users u
+        WHERE u.id = a.user_id AND u.role_id = 3 AND u.status;
+    END IF;
+END $$;
+
+CREATE OR REPLACE FUNCTION user_addresses_marcar_especialista() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.especialista := EXISTS (SELECT 1 FROM users u WHERE u.id = NEW.user_id AND u.role_id = 3 AND u.status);
+    RETURN NEW;
+END $$;
+
+-- DROP + CREATE en un solo bloque para no quedar un instante sin trigger
+DO $$
+BEGIN
+    DROP TRIGGER IF EXISTS user_addresses_especialista ON user_addresses;
+    CREATE TRIGGER user_addresses_especialista
+        BEFORE INSERT OR UPDATE OF user_id ON user_addresses
+        FOR EACH ROW EXECUTE FUNCTION user_addresses_marcar_especialista();
+END $$;
+
+CREATE OR REPLACE FUNCTION users_sincronizar_especialista() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE user_addresses SET especialista = COALESCE(NEW.role_id = 3 AND NEW.status, FALSE)
+    WHERE user_id = NEW.id;
+    RETURN NULL;
+END $$;
+
+DO $$
+BEGIN
+    DROP TRIGGER IF EXISTS users_especialista ON users;
+    CREATE TRIGGER users_especialista
+        AFTER UPDATE OF role_id, status ON users
+        FOR EACH ROW
+        WHEN (OLD.role_id IS DISTINCT FROM NEW.role_id OR OLD.status IS DISTINCT FROM NEW.status)
+        EXECUTE FUNCTION users_sincronizar_especialista();
+END $$;
+
+DROP INDEX CONCURRENTLY IF EXISTS user_addresses_punto_idx;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_addresses_especialista_punto_idx
+    ON user_addresses USING GIST (point(longitude::float8, latitude::float8))
+    WHERE especialista AND latitude IS NOT NULL AND longitude IS NOT NULL;
+
+-- Filtro por servicio: especialistas con solicitudes aceptadas de ese servicio
+CREATE INDEX CONCURRENTLY IF NOT EXISTS service_requests_especialista_servicio_idx
+    ON service_requests (specialist_id, service_id)
+    WHERE acceptance_status = 'aceptado';
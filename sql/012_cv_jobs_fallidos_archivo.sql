@@ -0,0 +1,6 @@
+-- sin transacción (índices CONCURRENTLY: ver database_async.aplicar_migraciones)
+-- Purga del PDF de los trabajos fallidos (JobQueue._purgar_archivos_fallidos):
+-- índice chico, solo con los fallidos que todavía guardan el archivo.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cv_jobs_fallidos_archivo_idx
+    ON cv_jobs (updated_at)
+    WHERE status = 'failed' AND archivo IS NOT NULL;